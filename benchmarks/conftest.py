@@ -0,0 +1,69 @@
+import MaterialX as mx
+import pytest
+from pytest_benchmark.utils import parse_compare_fail
+
+from QuiltiX import qx_batch
+
+
+# Regressions against the run given with --benchmark-compare that fail the benchmarks,
+# unless other ones are given with --benchmark-compare-fail. The minimum is the least affected by other processes.
+DEFAULT_COMPARE_FAIL = ["min:25%"]
+# Nodes of one block of create_synthetic_mx_doc
+NODES_PER_BLOCK = 5
+# Sizes of the synthetic graphs
+NODE_COUNTS = [50, 200, 500]
+
+
+def pytest_configure(config):
+    # Runs before pytest-benchmark reads the options
+    if config.getoption("benchmark_compare") and not config.getoption("benchmark_compare_fail"):
+        config.option.benchmark_compare_fail = [parse_compare_fail(value) for value in DEFAULT_COMPARE_FAIL]
+
+
+def create_synthetic_mx_doc(node_count):
+    """Create a document like the ones QuiltiX writes, repeating a material with a small nodegraph until it has the
+    given amount of nodes.
+
+    Args:
+        node_count (int): Amount of nodes
+
+    Returns:
+        mx.Document: The document
+    """
+    doc = mx.createDocument()
+    node_graph = doc.addNodeGraph("NG_main")
+    for block_index in range(node_count // NODES_PER_BLOCK):
+        image_node = node_graph.addNode("image", f"image_{block_index}", "color3")
+        multiply_node = node_graph.addNode("multiply", f"multiply_{block_index}", "color3")
+        multiply_node.setConnectedNode("in1", image_node)
+        position_node = node_graph.addNode("position", f"position_{block_index}", "vector3")
+
+        color_output = node_graph.addOutput(f"out_color_{block_index}", "color3")
+        color_output.setConnectedNode(multiply_node)
+        normal_output = node_graph.addOutput(f"out_normal_{block_index}", "vector3")
+        normal_output.setConnectedNode(position_node)
+
+        surface_node = doc.addNode("standard_surface", f"standard_surface_{block_index}", "surfaceshader")
+        surface_node.addInput("base_color", "color3").setConnectedOutput(color_output)
+        surface_node.addInput("normal", "vector3").setConnectedOutput(normal_output)
+        doc.addMaterialNode(f"material_{block_index}", surface_node)
+
+    return doc
+
+
+@pytest.fixture(scope="session")
+def qx_node_graph(qapp):
+    """Node graph with the MaterialX libraries loaded, without the editor window."""
+    return qx_batch.create_headless_node_graph()
+
+
+@pytest.fixture(scope="session", params=NODE_COUNTS)
+def synthetic_mx_doc(request):
+    return create_synthetic_mx_doc(request.param)
+
+
+@pytest.fixture
+def loaded_qx_node_graph(qx_node_graph, synthetic_mx_doc):
+    """The node graph with a synthetic graph loaded."""
+    qx_node_graph.load_graph_from_mx_doc(synthetic_mx_doc.copy())
+    return qx_node_graph
@@ -0,0 +1,72 @@
+import copy
+import time
+
+import pytest
+
+
+NODES_PER_BLOCK = 5
+# Sizes of the synthetic graphs, larger than the ones of the other benchmarks to show how the export scales
+EXPORT_NODE_COUNTS = [100, 1000, 10000]
+
+
+def get_block_graph_data(qx_node_graph):
+    image_node = qx_node_graph.create_node("Texture2d.Image")
+    image_node.change_type("color3")
+    multiply_node = qx_node_graph.create_node("Math.Multiply")
+    multiply_node.change_type("color3")
+    position_node = qx_node_graph.create_node("Geometric.Position")
+    surf_node = qx_node_graph.create_node("Pbr.Standard_surface")
+    mat_node = qx_node_graph.create_node("Material.Surfacematerial")
+
+    multiply_node.inputs()["in1"].connect_to(image_node.get_output(0))
+    surf_node.inputs()["base_color"].connect_to(multiply_node.get_output(0))
+    surf_node.inputs()["normal"].connect_to(position_node.get_output(0))
+    mat_node.inputs()["surfaceshader"].connect_to(surf_node.get_output(0))
+    return qx_node_graph.get_current_graph_data()
+
+
+def get_synthetic_graph_data(block_data, node_count):
+    """Repeat the block of nodes until the graph has the given amount of nodes."""
+    graph_data = {"graph": block_data["graph"], "nodes": {}, "connections": []}
+    for block_index in range(node_count // NODES_PER_BLOCK):
+        for node_id, node_data in block_data["nodes"].items():
+            node_data = copy.deepcopy(node_data)
+            node_data["name"] = f"{node_data['name']}_{block_index}"
+            graph_data["nodes"][f"{node_id}_{block_index}"] = node_data
+
+        for connection in block_data["connections"]:
+            graph_data["connections"].append({
+                "in": [f"{connection['in'][0]}_{block_index}", connection["in"][1]],
+                "out": [f"{connection['out'][0]}_{block_index}", connection["out"][1]],
+            })
+
+    return graph_data
+
+
+@pytest.fixture(scope="module")
+def block_data(qx_node_graph):
+    qx_node_graph.clear_session()
+    with qx_node_graph.block_save():
+        return get_block_graph_data(qx_node_graph)
+
+
+@pytest.mark.benchmark(group="get_mx_doc_from_serialized_data")
+@pytest.mark.parametrize("node_count", EXPORT_NODE_COUNTS)
+def test_get_mx_doc_from_serialized_data(benchmark, qx_node_graph, block_data, node_count):
+    graph_data = get_synthetic_graph_data(block_data, node_count)
+    doc = benchmark.pedantic(qx_node_graph.get_mx_doc_from_serialized_data, args=(graph_data,), rounds=3)
+    assert len(doc.getMaterialNodes()) == node_count // NODES_PER_BLOCK
+
+
+def test_export_scales_linearly(qx_node_graph, block_data):
+    export_times = {}
+    for node_count in EXPORT_NODE_COUNTS:
+        graph_data = get_synthetic_graph_data(block_data, node_count)
+        start_time = time.perf_counter()
+        doc = qx_node_graph.get_mx_doc_from_serialized_data(graph_data)
+        export_times[node_count] = time.perf_counter() - start_time
+
+        assert len(doc.getMaterialNodes()) == node_count // NODES_PER_BLOCK
+
+    # 10 times the nodes should take roughly 10 times as long, a quadratic export would take ~100 times as long
+    assert export_times[10000] < export_times[1000] * 30
@@ -0,0 +1,41 @@
+import itertools
+
+import pytest
+
+
+@pytest.mark.benchmark(group="load_graph_from_mx_doc")
+def test_load_graph_from_mx_doc(benchmark, qx_node_graph, synthetic_mx_doc):
+    # Loading imports the library into the document, so every round gets a copy
+    benchmark.pedantic(
+        qx_node_graph.load_graph_from_mx_doc, setup=lambda: ((synthetic_mx_doc.copy(),), {}), rounds=3
+    )
+
+
+@pytest.mark.benchmark(group="get_current_mx_graph_doc")
+def test_get_current_mx_graph_doc(benchmark, loaded_qx_node_graph):
+    # Rebuild the document from the graph instead of returning the already up to date one
+    benchmark.pedantic(
+        loaded_qx_node_graph.get_current_mx_graph_doc, setup=loaded_qx_node_graph.invalidate_mx_doc, rounds=5
+    )
+
+
+@pytest.mark.benchmark(group="validate_mtlx_doc")
+def test_validate_mtlx_doc(benchmark, qx_node_graph, synthetic_mx_doc):
+    benchmark.pedantic(qx_node_graph.validate_mtlx_doc, args=(synthetic_mx_doc,), rounds=5)
+
+
+@pytest.mark.benchmark(group="change_type")
+def test_change_type(benchmark, qx_node_graph):
+    qx_node_graph.clear_session()
+    with qx_node_graph.block_save():
+        image_node = qx_node_graph.create_node("Texture2d.Image")
+        image_node.change_type("color3")
+        multiply_node = qx_node_graph.create_node("Math.Multiply")
+        surface_node = qx_node_graph.create_node("Pbr.Standard_surface")
+        multiply_node.change_type("color3")
+        multiply_node.inputs()["in1"].connect_to(image_node.get_output(0))
+        surface_node.inputs()["base_color"].connect_to(multiply_node.get_output(0))
+
+    # Alternate between types keeping and dropping the connections
+    type_names = itertools.cycle(["float", "color3", "vector3", "color3"])
+    benchmark.pedantic(lambda: multiply_node.change_type(next(type_names)), rounds=40, warmup_rounds=4)
@@ -0,0 +1,23 @@
+import pytest
+
+from QuiltiX import qx_batch
+
+
+@pytest.mark.benchmark(group="startup")
+@pytest.mark.parametrize("library_cache", ["0", "1"])
+def test_library_registration(benchmark, qapp, monkeypatch, tmp_path, library_cache):
+    monkeypatch.setenv("QUILTIX_LIBRARY_CACHE", library_cache)
+    monkeypatch.setenv("QUILTIX_CACHE_DIR", str(tmp_path))
+    # The warmup round writes the cache
+    benchmark.pedantic(qx_batch.create_headless_node_graph, rounds=5, warmup_rounds=1)
+
+
+@pytest.mark.benchmark(group="startup")
+def test_editor_startup(benchmark, qapp):
+    from QuiltiX import quiltix
+
+    def start_editor():
+        editor = quiltix.QuiltiXWindow(load_shaderball=False, load_default_graph=False)
+        editor.deleteLater()
+
+    benchmark.pedantic(start_editor, rounds=3)
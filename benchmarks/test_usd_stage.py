@@ -0,0 +1,32 @@
+import itertools
+
+import MaterialX as mx
+import pytest
+from pxr import Sdf
+
+from QuiltiX import usd_stage
+
+# Has to be set before usdMtlx is loaded
+usd_stage.set_pxr_mtlx_stdlib_search_paths()
+
+
+@pytest.fixture
+def stage_ctrl(qapp):
+    stage_ctrl = usd_stage.MxStageController()
+    stage_ctrl.set_stage(usd_stage.create_empty_stage())
+    return stage_ctrl
+
+
+@pytest.mark.skipif(not Sdf.FileFormat.FindByExtension("mtlx"), reason="USD is built without MaterialX support")
+@pytest.mark.benchmark(group="refresh_mx_file")
+@pytest.mark.parametrize("full_refresh", ["0", "1"])
+def test_refresh_mx_file(benchmark, monkeypatch, stage_ctrl, synthetic_mx_doc, full_refresh):
+    monkeypatch.setenv("QUILTIX_FULL_USD_REFRESH", full_refresh)
+    mx_data = mx.writeToXmlString(synthetic_mx_doc)
+    changed_mx_doc = synthetic_mx_doc.copy()
+    changed_mx_doc.getNode("standard_surface_0").setInputValue("base", 0.5)
+    stage_ctrl.refresh_mx_file(mx_data)
+
+    # Unchanged documents aren't imported again, so every round changes a value
+    mx_datas = itertools.cycle([mx.writeToXmlString(changed_mx_doc), mx_data])
+    benchmark.pedantic(lambda: stage_ctrl.refresh_mx_file(next(mx_datas)), rounds=5)
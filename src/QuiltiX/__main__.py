@@ -1,4 +1,9 @@
-from . import quiltix
+import sys
 
 if __name__ == '__main__':
+    if sys.argv[1:2] == ["batch"]:
+        from . import qx_batch
+        sys.exit(qx_batch.main(sys.argv[2:]))
+
+    from . import quiltix
     quiltix.launch()
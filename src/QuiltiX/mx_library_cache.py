@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+from collections.abc import Mapping
+
+import MaterialX as mx  # type: ignore
+
+from QuiltiX import mx_node
+
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the cached records changes
+CACHE_VERSION = 2
+
+
+def is_enabled():
+    return os.getenv("QUILTIX_LIBRARY_CACHE", "1") != "0"
+
+
+def get_cache_dir():
+    if cache_dir := os.getenv("QUILTIX_CACHE_DIR"):
+        return cache_dir
+
+    if sys.platform == "win32":
+        base_dir = os.getenv("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base_dir = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+    return os.path.join(base_dir, "QuiltiX")
+
+
+def get_library_files(search_path, library_folders):
+    """Get the MaterialX files mx.loadLibraries() would load for the given search path and library folders,
+    in the same order and without parsing them.
+
+    Args:
+        search_path (str): MaterialX search path
+        library_folders (list of str): Library folders to look up in the search path. All folders when empty.
+
+    Returns:
+        list(str): Paths of the library files
+    """
+    mx_search_path = mx.FileSearchPath(search_path)
+    mx_search_path.append(mx.getEnvironmentPath())
+    if library_folders:
+        library_paths = [mx_search_path.find(mx.FilePath(folder)) for folder in library_folders]
+    else:
+        library_paths = [
+            mx.FilePath(path) for path in mx_search_path.asString(mx.PATH_LIST_SEPARATOR).split(mx.PATH_LIST_SEPARATOR)
+            if path
+        ]
+
+    # dict as an ordered set
+    library_files = {}
+    for library_path in library_paths:
+        for path in library_path.getSubDirectories():
+            for filename in path.getFilesInDirectory("mtlx"):
+                library_files[os.path.join(path.asString(), filename.asString())] = None
+
+    return list(library_files)
+
+
+def get_cache_key(search_path, library_folders):
+    """Build a key that changes whenever any of the library files, their modification times or the MaterialX
+    version change.
+
+    Returns:
+        str: Hex digest identifying the library state, None if the library files could not be listed
+    """
+    try:
+        library_files = get_library_files(search_path, library_folders)
+        file_stats = []
+        for library_file in library_files:
+            stat = os.stat(library_file)
+            file_stats.append([library_file, stat.st_mtime_ns, stat.st_size])
+    except OSError as e:
+        logger.debug(f"Could not list library files of {search_path}: {e}")
+        return None
+
+    key_data = [CACHE_VERSION, mx.getVersionString(), search_path, list(library_folders), file_stats]
+    return hashlib.sha1(json.dumps(key_data).encode("utf-8")).hexdigest()
+
+
+def get_cache_file(cache_key):
+    return os.path.join(get_cache_dir(), f"nodedefs_{cache_key}.json")
+
+
+def read_records(cache_key):
+    """Read the cached node definition records for the given key.
+
+    Returns:
+        list(dict): The cached records, None if there is no valid cache entry
+    """
+    cache_file = get_cache_file(cache_key)
+    if not os.path.isfile(cache_file):
+        return None
+
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read node definition cache {cache_file}: {e}")
+        return None
+
+    if data.get("version") != CACHE_VERSION or data.get("materialx") != mx.getVersionString():
+        return None
+
+    return data.get("nodedefs")
+
+
+def write_records(cache_key, records):
+    cache_file = get_cache_file(cache_key)
+    data = {"version": CACHE_VERSION, "materialx": mx.getVersionString(), "nodedefs": records}
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not write node definition cache {cache_file}: {e}")
+
+
+def get_record_from_mx_def(mx_def, has_nodegraph_implementation):
+    record = {
+        "name": mx_def.getName(),
+        "nodestring": mx_def.getNodeString(),
+        "group": mx_def.getNodeGroup(),
+        "displaytype": mx_node.get_displaytype_from_mx_def(mx_def),
+        "nodegraph": has_nodegraph_implementation,
+    }
+    record.update(mx_node.get_port_record_from_mx_def(mx_def))
+    return record
+
+
+def get_mx_node_group_dict_from_records(records, mx_def_getter):
+    """Same layout as mx_node.get_mx_node_group_dict(), but with lazily resolved definitions.
+
+    Returns:
+        dict: { node_group : { node_def_name : LazyNodeDefs } }
+    """
+    mx_node_group_dict = {}
+    for record in records:
+        mx_node_group = record["group"] or "Other"
+        mx_node_group_key = mx_node_group_dict.setdefault(mx_node_group, {})
+        if record["nodestring"] not in mx_node_group_key:
+            mx_node_group_key[record["nodestring"]] = LazyNodeDefs(mx_def_getter)
+
+        mx_node_group_key[record["nodestring"]].def_names[record["displaytype"]] = record["name"]
+        mx_node_group_key[record["nodestring"]].port_records[record["displaytype"]] = record
+
+    return mx_node_group_dict
+
+
+class LazyNodeDefs(Mapping):
+    """{displaytype: NodeDef} mapping which only looks up the definitions in the library document once they are
+    accessed, so that the libraries themselves don't need to be parsed before a node is used.
+    """
+
+    def __init__(self, mx_def_getter):
+        self.mx_def_getter = mx_def_getter
+        self.def_names = {}
+        # { displaytype : record }, with the ports of the definitions
+        self.port_records = {}
+        self._mx_defs = {}
+
+    @property
+    def mx_signature(self):
+        return mx_node.MxNodeSignature(self.port_records)
+
+    def __getitem__(self, displaytype):
+        if displaytype not in self._mx_defs:
+            self._mx_defs[displaytype] = self.mx_def_getter(self.def_names[displaytype])
+
+        return self._mx_defs[displaytype]
+
+    def __iter__(self):
+        return iter(self.def_names)
+
+    def __len__(self):
+        return len(self.def_names)
+
+    def __contains__(self, displaytype):
+        return displaytype in self.def_names
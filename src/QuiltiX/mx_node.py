@@ -1,6 +1,7 @@
 import os
 import re
 from pathlib import Path
+from types import MappingProxyType
 import sys
 
 import MaterialX as mx  # type: ignore
@@ -129,3 +130,100 @@ def get_displaytype_from_mx_def(mx_node_def):
     mx_node_def_type = mx_node_def_full_name.replace(all_but_type_string, "")
 
     return mx_node_def_type
+
+
+def get_port_record_from_mx_def(mx_node_def):
+    """Get the port names and types of a definition in a form that can be cached as JSON.
+
+    Returns:
+        dict: The active "inputs" and "outputs" as [name, type] lists, and the "first_input_type" and
+            "first_output_type" of the ports declared on the definition itself, None if it has none
+    """
+    mx_inputs = mx_node_def.getInputs()
+    mx_outputs = mx_node_def.getOutputs()
+    return {
+        "inputs": [[mx_input.getName(), mx_input.getType()] for mx_input in mx_node_def.getActiveInputs()],
+        "outputs": [[mx_output.getName(), mx_output.getType()] for mx_output in mx_node_def.getActiveOutputs()],
+        "first_input_type": mx_inputs[0].getType() if mx_inputs else None,
+        "first_output_type": mx_outputs[0].getType() if mx_outputs else None,
+    }
+
+
+class MxNodeSignature(object):
+    """Port names and types of all definitions of a node, per displaytype. It is built once when the node is
+    registered, so the ports can be looked up without going through the MaterialX definitions.
+    """
+
+    def __init__(self, port_records):
+        """
+        Args:
+            port_records (dict): { displaytype : port record }, see get_port_record_from_mx_def
+        """
+        self.displaytypes = tuple(port_records)
+        # { displaytype : { port name : port type } }
+        self._input_types = {}
+        self._output_types = {}
+        # { displaytype : port type }
+        self._first_input_types = {}
+        self._first_output_types = {}
+        for displaytype, port_record in port_records.items():
+            self._input_types[displaytype] = MappingProxyType({name: type_ for name, type_ in port_record["inputs"]})
+            self._output_types[displaytype] = MappingProxyType({name: type_ for name, type_ in port_record["outputs"]})
+            self._first_input_types[displaytype] = port_record["first_input_type"]
+            self._first_output_types[displaytype] = port_record["first_output_type"]
+
+        # Types of all inputs and outputs of all definitions
+        self.input_types = frozenset(t for input_types in self._input_types.values() for t in input_types.values())
+        self.output_types = frozenset(t for output_types in self._output_types.values() for t in output_types.values())
+
+    @classmethod
+    def from_mx_defs(cls, mx_node_defs):
+        """
+        Args:
+            mx_node_defs (dict): { displaytype : mx.NodeDef }
+        """
+        return cls({displaytype: get_port_record_from_mx_def(mx_def) for displaytype, mx_def in mx_node_defs.items()})
+
+    def get_inputs(self, displaytype):
+        """
+        Returns:
+            Mapping: { input name : input type } of the definition, in the order of the definition
+        """
+        return self._input_types[displaytype]
+
+    def get_outputs(self, displaytype):
+        """
+        Returns:
+            Mapping: { output name : output type } of the definition, in the order of the definition
+        """
+        return self._output_types[displaytype]
+
+    def get_port_type(self, displaytype, port_name, port_type="in"):
+        """
+        Returns:
+            str: Type of the input or output of the definition, None if it doesn't have the port
+        """
+        ports = self._input_types if port_type == "in" else self._output_types
+        return ports[displaytype].get(port_name)
+
+    def get_port_types(self, port_name, port_type="in"):
+        """
+        Returns:
+            list(str): Types of the input or output in all definitions which have it, in the order of the definitions
+        """
+        ports = self._input_types if port_type == "in" else self._output_types
+        port_types = []
+        for displaytype_ports in ports.values():
+            displaytype_port_type = displaytype_ports.get(port_name)
+            if displaytype_port_type is not None and displaytype_port_type not in port_types:
+                port_types.append(displaytype_port_type)
+
+        return port_types
+
+    def get_displaytypes_from_first_port_type(self, data_type, port_type="in"):
+        """
+        Returns:
+            list(str): Displaytypes of the definitions whose first declared input or output has the data type
+        """
+        first_port_types = self._first_input_types if port_type == "in" else self._first_output_types
+        return [displaytype for displaytype, first_port_type in first_port_types.items() if first_port_type == data_type]
@@ -0,0 +1,196 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from qtpy import QtCore  # type: ignore
+
+from QuiltiX.qx_profiler import profiled
+
+import MaterialX as mx  # type: ignore
+
+
+logger = logging.getLogger(__name__)
+
+# Library of the validation process, (library key, library document)
+_process_mx_library = None
+
+
+@profiled()
+def validate_mx_doc(doc, mx_library_doc):
+    """Validate the document against the library, without importing the library into it.
+
+    Args:
+        doc (mx.Document): Document to validate, it is not modified
+        mx_library_doc (mx.Document): Library with the node definitions used in the document
+
+    Returns:
+        tuple(bool, str): Whether the document is valid and the validation messages
+    """
+    data_library = doc.getDataLibrary()
+    doc.setDataLibrary(mx_library_doc)
+    try:
+        return doc.validate()
+    finally:
+        doc.setDataLibrary(data_library)
+
+
+def validate_mx_xml_data(xml_data, library_key, library_xml_data):
+    """Validate a document in the validation process. The library is only parsed again when its key changes.
+
+    Args:
+        xml_data (str): Document to validate
+        library_key (int): Identifies the state of the library
+        library_xml_data (str): Library with the node definitions used in the document
+
+    Returns:
+        tuple(bool, str): Whether the document is valid and the validation messages
+    """
+    global _process_mx_library
+    if _process_mx_library is None or _process_mx_library[0] != library_key:
+        mx_library_doc = mx.createDocument()
+        mx.readFromXmlString(mx_library_doc, library_xml_data)
+        _process_mx_library = (library_key, mx_library_doc)
+
+    doc = mx.createDocument()
+    mx.readFromXmlString(doc, xml_data)
+    return validate_mx_doc(doc, _process_mx_library[1])
+
+
+class MxDocValidator(QtCore.QObject):
+    """Validates documents in a worker process, so the GUI thread isn't blocked while validating. MaterialX keeps
+    the GIL while validating, which would block it with a thread. A worker thread sends the documents as XML to
+    the process and waits for the results. Only the latest requested document is validated, results of older
+    requests are dropped.
+
+    If the process can't be started, the documents are validated in the worker thread instead.
+    """
+
+    # bool : valid
+    # str : validation messages
+    validated = QtCore.Signal(bool, str)
+    # Emitted from the worker thread, delivered in the thread of the validator
+    _job_finished = QtCore.Signal(int, bool, str)
+
+    def __init__(self, parent=None):
+        super(MxDocValidator, self).__init__(parent)
+        self._condition = threading.Condition()
+        # (job id, XML of the document, library document)
+        self._pending_job = None
+        self._job_id = 0
+        self._thread = None
+        # Held while validating
+        self._lock = threading.Lock()
+        self._executor = None
+        self._use_process = True
+        # (library document, library key, XML of the library), rebuilt when the library changed
+        self._library_xml = None
+        self._library_key = 0
+        self._job_finished.connect(self._on_job_finished, QtCore.Qt.QueuedConnection)
+
+    def validate(self, doc, mx_library_doc):
+        """Queue the validation of a snapshot of the document, replacing a pending one.
+
+        Args:
+            doc (mx.Document): Document to validate. It may be changed as soon as this returns
+            mx_library_doc (mx.Document): Library with the node definitions used in the document.
+                It must not be changed while validating.
+
+        Returns:
+            int: Id of the validation job
+        """
+        xml_data = mx.writeToXmlString(doc)
+        with self._condition:
+            self._job_id += 1
+            self._pending_job = (self._job_id, xml_data, mx_library_doc)
+            self._condition.notify()
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="QuiltiX validation", daemon=True)
+            self._thread.start()
+
+        return self._job_id
+
+    def cancel(self):
+        """Drop the pending validation and the result of the running one."""
+        with self._condition:
+            self._job_id += 1
+            self._pending_job = None
+
+    @contextmanager
+    def pause(self):
+        """Wait for the running validation and don't start another one inside the context,
+        e.g. while changing the library document.
+        """
+        with self._lock:
+            try:
+                yield
+            finally:
+                self._library_xml = None
+
+    def is_current_job(self, job_id):
+        with self._condition:
+            return job_id == self._job_id
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending_job is None:
+                    self._condition.wait()
+
+                job_id, xml_data, mx_library_doc = self._pending_job
+                self._pending_job = None
+
+            with self._lock:
+                try:
+                    valid, message = self._validate(xml_data, mx_library_doc)
+                except Exception as e:
+                    logger.exception("Validation failed")
+                    valid, message = False, str(e)
+
+            if self.is_current_job(job_id):
+                try:
+                    self._job_finished.emit(job_id, valid, message)
+                except RuntimeError:
+                    # The validator was deleted while validating, e.g. together with its node graph
+                    return
+
+    # Spans the whole validation, the process itself isn't profiled
+    @profiled("MxDocValidator.validate")
+    def _validate(self, xml_data, mx_library_doc):
+        if self._use_process:
+            library_key, library_xml_data = self._get_library_xml_data(mx_library_doc)
+            try:
+                executor = self._get_executor()
+                return executor.submit(validate_mx_xml_data, xml_data, library_key, library_xml_data).result()
+            except (BrokenProcessPool, OSError, RuntimeError) as e:
+                logger.warning(f"Validating in the worker thread, the validation process failed: {e}")
+                self._use_process = False
+                self._executor = None
+
+        doc = mx.createDocument()
+        mx.readFromXmlString(doc, xml_data)
+        return validate_mx_doc(doc, mx_library_doc)
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Forked processes would inherit the Qt state of this process
+            mp_context = multiprocessing.get_context("spawn")
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=mp_context)
+
+        return self._executor
+
+    def _get_library_xml_data(self, mx_library_doc):
+        # The library is only changed while paused, which drops the XML
+        if self._library_xml is None or self._library_xml[0] is not mx_library_doc:
+            self._library_key += 1
+            self._library_xml = (mx_library_doc, self._library_key, mx.writeToXmlString(mx_library_doc))
+
+        return self._library_xml[1:]
+
+    def _on_job_finished(self, job_id, valid, message):
+        # A newer validation may have been requested since the result was posted
+        if self.is_current_job(job_id):
+            self.validated.emit(valid, message)
@@ -46,7 +46,7 @@ from qtpy.QtWidgets import (  # type: ignore
     QVBoxLayout,
 )
 
-from QuiltiX import mx_node, qx_node, usd_render_settings, usd_stage, usd_stage_tree, usd_stage_view
+from QuiltiX import mx_node, qx_node, qx_profiler, usd_render_settings, usd_stage, usd_stage_tree, usd_stage_view
 from QuiltiX.constants import ROOT
 from QuiltiX.qx_node_property import PropertiesBinWidget
 from QuiltiX.qx_nodegraph import QxNodeGraph
@@ -169,9 +169,18 @@ class QuiltiXWindow(QMainWindow):
 
         # region Stage Tree
         self.stage_tree_widget = self.get_stage_tree_widget()
+        self.e_stage_tree_filter = QLineEdit()
+        self.e_stage_tree_filter.setPlaceholderText("Filter by name or type...")
+        self.e_stage_tree_filter.setClearButtonEnabled(True)
+        self.e_stage_tree_filter.textChanged.connect(self.stage_tree_widget.set_filter)
+        self.w_stage_tree = QtWidgets.QWidget()
+        self.lo_stage_tree = QVBoxLayout(self.w_stage_tree)
+        self.lo_stage_tree.setContentsMargins(0, 0, 0, 0)
+        self.lo_stage_tree.addWidget(self.e_stage_tree_filter)
+        self.lo_stage_tree.addWidget(self.stage_tree_widget)
         self.stage_tree_dock_widget = QDockWidget()
         self.stage_tree_dock_widget.setWindowTitle("Scenegraph")
-        self.stage_tree_dock_widget.setWidget(self.stage_tree_widget)
+        self.stage_tree_dock_widget.setWidget(self.w_stage_tree)
         self.stage_tree_dock_widget.setAllowedAreas(QtCore.Qt.AllDockWidgetAreas)
         self.addDockWidget(QtCore.Qt.TopDockWidgetArea, self.stage_tree_dock_widget)
         # endregion Stage Tree
@@ -208,6 +217,16 @@ class QuiltiXWindow(QMainWindow):
         self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.properties_dock_widget)
         # endregion Properties
 
+        # region Profiler
+        self.profiler_widget = qx_profiler.ProfilerWidget()
+        self.profiler_dock_widget = QDockWidget()
+        self.profiler_dock_widget.setWindowTitle("Profiler")
+        self.profiler_dock_widget.setWidget(self.profiler_widget)
+        self.profiler_dock_widget.setAllowedAreas(QtCore.Qt.AllDockWidgetAreas)
+        self.profiler_dock_widget.setHidden(True)
+        self.tabifyDockWidget(self.properties_dock_widget, self.profiler_dock_widget)
+        # endregion Profiler
+
         # region Events
         self.qx_node_graph.node_graph_changed.connect(self.on_node_graph_changed)
         self.qx_node_graph.mx_data_updated.connect(self.stage_ctrl.refresh_mx_file)
@@ -215,6 +234,7 @@ class QuiltiXWindow(QMainWindow):
         # QxNode.get_mx_input_name_from_property_name(qx_node, property_name)
         self.qx_node_graph.mx_parameter_changed.connect(self.stage_ctrl.update_parameter)
         self.qx_node_graph.mx_file_loaded.connect(self.on_mx_file_loaded)
+        self.qx_node_graph.mx_doc_validated.connect(self.show_validation_result)
 
         if self.viewer_enabled:
             self.stage_ctrl.signal_stage_changed.connect(self.stage_view_widget.set_stage)
@@ -287,7 +307,8 @@ class QuiltiXWindow(QMainWindow):
             if not prims:
                 return
 
-        self.stage_ctrl.apply_material_to_prims(material_name, prims)
+        # A single collection binding per root prim is cheaper to author and compose for all prims
+        self.stage_ctrl.apply_material_to_prims(material_name, prims, use_collection=not selection)
 
     def expand_selected_nodegraph(self):
         action = self.expand_cmd.qaction
@@ -402,6 +423,13 @@ class QuiltiXWindow(QMainWindow):
         self.act_validate.triggered.connect(self.validate)
         self.options_menu.addAction(self.act_validate)
 
+        self.act_profile = QAction("Profile hot paths", self)
+        self.act_profile.setCheckable(True)
+        self.act_profile.setChecked(qx_profiler.is_enabled())
+        self.act_profile.toggled.connect(self.profiler_widget.chk_enabled.setChecked)
+        self.profiler_widget.chk_enabled.toggled.connect(self.act_profile.setChecked)
+        self.options_menu.addAction(self.act_profile)
+
         self.act_reload_defs = QAction("Reload Node Definitions", self)
         self.act_reload_defs.triggered.connect(self.reload_defs)
         self.options_menu.addAction(self.act_reload_defs)
@@ -441,6 +469,11 @@ class QuiltiXWindow(QMainWindow):
         self.act_scenegraph.toggled.connect(self.on_scenegraph_toggled)
         self.view_menu.addAction(self.act_scenegraph)
 
+        self.act_profiler = QAction("Profiler", self)
+        self.act_profiler.setCheckable(True)
+        self.act_profiler.toggled.connect(self.on_profiler_toggled)
+        self.view_menu.addAction(self.act_profiler)
+
         self.act_viewport = QAction("Viewport", self)
         self.act_viewport.setCheckable(True)
         self.act_viewport.toggled.connect(self.on_viewport_toggled)
@@ -498,6 +531,7 @@ class QuiltiXWindow(QMainWindow):
     def on_view_menu_showing(self):
         self.act_prop.setChecked(self.properties_dock_widget.isVisible())
         self.act_scenegraph.setChecked(self.stage_tree_dock_widget.isVisible())
+        self.act_profiler.setChecked(self.profiler_dock_widget.isVisible())
         self.act_render_settings.setChecked(self.render_settings_dock_widget.isVisible())
         if self.viewer_enabled:
             self.act_viewport.setChecked(self.stage_view_dock_widget.isVisible())
@@ -744,6 +778,9 @@ class QuiltiXWindow(QMainWindow):
     def on_scenegraph_toggled(self, checked):
         self.stage_tree_dock_widget.setVisible(checked)
 
+    def on_profiler_toggled(self, checked):
+        self.profiler_dock_widget.setVisible(checked)
+
     def on_viewport_toggled(self, checked):
         self.stage_view_dock_widget.setVisible(checked)
 
@@ -774,13 +811,18 @@ class QuiltiXWindow(QMainWindow):
                 node.view.setVisible(not hide)
 
     def validate(self, doc=None, popup=True):
+        # The result of a running background validation would be outdated
+        self.qx_node_graph.mx_doc_validator.cancel()
         result = self.qx_node_graph.validate_mtlx_doc(doc)
-        if result[0]:
+        self.show_validation_result(result[0], result[1], popup=popup)
+
+    def show_validation_result(self, valid, message, popup=False):
+        if valid:
             msg = popup_msg = f"Graph is valid."
             self.statusBar().setStyleSheet("QStatusBar::item {border: None}")
         else:
-            msg = f"Graph is invalid:    {result[1]}".strip("\n")
-            popup_msg = f"Graph is invalid:\n\n{result[1]}".strip("\n")
+            msg = f"Graph is invalid:    {message}".strip("\n")
+            popup_msg = f"Graph is invalid:\n\n{message}".strip("\n")
             self.statusBar().setStyleSheet("QStatusBar::item {border: None} QWidget {background-color: rgb(200, 30, 30);}")
 
         self.l_status.setText(msg)
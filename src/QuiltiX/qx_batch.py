@@ -0,0 +1,217 @@
+"""Load, validate and re-save MaterialX files without a display, e.g.
+
+    python -m QuiltiX batch materials/ --output-dir normalized/ --jobs 8 --report report.json
+"""
+import argparse
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+from qtpy import QtWidgets  # type: ignore
+
+
+logger = logging.getLogger(__name__)
+
+# Node graph of the current process, created once per worker
+_qx_node_graph = None
+
+
+def get_mx_file_paths(paths):
+    """Get the .mtlx files of the given files and directories, searching the directories recursively.
+
+    Args:
+        paths (list[str]): Paths to .mtlx files or directories
+
+    Returns:
+        list[tuple(str, str)]: Absolute file paths and their paths relative to the given directory
+    """
+    mx_file_paths = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isfile(path):
+            mx_file_paths.append((path, os.path.basename(path)))
+            continue
+
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in sorted(file_names):
+                if file_name.lower().endswith(".mtlx"):
+                    file_path = os.path.join(dir_path, file_name)
+                    mx_file_paths.append((file_path, os.path.relpath(file_path, path)))
+
+    return mx_file_paths
+
+
+def create_headless_node_graph(ng_abstraction=True):
+    """Create a node graph with the MaterialX libraries loaded, without the editor window.
+
+    Args:
+        ng_abstraction (bool, optional): Create a nodegraph around the shader inputs. Defaults to True.
+
+    Returns:
+        QxNodeGraph: The node graph
+    """
+    from QuiltiX import mx_node, qx_node
+    from QuiltiX.qx_nodegraph import QxNodeGraph
+
+    if not QtWidgets.QApplication.instance():
+        QtWidgets.QApplication([sys.argv[0]])
+
+    qx_node_graph = QxNodeGraph()
+    qx_node_graph.ng_abstraction = ng_abstraction
+    # Expanded nodegraphs are opened as tabs of the widget
+    qx_node_graph.widget
+    qx_node_graph.load_mx_libraries(mx_node.get_mx_stdlib_paths())
+    mx_custom_lib_paths = mx_node.get_mx_custom_lib_paths()
+    if mx_custom_lib_paths:
+        qx_node_graph.load_mx_libraries(mx_custom_lib_paths)
+
+    qx_node_graph.register_node(qx_node.QxGroupNode)
+    return qx_node_graph
+
+
+def _init_worker(ng_abstraction):
+    global _qx_node_graph
+    _qx_node_graph = create_headless_node_graph(ng_abstraction=ng_abstraction)
+
+
+def process_mx_file(mx_file_path, output_path=None, layout=False, validate=True):
+    """Load a MaterialX file into the node graph of the process and save it again.
+
+    Args:
+        mx_file_path (str): File to load
+        output_path (str, optional): File to save to. Not saved if None.
+        layout (bool, optional): Lay out the nodes, even if the file has node positions. Defaults to False.
+        validate (bool, optional): Validate the document of the graph. Defaults to True.
+
+    Returns:
+        dict: Result with the keys "path", "output", "valid", "message", "error" and "seconds"
+    """
+    start_time = time.perf_counter()
+    result = {"path": mx_file_path, "output": output_path, "valid": None, "message": "", "error": None}
+    try:
+        _qx_node_graph.load_graph_from_mx_file(mx_file_path)
+        if layout:
+            _qx_node_graph.auto_layout_nodes()
+            # Node positions set by the layout aren't tracked by the document of the graph
+            _qx_node_graph.invalidate_mx_doc()
+
+        if validate:
+            result["valid"], result["message"] = _qx_node_graph.validate_mtlx_doc()
+
+        if output_path:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            _qx_node_graph.save_graph_as_mx_file(output_path)
+    except Exception as e:
+        logger.exception(f"Failed to process {mx_file_path}")
+        result["error"] = str(e)
+
+    result["seconds"] = time.perf_counter() - start_time
+    return result
+
+
+def run_batch(mx_file_paths, output_dir=None, save=True, layout=False, validate=True, jobs=None, ng_abstraction=True):
+    """Process MaterialX files in a pool of processes with one node graph each.
+
+    Args:
+        mx_file_paths (list[tuple(str, str)]): File paths and their output paths relative to output_dir,
+            see get_mx_file_paths
+        output_dir (str, optional): Directory to save to. The files are overwritten if None.
+        save (bool, optional): Save the files. Defaults to True.
+        layout (bool, optional): Lay out the nodes of all files. Defaults to False.
+        validate (bool, optional): Validate the files. Defaults to True.
+        jobs (int, optional): Number of processes. The files are processed in this process if 1.
+            Defaults to the number of CPUs.
+        ng_abstraction (bool, optional): Create a nodegraph around the shader inputs. Defaults to True.
+
+    Yields:
+        dict: Result of each file as returned by process_mx_file, in the order they finish
+    """
+    tasks = []
+    for mx_file_path, relative_path in mx_file_paths:
+        output_path = None
+        if save:
+            output_path = os.path.join(output_dir, relative_path) if output_dir else mx_file_path
+
+        tasks.append((mx_file_path, output_path, layout, validate))
+
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks))
+    if jobs <= 1:
+        _init_worker(ng_abstraction)
+        for task in tasks:
+            yield process_mx_file(*task)
+
+        return
+
+    # Forked processes would inherit the Qt state of this process
+    mp_context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, mp_context=mp_context, initializer=_init_worker, initargs=(ng_abstraction,)
+    ) as executor:
+        futures = [executor.submit(process_mx_file, *task) for task in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m QuiltiX batch",
+        description="Load MaterialX files into the QuiltiX node graph, validate them and save them again.",
+    )
+    parser.add_argument("paths", nargs="+", help=".mtlx files or directories to search for them")
+    parser.add_argument("-o", "--output-dir", help="Directory to save to. The files are overwritten if not given")
+    parser.add_argument("--no-save", action="store_true", help="Only load and validate the files")
+    parser.add_argument("--layout", action="store_true", help="Lay out the nodes, even if they have positions")
+    parser.add_argument("--no-validate", action="store_true", help="Don't validate the files")
+    parser.add_argument("--no-ng-abstraction", action="store_true", help="Don't create a nodegraph around shader inputs")
+    parser.add_argument("-j", "--jobs", type=int, help="Number of processes. Defaults to the number of CPUs")
+    parser.add_argument("--report", help="Write the results of all files to this JSON file")
+    return parser
+
+
+def main(argv=None):
+    """Run the batch command line.
+
+    Returns:
+        int: Exit code, 1 if any file failed or is invalid
+    """
+    logging.basicConfig(level=logging.INFO)
+    args = get_argument_parser().parse_args(argv)
+    # Must be set before the QApplication is created, the processes of the pool inherit it
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    mx_file_paths = get_mx_file_paths(args.paths)
+    if not mx_file_paths:
+        logger.error(f"No .mtlx files found in {args.paths}")
+        return 1
+
+    results = []
+    for result in run_batch(
+        mx_file_paths,
+        output_dir=args.output_dir,
+        save=not args.no_save,
+        layout=args.layout,
+        validate=not args.no_validate,
+        jobs=args.jobs,
+        ng_abstraction=not args.no_ng_abstraction,
+    ):
+        results.append(result)
+        if result["error"]:
+            logger.error(f"[{len(results)}/{len(mx_file_paths)}] {result['path']}: {result['error']}")
+        elif result["valid"] is False:
+            logger.warning(f"[{len(results)}/{len(mx_file_paths)}] {result['path']} is invalid:\n{result['message']}")
+        else:
+            logger.info(f"[{len(results)}/{len(mx_file_paths)}] {result['path']} ({result['seconds']:.2f}s)")
+
+    failed_count = sum(1 for result in results if result["error"])
+    invalid_count = sum(1 for result in results if result["valid"] is False)
+    logger.info(f"Processed {len(results)} files, {failed_count} failed, {invalid_count} invalid")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(sorted(results, key=lambda result: result["path"]), f, indent=2)
+
+    return 1 if failed_count or invalid_count else 0
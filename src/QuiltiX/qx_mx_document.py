@@ -0,0 +1,538 @@
+import os
+import logging
+from contextlib import contextmanager
+
+from QuiltiX import constants
+
+
+logger = logging.getLogger(__name__)
+
+GROUP_NODE_TYPE = "Other.QxGroupNode"
+PORT_NODE_TYPES = ["Inputs.QxPortInputNode", "Outputs.QxPortOutputNode"]
+MAIN_NODE_GRAPH_NAME = "NG_main"
+# Inputs which are only written to the document when they are connected
+OPTIONAL_MATERIAL_INPUTS = ["displacementshader", "backsurfaceshader"]
+CONNECTION_ATTRIBUTES = ["nodename", "nodegraph", "output", "interfacename"]
+
+
+def get_mx_doc_signature(doc):
+    """Order independent representation of all elements and their attributes in a document.
+    Used to compare documents built in different ways.
+    """
+    return {
+        (
+            element.getNamePath(),
+            element.getCategory(),
+            tuple(sorted((name, element.getAttribute(name)) for name in element.getAttributeNames())),
+        )
+        for element in doc.traverseTree()
+    }
+
+
+class QxMxDocument(object):
+    """Shadow MaterialX document of a QxNodeGraph.
+
+    Instead of rebuilding the whole document from the serialized graph on every change, the document is patched
+    with the changes reported by the nodegraph signals. Any change that can't be patched invalidates the document,
+    which will then be fully rebuilt the next time it is requested.
+
+    Structural changes (creating, deleting and connecting nodes) are only patched in the root graph as long as it
+    doesn't contain any group nodes. Value changes are patched everywhere.
+    """
+
+    def __init__(self, qx_node_graph):
+        self.qx_node_graph = qx_node_graph
+        self.doc = None
+        self.qx_node_ids_to_mx_nodes = {}
+        self.mx_node_names_to_qx_node_ids = {}
+        self.ng_abstraction_enabled = None
+        self.ng_abstraction = False
+        self.has_group_nodes = False
+        self.moved_node_ids = set()
+        self.patched = False
+        self.rebuild_count = 0
+        self.patch_count = 0
+        self._suspended = False
+        # Whether a graph change was reported since the last undo stack change, and whether the last undo stack
+        # change is still waiting for one. Property changes are signalled before their commands are pushed, created
+        # and deleted nodes and ports after
+        self._has_seen_change = False
+        self._has_unreported_change = False
+        # Compare every patched document with a full rebuild. Slow, only meant for debugging
+        self.check_consistency = os.getenv("QUILTIX_CHECK_MX_DOC", "0") == "1"
+
+    @property
+    def is_valid(self):
+        return self.doc is not None
+
+    def invalidate(self):
+        if self.doc is not None:
+            logger.debug("invalidated shadow mx document")
+
+        self.doc = None
+        self._has_seen_change = False
+        self._has_unreported_change = False
+
+    @contextmanager
+    def suspend(self):
+        """Ignore all graph signals, e.g. while applying a change which is patched separately."""
+        suspended = self._suspended
+        self._suspended = True
+        try:
+            yield
+        finally:
+            self._suspended = suspended
+
+    def get_doc(self):
+        if self._has_unreported_change:
+            self.invalidate()
+
+        if self.doc is not None and self.qx_node_graph.is_ng_abstraction_enabled() != self.ng_abstraction_enabled:
+            self.invalidate()
+
+        if self.doc is None:
+            self.rebuild()
+            return self.doc
+
+        self._apply_moved_nodes()
+        if self.patched and self.check_consistency:
+            self.check()
+
+        return self.doc
+
+    def build_doc(self, qx_node_ids_to_mx_nodes=None):
+        serialized_data = self.qx_node_graph.get_current_graph_data()
+        doc = self.qx_node_graph.get_mx_doc_from_serialized_data(
+            serialized_data, qx_node_ids_to_mx_nodes=qx_node_ids_to_mx_nodes
+        )
+        has_group_nodes = any(
+            node_data["type_"] == GROUP_NODE_TYPE for node_data in serialized_data.get("nodes", {}).values()
+        )
+        return doc, has_group_nodes
+
+    def rebuild(self):
+        qx_node_ids_to_mx_nodes = {}
+        self.ng_abstraction_enabled = self.qx_node_graph.is_ng_abstraction_enabled()
+        self.doc, self.has_group_nodes = self.build_doc(qx_node_ids_to_mx_nodes)
+        self.ng_abstraction = self.ng_abstraction_enabled and not self.has_group_nodes
+        self.qx_node_ids_to_mx_nodes = qx_node_ids_to_mx_nodes
+        self.mx_node_names_to_qx_node_ids = {
+            mx_node.getName(): node_id for node_id, mx_node in qx_node_ids_to_mx_nodes.items()
+        }
+        self.moved_node_ids = set()
+        self.patched = False
+        self.rebuild_count += 1
+        logger.debug("rebuilt shadow mx document")
+
+    def check(self):
+        """Compare the patched document with a full rebuild. If they differ, the rebuilt document is used.
+
+        Returns:
+            bool: True if the patched document matches the rebuilt one
+        """
+        if self.doc is None:
+            return True
+
+        self._apply_moved_nodes()
+        rebuilt_doc, _ = self.build_doc()
+        patched_signature = get_mx_doc_signature(self.doc)
+        rebuilt_signature = get_mx_doc_signature(rebuilt_doc)
+        self.patched = False
+        if patched_signature == rebuilt_signature:
+            return True
+
+        logger.warning(
+            "Shadow mx document is out of sync:\n"
+            f"unexpected: {sorted(patched_signature - rebuilt_signature)}\n"
+            f"missing: {sorted(rebuilt_signature - patched_signature)}"
+        )
+        self.rebuild()
+        return False
+
+    def _can_patch_structure(self, *qx_nodes):
+        if self.doc is None or self.has_group_nodes:
+            return False
+
+        if self.qx_node_graph._block_save:
+            return False
+
+        for qx_node in qx_nodes:
+            if qx_node.graph is not self.qx_node_graph or qx_node.id not in self.qx_node_ids_to_mx_nodes:
+                return False
+
+        return True
+
+    def _apply_moved_nodes(self):
+        for node_id in self.moved_node_ids:
+            mx_node = self.qx_node_ids_to_mx_nodes.get(node_id)
+            qx_node = self.qx_node_graph.get_node_by_id(node_id)
+            if mx_node is None or qx_node is None:
+                continue
+
+            pos = qx_node.pos()
+            mx_node.setAttribute("xpos", str(pos[0] * constants.NODEGRAPH_NODE_POSITION_SERIALIZATION_SCALE))
+            mx_node.setAttribute("ypos", str(pos[1] * constants.NODEGRAPH_NODE_POSITION_SERIALIZATION_SCALE))
+
+        self.moved_node_ids = set()
+
+    def on_nodes_moved(self, node_ids):
+        self._note_change()
+        if self.doc is None or self._suspended:
+            return
+
+        self.moved_node_ids.update(node_ids)
+
+    def on_property_changed(self, qx_node, property_name, property_value):
+        self._note_change()
+        if self.doc is None or self._suspended:
+            return
+
+        if property_name == "name" and self._can_patch_structure(qx_node):
+            self._rename_mx_node(qx_node)
+            return
+
+        if property_name in ["name", "type"] or qx_node.type_ in PORT_NODE_TYPES:
+            self.invalidate()
+            return
+
+        if qx_node.graph.get_root_graph()._block_save:
+            self.invalidate()
+            return
+
+        input_name = self._get_input_name_from_property_name(qx_node, property_name)
+        if input_name is None:
+            # The property isn't written to the document
+            return
+
+        mx_node = self.qx_node_ids_to_mx_nodes.get(qx_node.id)
+        if mx_node is None:
+            self.invalidate()
+            return
+
+        mx_input = mx_node.getInput(input_name)
+        # Inputs which aren't written or which are connected don't hold a value
+        if mx_input is None or any(mx_input.hasAttribute(attr) for attr in CONNECTION_ATTRIBUTES):
+            return
+
+        self.qx_node_graph.set_mx_input_value(mx_input, self._get_input_value(qx_node, input_name))
+        self._mark_patched()
+
+    def on_node_created(self, qx_node):
+        self._note_pushed_change()
+        if self.doc is None or self._suspended:
+            return
+
+        if (
+            self.has_group_nodes
+            or self.qx_node_graph._block_save
+            or qx_node.graph is not self.qx_node_graph
+            or qx_node.type_ == GROUP_NODE_TYPE
+            or not getattr(qx_node, "current_mx_def", None)
+        ):
+            self.invalidate()
+            return
+
+        # Export the new node on its own and copy the result over, so it is written exactly like in a full rebuild
+        serialized_data = self.qx_node_graph._serialize([qx_node])
+        serialized_data.pop("connections", None)
+        qx_node_ids_to_mx_nodes = {}
+        node_doc = self.qx_node_graph.get_mx_doc_from_serialized_data(  # noqa: F841 keeps the elements alive
+            serialized_data, qx_node_ids_to_mx_nodes=qx_node_ids_to_mx_nodes
+        )
+        node_mx_node = qx_node_ids_to_mx_nodes.get(qx_node.id)
+        if node_mx_node is None:
+            # Nodes without outputs are not written to the document
+            return
+
+        mx_parent = self.doc
+        if node_mx_node.getParent().getName() == MAIN_NODE_GRAPH_NAME:
+            mx_parent = self.doc.getNodeGraph(MAIN_NODE_GRAPH_NAME)
+
+        mx_node = mx_parent.addChildOfCategory(node_mx_node.getCategory(), node_mx_node.getName())
+        mx_node.copyContentFrom(node_mx_node)
+        self.qx_node_ids_to_mx_nodes[qx_node.id] = mx_node
+        self.mx_node_names_to_qx_node_ids[mx_node.getName()] = qx_node.id
+        self._mark_patched()
+
+    def on_nodes_deleted(self, node_ids):
+        self._note_pushed_change()
+        if self.doc is None or self._suspended:
+            return
+
+        self.invalidate()
+
+    @contextmanager
+    def patch_deletion(self, qx_nodes):
+        """Patch the document for nodes deleted inside the context. The signals emitted while deleting are ignored.
+
+        Args:
+            qx_nodes (list of QxNode): Nodes which are going to be deleted
+        """
+        self._note_change()
+        if self._suspended or not self._can_patch_structure(*qx_nodes):
+            yield
+            self.invalidate()
+            return
+
+        deleted_node_ids = {qx_node.id for qx_node in qx_nodes}
+        downstream_ports = []
+        upstream_nodes = []
+        for qx_node in qx_nodes:
+            for output_port in qx_node.output_ports():
+                for connected_port in output_port.connected_ports():
+                    if connected_port.node().id not in deleted_node_ids:
+                        downstream_ports.append((connected_port.node(), connected_port.name()))
+
+            for input_port in qx_node.input_ports():
+                for connected_port in input_port.connected_ports():
+                    if connected_port.node().id not in deleted_node_ids:
+                        upstream_nodes.append(connected_port.node())
+
+        with self.suspend():
+            yield
+
+        for qx_node in qx_nodes:
+            self._remove_mx_ng_outputs(qx_node, [port.name() for port in qx_node.output_ports()])
+            mx_node = self.qx_node_ids_to_mx_nodes.pop(qx_node.id, None)
+            if mx_node is not None:
+                self.mx_node_names_to_qx_node_ids.pop(mx_node.getName(), None)
+                mx_node.getParent().removeChild(mx_node.getName())
+
+        for qx_node in upstream_nodes:
+            self._sync_mx_ng_outputs(qx_node)
+
+        for qx_node, input_name in downstream_ports:
+            self._sync_mx_input(qx_node, input_name)
+
+        self._mark_patched()
+
+    def on_port_changed(self, input_port, output_port):
+        """Patch the document after the given ports have been connected or disconnected."""
+        self._note_pushed_change()
+        if self.doc is None or self._suspended:
+            return
+
+        if input_port is None or output_port is None:
+            self.invalidate()
+            return
+
+        input_node = input_port.node()
+        output_node = output_port.node()
+        if not self._can_patch_structure(input_node, output_node):
+            self.invalidate()
+            return
+
+        # Connecting an input replaces its previous connection without a separate signal
+        mx_input = self.qx_node_ids_to_mx_nodes[input_node.id].getInput(input_port.name())
+        previous_node_id = self._get_connected_qx_node_id(mx_input)
+
+        for node_id in {previous_node_id, output_node.id}:
+            qx_node = self.qx_node_graph.get_node_by_id(node_id) if node_id else None
+            if qx_node is not None and node_id in self.qx_node_ids_to_mx_nodes:
+                self._sync_mx_ng_outputs(qx_node)
+
+        self._sync_mx_input(input_node, input_port.name())
+        self._mark_patched()
+
+    def on_unwritten_change(self):
+        """A graph change which isn't written to the document, like a node color."""
+        self._note_change()
+
+    def on_undo_stack_changed(self):
+        """Every graph change is pushed to the undo stack. If no signal is reported for one, the change can't be
+        patched, e.g. when NodeGraphQt drops the previous connection of an input without emitting anything.
+        """
+        if self._has_unreported_change:
+            self.invalidate()
+        elif self._has_seen_change:
+            self._has_seen_change = False
+        else:
+            self._has_unreported_change = True
+
+    def _note_change(self):
+        # Signalled before the change is pushed
+        self._has_seen_change = True
+
+    def _note_pushed_change(self):
+        # Signalled after the change was pushed
+        self._has_unreported_change = False
+
+    def _mark_patched(self):
+        self.patched = True
+        self.patch_count += 1
+
+    def _get_input_name_from_property_name(self, qx_node, property_name):
+        # See QxNode.get_property_name_from_mx_input
+        inputs = qx_node.inputs()
+        if property_name in inputs:
+            return property_name
+
+        if property_name.endswith("0") and property_name[:-1] in inputs:
+            return property_name[:-1]
+
+    def _get_input_value(self, qx_node, input_name):
+        custom_properties = qx_node.model.custom_properties
+        return custom_properties.get(input_name, custom_properties.get(input_name + "0"))
+
+    def _get_connected_qx_node_id(self, mx_input):
+        if mx_input is None:
+            return
+
+        node_name = mx_input.getNodeName()
+        if mx_input.getNodeGraphString() == MAIN_NODE_GRAPH_NAME:
+            mx_ng_output = self.doc.getNodeGraph(MAIN_NODE_GRAPH_NAME).getOutput(mx_input.getOutputString())
+            node_name = mx_ng_output.getNodeName() if mx_ng_output else ""
+
+        return self.mx_node_names_to_qx_node_ids.get(node_name)
+
+    def _get_mx_ng_output_name(self, qx_node, output_name, node_name=None):
+        return f"output_{node_name or qx_node.name()}_{output_name}"
+
+    def _get_mx_ng_output(self, qx_node, output_name):
+        if not self.ng_abstraction:
+            return
+
+        mx_node_graph = self.doc.getNodeGraph(MAIN_NODE_GRAPH_NAME)
+        return mx_node_graph.getOutput(self._get_mx_ng_output_name(qx_node, output_name))
+
+    def _remove_mx_ng_outputs(self, qx_node, output_names):
+        if not self.ng_abstraction:
+            return False
+
+        mx_node_graph = self.doc.getNodeGraph(MAIN_NODE_GRAPH_NAME)
+        changed = False
+        for output_name in output_names:
+            mx_output_name = self._get_mx_ng_output_name(qx_node, output_name)
+            if mx_node_graph.getOutput(mx_output_name):
+                mx_node_graph.removeOutput(mx_output_name)
+                changed = True
+
+        return changed
+
+    def _sync_mx_ng_outputs(self, qx_node):
+        """Add or remove the NG_main outputs of a node, which exist as long as any of its outputs is connected
+        to a material or surfaceshader node. Connections from the node are rerouted if they changed.
+        """
+        if self.doc is None or not self.ng_abstraction:
+            return
+
+        mx_def = qx_node.current_mx_def
+        needs_outputs = any(
+            getattr(connected_port.node(), "current_mx_def", None)
+            and connected_port.node().current_mx_def.getType() in ("material", "surfaceshader")
+            for output_port in qx_node.output_ports()
+            for connected_port in output_port.connected_ports()
+        )
+
+        output_names = []
+        if needs_outputs:
+            output_names = [
+                output_port.name()
+                for output_port in qx_node.output_ports()
+                if mx_def.getActiveOutput(output_port.name()).getType() not in ("material", "surfaceshader")
+            ]
+
+        changed = self._remove_mx_ng_outputs(
+            qx_node, [port.name() for port in qx_node.output_ports() if port.name() not in output_names]
+        )
+
+        mx_node_graph = self.doc.getNodeGraph(MAIN_NODE_GRAPH_NAME)
+        mx_node = self.qx_node_ids_to_mx_nodes[qx_node.id]
+        for output_name in output_names:
+            mx_output_name = self._get_mx_ng_output_name(qx_node, output_name)
+            if mx_node_graph.getOutput(mx_output_name):
+                continue
+
+            mx_output = mx_node_graph.addOutput(mx_output_name, mx_def.getActiveOutput(output_name).getType())
+            self._connect_mx_ng_output(mx_output, mx_node, output_name)
+            changed = True
+
+        if changed:
+            for output_port in qx_node.output_ports():
+                for connected_port in output_port.connected_ports():
+                    self._sync_mx_input(connected_port.node(), connected_port.name())
+
+    def _connect_mx_ng_output(self, mx_output, mx_node, output_name):
+        if mx_node.getType() == "multioutput":
+            mx_output.setConnectedOutput(mx_node.getActiveOutput(output_name))
+        else:
+            mx_output.setConnectedNode(mx_node)
+
+    def _rename_mx_node(self, qx_node):
+        """Rename the element of a node, its NG_main outputs and the connections to them."""
+        mx_node = self.qx_node_ids_to_mx_nodes[qx_node.id]
+        name = qx_node.name()
+        previous_name = mx_node.getName()
+        if name == previous_name:
+            return
+
+        output_names = [output_port.name() for output_port in qx_node.output_ports()]
+        mx_node_graph = self.doc.getNodeGraph(MAIN_NODE_GRAPH_NAME) if self.ng_abstraction else None
+        # Names which are taken by other elements, e.g. NG_main itself, are resolved by a rebuild
+        mx_output_names = [self._get_mx_ng_output_name(qx_node, output_name) for output_name in output_names]
+        if mx_node.getParent().getChild(name) or (
+            mx_node_graph is not None and any(mx_node_graph.getChild(output_name) for output_name in mx_output_names)
+        ):
+            self.invalidate()
+            return
+
+        mx_node.setName(name)
+        self.mx_node_names_to_qx_node_ids.pop(previous_name, None)
+        self.mx_node_names_to_qx_node_ids[name] = qx_node.id
+        if mx_node_graph is not None:
+            for output_name in output_names:
+                mx_output = mx_node_graph.getOutput(self._get_mx_ng_output_name(qx_node, output_name, previous_name))
+                if mx_output is not None:
+                    mx_output.setName(self._get_mx_ng_output_name(qx_node, output_name))
+                    self._connect_mx_ng_output(mx_output, mx_node, output_name)
+
+        for output_port in qx_node.output_ports():
+            for connected_port in output_port.connected_ports():
+                self._sync_mx_input(connected_port.node(), connected_port.name())
+
+        self._mark_patched()
+
+    def _sync_mx_input(self, qx_node, input_name):
+        """Rewrite an input of a node from the current state of the graph."""
+        mx_node = self.qx_node_ids_to_mx_nodes.get(qx_node.id)
+        if self.doc is None or mx_node is None:
+            return
+
+        mx_def_input = qx_node.current_mx_def.getActiveInput(input_name)
+        connected_ports = qx_node.inputs()[input_name].connected_ports()
+        has_geom_prop = bool(mx_def_input.getDefaultGeomProp())
+        is_optional = qx_node.type_ == "Material.Surfacematerial" and input_name in OPTIONAL_MATERIAL_INPUTS
+
+        mx_input = mx_node.getInput(input_name)
+        if not connected_ports and (has_geom_prop or is_optional):
+            if mx_input is not None:
+                mx_node.removeInput(input_name)
+
+            return
+
+        if mx_input is None:
+            mx_input = mx_node.addInput(input_name, mx_def_input.getType())
+
+        for attr in CONNECTION_ATTRIBUTES + ["value"]:
+            mx_input.removeAttribute(attr)
+
+        if not has_geom_prop:
+            self.qx_node_graph.set_mx_input_value(mx_input, self._get_input_value(qx_node, input_name))
+
+        if not connected_ports:
+            return
+
+        connected_port = connected_ports[0]
+        connected_mx_node = self.qx_node_ids_to_mx_nodes.get(connected_port.node().id)
+        if connected_mx_node is None:
+            self.invalidate()
+            return
+
+        mx_ng_output = self._get_mx_ng_output(connected_port.node(), connected_port.name())
+        if mx_ng_output is not None:
+            mx_input.setNodeGraphString(MAIN_NODE_GRAPH_NAME)
+            mx_input.setConnectedOutput(mx_ng_output)
+        elif connected_mx_node.getType() == "multioutput":
+            mx_input.setConnectedOutput(connected_mx_node.getActiveOutput(connected_port.name()))
+        else:
+            mx_input.setConnectedNode(connected_mx_node)
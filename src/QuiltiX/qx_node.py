@@ -1,5 +1,7 @@
 import random
 import logging
+import collections
+from contextlib import contextmanager
 
 from qtpy import QtCore, QtGui  # type: ignore
 
@@ -27,6 +29,8 @@ logger = logging.getLogger(__name__)
 MULTI_TYPE_PROPERTY_NAMES = [
     "default2",
 ]
+# Port signatures of MaterialX nodes whose node type is kept by MxNodeTypeResolver
+MX_NODE_TYPE_CACHE_SIZE = 1024
 
 
 class QxNodeBase(BaseNode):
@@ -79,6 +83,8 @@ class QxNodeBase(BaseNode):
 
 class QxNode(QxNodeBase):
     possible_mx_defs = None
+    # Ports of possible_mx_defs, see mx_node.MxNodeSignature
+    mx_signature = None
 
     def __init__(self, node_type=None, node_graph=None):
         super(QxNode, self).__init__(node_graph)
@@ -90,19 +96,40 @@ class QxNode(QxNodeBase):
         self.model._custom_prop = {}
 
         if node_type is None:
-            self.current_mx_def = next(iter(self.possible_mx_defs.values()))
+            node_type = next(iter(self.possible_mx_defs))
+            self.current_mx_def = self.possible_mx_defs[node_type]
             self.add_type_property()
         else:
             self.current_mx_def = self.possible_mx_defs[node_type]
             self.add_type_property(current_type_name=node_type)
 
+        # Displaytype of current_mx_def
+        self.current_mx_def_type = node_type
+
         self.initialize_type()
         logger.debug(f"Initialized {self.NODE_NAME} of type {self.type_}")
 
     @classmethod
     def from_mx_node(cls, mx_node, node_graph=None):
+        """Create a node with the definition, values and outputs of a MaterialX node, like update_from_mx_node
+        without creating the ports and properties of the default definition first.
+
+        Args:
+            mx_node (MaterialX.Node): Node to create the node from
+            node_graph (QxNodeGraph, optional): Graph of the node. Values are set without undo commands if None.
+
+        Returns:
+            QxNode: The created node
+        """
         mx_def_type = cls.get_displaytype_from_mx_node(cls, mx_node)
         qx_node = cls(node_type=mx_def_type, node_graph=node_graph)
+        if not mx_def_type:
+            return qx_node
+
+        with qx_node.view.deferred_draw():
+            qx_node.complete_outputs_for_multioutputs(mx_node)
+            qx_node.set_properties_from_mx_node(mx_node)
+
         return qx_node
 
     def get_displaytype_from_mx_node(self, mx_node):
@@ -292,92 +319,137 @@ class QxNode(QxNodeBase):
             return data_type
 
         # Check additionally for matching types in the first output
-        if from_port == "in":
-            mx_def_type_name_to_port_data_type_map = {
-                mx_def_name: mx_def.getInputs()[0].getType()
-                for mx_def_name, mx_def in self.possible_mx_defs.items()
-                if mx_def.getInputs()
-            }
-        elif from_port == "out":
-            mx_def_type_name_to_port_data_type_map = {
-                mx_def_name: mx_def.getOutputs()[0].getType()
-                for mx_def_name, mx_def in self.possible_mx_defs.items()
-                if mx_def.getOutputs()
-            }
-
-        if data_type not in mx_def_type_name_to_port_data_type_map.values():
+        possible_type_names = self.mx_signature.get_displaytypes_from_first_port_type(data_type, from_port)
+        if not possible_type_names:
             logger.warn(f"Could not find definition of type {data_type} for node {self.name()}")
             return
         else:
             # There can be multiple mx defs that match. Make a "good" guess with the first one we find :)
-            possible_type_names = [
-                mx_def_name
-                for mx_def_name, mx_def_type_name in mx_def_type_name_to_port_data_type_map.items()
-                if mx_def_type_name == data_type
-            ]
             data_type = possible_type_names[0]
             return data_type
 
     def change_type(self, type_name):
+        """Switch the node to another MaterialX definition. Only the ports and properties that differ between the
+        definitions are changed, connections of ports which keep their type are left untouched.
+
+        Args:
+            type_name (str): Displaytype of the definition, see possible_mx_defs
+        """
         if type_name not in self.possible_mx_defs:
             logger.warn(f"Could not find definition of type {type_name} for node {self.name()}")
             return
 
-        # Store connections & values for them to be restored later
-        original_values = self.properties()["custom"]
         original_mx_def = self.current_mx_def
-        original_input_connections = {inp: input_port.connected_ports() for inp, input_port in self.inputs().items()}
-        original_output_connections = {
-            outp: output_port.connected_ports() for outp, output_port in self.outputs().items()
-        }
+        mx_def = self.possible_mx_defs[type_name]
+        if mx_def is original_mx_def and type_name == self.current_mx_def_type:
+            return
 
-        for p in self.input_ports():
-            p.clear_connections()
-        for p in self.output_ports():
-            p.clear_connections()
+        # Store connections of the ports which are removed or change their type for them to be restored later
+        input_changes = self._get_port_changes(
+            self.input_ports(), original_mx_def.getActiveInputs(), mx_def.getActiveInputs()
+        )
+        output_changes = self._get_port_changes(
+            self.output_ports(), original_mx_def.getActiveOutputs(), mx_def.getActiveOutputs()
+        )
+        original_input_connections = self._clear_changed_port_connections(input_changes)
+        original_output_connections = self._clear_changed_port_connections(output_changes)
 
-        self.current_mx_def = self.possible_mx_defs[type_name]
+        self.current_mx_def = mx_def
+        self.current_mx_def_type = type_name
 
-        # Remove current node data
         self.set_port_deletion_allowed(True)
-        self.set_ports({"input_ports": [], "output_ports": []})
-        # TODO maybe more selective?
-        self.model._custom_prop = {}
+        with self.view.deferred_draw():
+            self._apply_port_changes(input_changes, self.delete_input, self.add_input)
+            self._apply_port_changes(output_changes, self.delete_output, self.add_output)
 
-        # Readd current node data
-        self.add_type_property(current_type_name=type_name)
-        self.initialize_type()
+        self._change_properties(original_mx_def)
 
         self.refresh_port_tooltips()
 
-        self._restore_values(original_values, original_mx_def)
+        # The document of the graph isn't notified about the changed ports and properties
+        if self.graph is not None:
+            self.graph.get_root_graph().shadow_mx_doc.invalidate()
 
         # TODO: create convert node between connections if port types don't match and if conversion possible
         self._restore_input_connections(original_input_connections)
         self._restore_output_connections(original_output_connections)
 
-    def _restore_values(self, original_values, original_mx_def):
-        original_types = { i.getName(): i.getType() for i in original_mx_def.getInputs() }
-        new_types = { i.getName(): i.getType() for i in self.current_mx_def.getInputs() }
+    @staticmethod
+    def _get_port_changes(ports, original_mx_ports, mx_ports):
+        """Compare the ports of the node with the ports of a new definition. Ports are kept up to the first one that
+        differs by name, to keep the order of the definition. Kept ports may change their type.
 
-        for property_name, value in original_values.items():
-            # Skip if the property name describes the node type
-            if property_name == "type":
-                continue
+        Returns:
+            tuple(list, list, list): Kept ports and their new mx ports which change their type, removed ports and mx
+                ports to add
+        """
+        original_types = {mx_port.getName(): mx_port.getType() for mx_port in original_mx_ports}
+        kept_count = 0
+        for port, mx_port in zip(ports, mx_ports):
+            if port.name() != mx_port.getName():
+                break
+
+            kept_count += 1
+
+        retyped_ports = [
+            (port, mx_port)
+            for port, mx_port in zip(ports[:kept_count], mx_ports)
+            if original_types.get(port.name()) != mx_port.getType()
+        ]
+        return retyped_ports, ports[kept_count:], mx_ports[kept_count:]
+
+    @staticmethod
+    def _clear_changed_port_connections(port_changes):
+        retyped_ports, removed_ports, _ = port_changes
+        original_connections = {}
+        for port in [port for port, _ in retyped_ports] + removed_ports:
+            original_connections[port.name()] = port.connected_ports()
+            port.clear_connections()
+
+        return original_connections
+
+    def _apply_port_changes(self, port_changes, delete_port, add_port):
+        retyped_ports, removed_ports, added_mx_ports = port_changes
+        for port, mx_port in retyped_ports:
+            color = self._random_color_from_string(str(mx_port.getType()))
+            port.view.color = color
+            port.view.border_color = [min([255, max([0, i + 80])]) for i in color]
+            port.view.update()
+
+        for port in removed_ports:
+            delete_port(port)
+
+        for mx_port in added_mx_ports:
+            # TODO: actively chose colors instead of random
+            add_port(mx_port.getName(), color=self._random_color_from_string(str(mx_port.getType())))
 
-            # Skip if the property doesn't exist on the node's custom properties anymore
-            if property_name not in self.properties()["custom"]:
+    def _change_properties(self, original_mx_def):
+        """Recreate the custom properties for current_mx_def, keeping the values of the properties which still
+        exist. Properties that keep their type aren't created again.
+        """
+        original_values = self.model._custom_prop
+        original_types = {i.getName(): i.getType() for i in original_mx_def.getInputs()}
+        new_types = {i.getName(): i.getType() for i in self.current_mx_def.getInputs()}
+
+        self.model._custom_prop = {}
+        self.add_type_property(current_type_name=self.current_mx_def_type)
+        for mx_input in self.current_mx_def.getActiveInputs():
+            property_name = self.get_property_name_from_mx_input(mx_input.getName())
+            if property_name not in original_values:
+                self.__class__.create_property_from_mx_input(mx_input, self)
                 continue
 
             # Skip if the property name has not changed, but the property type has
-            if (
-                property_name in original_types
-                and property_name in new_types
-                and original_types[property_name] != new_types[property_name]
-            ):
+            if property_name in original_types and property_name in new_types:
+                if original_types[property_name] != new_types[property_name]:
+                    self.__class__.create_property_from_mx_input(mx_input, self)
+                    continue
+
+                self.model._custom_prop[property_name] = original_values[property_name]
                 continue
 
-            self.set_property(property_name, value)
+            self.__class__.create_property_from_mx_input(mx_input, self)
+            self.model._custom_prop[property_name] = original_values[property_name]
 
     def _restore_input_connections(self, original_input_connections):
         for input_name, input_port in self.inputs().items():
@@ -533,6 +605,7 @@ class QxGroupNode(QxGroupNodeBase):
         super(QxGroupNode, self).__init__(qgraphics_item or QxGroupNodeItem)
         self.set_color(50, 8, 25)
         self.possible_mx_defs = {}
+        self.mx_signature = mx_node.MxNodeSignature({})
         self.set_port_deletion_allowed(True)
 
     def expand(self):
@@ -814,9 +887,36 @@ class QxPortOutputNode(PortOutputNode):
 
 
 class QxNodeItem(NodeItem):
+    # Whether drawing is deferred until the end of deferred_draw, and whether a draw was requested meanwhile
+    _draw_deferred = False
+    _draw_pending = False
+
     def __init__(self, name='node', parent=None):
         super(QxNodeItem, self).__init__(name, parent)
 
+    @contextmanager
+    def deferred_draw(self):
+        """Draw the node once after the context, instead of after every added or removed port."""
+        if self._draw_deferred:
+            yield
+            return
+
+        self._draw_deferred = True
+        self._draw_pending = False
+        try:
+            yield
+        finally:
+            self._draw_deferred = False
+            if self._draw_pending:
+                self.draw_node()
+
+    def draw_node(self):
+        if self._draw_deferred:
+            self._draw_pending = True
+            return
+
+        super(QxNodeItem, self).draw_node()
+
     def add_input(self, name='input', multi_port=False, display_name=True,
                   locked=False):
         """
@@ -989,27 +1089,164 @@ class QxGroupNodeItem(QxNodeItem):
         super(QxGroupNodeItem, self).mouseDoubleClickEvent(event)
 
 
-def qx_node_from_mx_node_group_dict_generator(mx_node_defs):
+class QxNodePlaceholder(object):
+    """Lightweight stand-in for a QxNode subclass which gets registered to the node factory instead of the class
+    itself. The actual class is only created the first time it is needed, e.g. when a node of this type gets
+    created, searched or deserialized.
+    """
+
+    def __init__(self, node_name, identifier, label, mx_node_defs, mx_signature):
+        self.NODE_NAME = node_name
+        self.__identifier__ = identifier
+        self.__label__ = label
+        # Matches the type_ of the node class, as its class name is the node name
+        self.type_ = f"{identifier}.{node_name}"
+        self.mx_node_defs = mx_node_defs
+        # Available without creating the class
+        self.mx_signature = mx_signature
+        self._node_class = None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.type_}>"
+
+    def __call__(self, *args, **kwargs):
+        return self.materialize()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Only called for attributes the placeholder doesn't have itself
+        if name.startswith("__") or name == "_node_class":
+            raise AttributeError(name)
+
+        return getattr(self.materialize(), name)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # Sub graphs deepcopy the node factory, but should share the node classes
+        return self
+
+    @property
+    def is_materialized(self):
+        return self._node_class is not None
+
+    def materialize(self):
+        if self._node_class is None:
+            self._node_class = type(
+                self.NODE_NAME,
+                (QxNode,),
+                {
+                    "NODE_NAME": self.NODE_NAME,
+                    "__identifier__": self.__identifier__,
+                    "__label__": self.__label__,
+                    "possible_mx_defs": self.mx_node_defs,
+                    "mx_signature": self.mx_signature,
+                },
+            )
+
+        return self._node_class
+
+
+class MxNodeTypeResolver(object):
+    """Node types to create for MaterialX nodes whose category is registered as several node types, e.g.
+    pbr.multiply and math.multiply. The definitions of the node types are indexed by category and output type
+    when they are registered, and the node types resolved for the port signatures of MaterialX nodes are kept in a
+    least recently used cache.
+    """
+
+    def __init__(self, cache_size=MX_NODE_TYPE_CACHE_SIZE):
+        self.cache_size = cache_size
+        # { node name : [node type] }
+        self._node_types = {}
+        # { (node name, output type) : [(node type, displaytype, mx_signature)] }, in the order they were registered
+        self._candidates = {}
+        # { (node name, output type, inputs, outputs) : node type }, the least recently used first
+        self._resolved = collections.OrderedDict()
+
+    def clear(self):
+        self._node_types = {}
+        self._candidates = {}
+        self._resolved = collections.OrderedDict()
+
+    def add_node_type(self, node):
+        """
+        Args:
+            node (type): Registered node class or placeholder, nodes without a mx_signature are skipped
+        """
+        mx_signature = getattr(node, "mx_signature", None)
+        if mx_signature is None:
+            return
+
+        node_types = self._node_types.setdefault(node.NODE_NAME, [])
+        if node.type_ in node_types:
+            return
+
+        node_types.append(node.type_)
+        for displaytype in mx_signature.displaytypes:
+            output_type = next(iter(mx_signature.get_outputs(displaytype).values()), None)
+            self._candidates.setdefault((node.NODE_NAME, output_type), []).append(
+                (node.type_, displaytype, mx_signature)
+            )
+
+        self._resolved.clear()
+
+    def resolve(self, mx_node):
+        """Get the node type with a definition that has all the ports of the MaterialX node with the same types.
+
+        Args:
+            mx_node (mx.Node): MaterialX node to create
+
+        Returns:
+            str: The node type, the last registered one if several match. None if none matches.
+        """
+        key = (
+            mx_node.getCategory().capitalize(),
+            mx_node.getType(),
+            tuple((mx_input.getName(), mx_input.getType()) for mx_input in mx_node.getActiveInputs()),
+            tuple((mx_output.getName(), mx_output.getType()) for mx_output in mx_node.getActiveOutputs()),
+        )
+        if key in self._resolved:
+            self._resolved.move_to_end(key)
+            return self._resolved[key]
+
+        node_type = self._match(*key)
+        self._resolved[key] = node_type
+        if len(self._resolved) > self.cache_size:
+            self._resolved.popitem(last=False)
+
+        return node_type
+
+    def _match(self, node_name, output_type, inputs, outputs):
+        for node_type, displaytype, mx_signature in reversed(self._candidates.get((node_name, output_type), ())):
+            def_inputs = mx_signature.get_inputs(displaytype)
+            def_outputs = mx_signature.get_outputs(displaytype)
+            if all(def_inputs.get(name) == type_ for name, type_ in inputs) and all(
+                def_outputs.get(name) == type_ for name, type_ in outputs
+            ):
+                return node_type
+
+        return None
+
+
+def qx_node_from_mx_node_group_dict_generator(mx_node_defs, mx_node_group_dict=None):
     """_summary_
 
     Args:
         mx_node_defs (list of mx_defs): _description_
+        mx_node_group_dict (dict, optional): Already grouped definitions, e.g. restored from the library cache.
+            Takes precedence over mx_node_defs.
 
     Yields:
-        QxNode: _description_
+        QxNodePlaceholder: Placeholder of the QxNode subclass, which is created on first use
     """
-    grp_dict = mx_node.get_mx_node_group_dict(mx_node_defs)
+    grp_dict = mx_node_group_dict or mx_node.get_mx_node_group_dict(mx_node_defs)
     for mx_node_group, mx_node_def_name_dict in grp_dict.items():
         for mx_node_def_name, mx_node_defs in mx_node_def_name_dict.items():
             label = f"{mx_node_group.capitalize()}.{mx_node_def_name.capitalize()}"
-            qx_node = type(
-                mx_node_def_name.capitalize(),
-                (QxNode,),
-                {
-                    "NODE_NAME": mx_node_def_name.capitalize(),
-                    "__identifier__": mx_node_group.capitalize(),
-                    "__label__": label,
-                    "possible_mx_defs": mx_node_defs,
-                },
+            # Cached definitions already know their ports
+            mx_signature = getattr(mx_node_defs, "mx_signature", None) or mx_node.MxNodeSignature.from_mx_defs(
+                mx_node_defs
+            )
+            yield QxNodePlaceholder(
+                mx_node_def_name.capitalize(), mx_node_group.capitalize(), label, mx_node_defs, mx_signature
             )
-            yield qx_node
@@ -0,0 +1,108 @@
+import re
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# Same pattern NodeGraphQt uses to strip the number of a name
+NAME_NUMBER_RE = re.compile(r"[\w ]+(?: )*(\d+)")
+NUMBERED_NAME_RE = re.compile(r"^(.+)_(\d+)$")
+
+
+class NodeNameRegistry(object):
+    """Names of the nodes of a graph, to create unique names without comparing against all nodes.
+
+    Nodes are registered when they are created, added or renamed, renaming releases their previous name. Entries of
+    deleted nodes are dropped once they are looked up. Changes which aren't reported, like undoing, must invalidate the
+    registry, which is then rebuilt from the nodes of the graph.
+
+    Unique names are numbered per prefix, starting from the lowest number that isn't known to be taken.
+    """
+
+    def __init__(self, qx_node_graph):
+        self.qx_node_graph = qx_node_graph
+        # { name : node }, None until built
+        self._nodes = None
+        # { node id : registered name }
+        self._node_names = {}
+        # { prefix : lowest number which might be free }
+        self._counters = {}
+        self._generation = None
+
+    def invalidate(self):
+        self._nodes = None
+        self._node_names = {}
+        self._counters = {}
+
+    def register(self, node):
+        nodes = self._get_nodes()
+        name = node.name()
+        previous_name = self._node_names.get(node.id)
+        nodes[name] = node
+        self._node_names[node.id] = name
+        if previous_name is not None and previous_name != name:
+            self.release(previous_name)
+
+    def release(self, name):
+        """Make the number of a name available again, e.g. after deleting its node."""
+        nodes = self._get_nodes()
+        node = nodes.get(name)
+        if node is not None and not self._is_current(name, node):
+            del nodes[name]
+
+        match = NUMBERED_NAME_RE.match(name)
+        if match:
+            prefix, number = match.group(1), int(match.group(2))
+            if number < self._counters.get(prefix, 1):
+                self._counters[prefix] = number
+
+    def is_taken(self, name):
+        nodes = self._get_nodes()
+        node = nodes.get(name)
+        if node is None:
+            return False
+
+        if self._is_current(name, node):
+            return True
+
+        del nodes[name]
+        return False
+
+    def get_unique_name(self, name):
+        """
+        Args:
+            name (str): Requested node name
+
+        Returns:
+            str: The name with its whitespace replaced, numbered if it is already taken
+        """
+        name = "_".join(name.split())
+        if not self.is_taken(name):
+            return name
+
+        search = NAME_NUMBER_RE.search(name)
+        if search:
+            version = search.group(1)
+            name = name[: len(version) * -1].strip()
+
+        number = self._counters.get(name, 1)
+        while self.is_taken(f"{name}_{number}"):
+            number += 1
+
+        # Only taken once the node with the name is registered
+        self._counters[name] = number
+        return f"{name}_{number}"
+
+    def _is_current(self, name, node):
+        return self.qx_node_graph.model.nodes.get(node.id) is node and node.name() == name
+
+    def _get_nodes(self):
+        generation = self.qx_node_graph.get_root_graph().node_names_generation
+        if self._nodes is None or self._generation != generation:
+            all_nodes = self.qx_node_graph.all_nodes()
+            self._nodes = {node.name(): node for node in all_nodes}
+            self._node_names = {node.id: node.name() for node in all_nodes}
+            self._counters = {}
+            self._generation = generation
+
+        return self._nodes
@@ -20,6 +20,7 @@ from qtpy.QtWidgets import (  # type: ignore
 
 from QuiltiX import constants
 from QuiltiX.qx_node_property_widgets import QxPropColorPickerRGBAFloat, QxPropColorPickerRGBFloat, QxPropFilePath
+from QuiltiX.qx_profiler import profiled
 
 logger = logging.getLogger(__name__)
 
@@ -87,6 +88,7 @@ class NodePropWidget(node_property_widgets.NodePropWidget):
         self.setAttribute(Qt.WA_StyledBackground, True)
         # custom end
 
+    @profiled()
     def _read_node(self, node):
         """
         Populate widget from a node.
@@ -1,16 +1,22 @@
 import os
-import re
 import logging
 import copy
-from contextlib import contextmanager
+from contextlib import ExitStack, contextmanager
 
 import NodeGraphQt
+from NodeGraphQt.base.commands import NodeAddedCmd
+from NodeGraphQt.errors import NodeCreationError
 from NodeGraphQt.nodes.group_node import GroupNode
 from qtpy import QtCore, QtGui, QtWidgets  # type: ignore
 from QuiltiX.qx_nodegraph_viewer import QxNodeGraphViewer  
 
 import QuiltiX.qx_node as qx_node_module
-from QuiltiX import constants
+from QuiltiX import constants, mx_library_cache, mx_validation
+from QuiltiX.qx_mx_document import QxMxDocument
+from QuiltiX.qx_node_names import NodeNameRegistry
+from QuiltiX.qx_port import PortTypeNodeIndex
+from QuiltiX.qx_profiler import profiled
+from QuiltiX.update_scheduler import UpdateScheduler
 
 import MaterialX as mx  # type: ignore
 
@@ -18,6 +24,186 @@ import MaterialX as mx  # type: ignore
 logger = logging.getLogger(__name__)
 
 
+def get_serialized_connection_index(serialized_data):
+    """Index the connections of a serialized (sub)graph by their ports.
+
+    Args:
+        serialized_data (dict): Serialized graph data
+
+    Returns:
+        tuple(dict, dict): { (node_id, input_name) : connection }, { (node_id, output_name) : [connection] }
+    """
+    connections_by_input = {}
+    connections_by_output = {}
+    for connection in serialized_data.get("connections", []):
+        connections_by_input.setdefault(tuple(connection["in"]), connection)
+        connections_by_output.setdefault(tuple(connection["out"]), []).append(connection)
+
+    return connections_by_input, connections_by_output
+
+
+class IndexedNodeDict(dict):
+    """Nodes of the model of a graph, { node id : node }, which keeps the node index of the root graph up to date.
+    NodeGraphQt adds and removes the nodes of a model by setting and popping its items.
+    """
+
+    def __init__(self, qx_node_graph, *args, **kwargs):
+        super(IndexedNodeDict, self).__init__(*args, **kwargs)
+        self.qx_node_graph = qx_node_graph
+        self.get_node_index().update(self)
+
+    def get_node_index(self):
+        return self.qx_node_graph.get_root_graph().node_index
+
+    def __setitem__(self, node_id, node):
+        super(IndexedNodeDict, self).__setitem__(node_id, node)
+        self.get_node_index()[node_id] = node
+
+    def __delitem__(self, node_id):
+        self._unindex(node_id, self[node_id])
+        super(IndexedNodeDict, self).__delitem__(node_id)
+
+    def pop(self, node_id, *args):
+        node = super(IndexedNodeDict, self).pop(node_id, *args)
+        self._unindex(node_id, node)
+        return node
+
+    def clear(self):
+        for node_id, node in self.items():
+            self._unindex(node_id, node)
+
+        super(IndexedNodeDict, self).clear()
+
+    def _unindex(self, node_id, node):
+        node_index = self.get_node_index()
+        # Ids of deleted nodes may be reused by new nodes
+        if node_index.get(node_id) is node:
+            del node_index[node_id]
+
+
+class BulkBuildCmd(QtWidgets.QUndoCommand):
+    """Nodes created during QxNodeGraph.bulk_build, which are undone and redone as a whole. The command is pushed
+    once the build is finished, its nodes and their connections already exist then.
+
+    Only nodes of the graph of the build are removed when undoing, nodes created in sub graphs are part of the
+    sessions of their group nodes.
+    """
+
+    def __init__(self, graph, label):
+        QtWidgets.QUndoCommand.__init__(self)
+        self.setText(label)
+        self.graph = graph
+        # Nodes of the graph of the build
+        self.nodes = []
+        # (input port, output port) of the nodes
+        self.connections = []
+        # (node, ports) of all graphs, the tooltips of the ports are refreshed when the build is finished
+        self._created_nodes = []
+        self._deferred_draws = ExitStack()
+        # { scene : item index method }
+        self._scene_index_methods = {}
+        self._is_pushed = False
+
+    def add_node(self, graph, node):
+        """Defer drawing a node created during the build until it is finished."""
+        if graph is self.graph:
+            self.nodes.append(node)
+
+        if hasattr(node.view, "deferred_draw"):
+            self._deferred_draws.enter_context(node.view.deferred_draw())
+
+        scene = graph.scene()
+        if scene not in self._scene_index_methods:
+            # Indexing every added item is slower than indexing all of them at once
+            self._scene_index_methods[scene] = scene.itemIndexMethod()
+            scene.setItemIndexMethod(QtWidgets.QGraphicsScene.NoIndex)
+
+    def on_node_created(self, node):
+        self._created_nodes.append((node, node.input_ports() + node.output_ports()))
+
+    def finish(self):
+        self._deferred_draws.close()
+        for scene, index_method in self._scene_index_methods.items():
+            scene.setItemIndexMethod(index_method)
+
+        self._scene_index_methods = {}
+        for node, ports in self._created_nodes:
+            # Otherwise updated when the node is added to the scene, but the node wasn't drawn yet
+            node.model.width = node.view.width
+            node.model.height = node.view.height
+            for port in ports:
+                if hasattr(port.view, "refresh_tool_tip"):
+                    port.view.refresh_tool_tip()
+
+                port.view.redraw_connected_pipes()
+
+        self._created_nodes = []
+        connections = set()
+        for node in self.nodes:
+            for port in node.input_ports():
+                connections.update((port, connected_port) for connected_port in port.connected_ports())
+
+            for port in node.output_ports():
+                connections.update((connected_port, port) for connected_port in port.connected_ports())
+
+        self.connections = list(connections)
+
+    def undo(self):
+        nodes = [node for node in self.nodes if self.graph.get_node_by_id(node.id) is node]
+        self.graph.delete_nodes(nodes, push_undo=False)
+
+    def redo(self):
+        # The nodes were already created when the command is pushed
+        if not self._is_pushed:
+            self._is_pushed = True
+            return
+
+        for node in self.nodes:
+            NodeAddedCmd(self.graph, node, node.pos()).redo()
+
+        for input_port, output_port in self.connections:
+            if output_port not in input_port.connected_ports():
+                input_port.connect_to(output_port, push_undo=False)
+
+        self.graph.invalidate_mx_doc()
+        self.graph.invalidate_node_names()
+
+
+class NodeLookup(object):
+    """Nodes created while loading MaterialX elements by graph and name, so wiring their connections doesn't search
+    the graphs for every connection. Nodes which weren't added are looked up in their graph.
+    """
+
+    def __init__(self):
+        # { graph : { name : node } }
+        self._nodes = {}
+        # { (sub graph, port node type) : port node }
+        self._port_nodes = {}
+
+    def add(self, node):
+        self._nodes.setdefault(node.graph, {})[node.name()] = node
+
+    def get_node_by_name(self, graph, name):
+        node = self._nodes.get(graph, {}).get(name)
+        if node is None:
+            node = graph.get_node_by_name(name)
+
+        return node
+
+    def get_input_port_node(self, sub_graph):
+        return self._get_port_node(sub_graph, qx_node_module.QxPortInputNode.type_)
+
+    def get_output_port_node(self, sub_graph):
+        return self._get_port_node(sub_graph, qx_node_module.QxPortOutputNode.type_)
+
+    def _get_port_node(self, sub_graph, node_type):
+        key = (sub_graph, node_type)
+        if key not in self._port_nodes:
+            self._port_nodes[key] = sub_graph.get_nodes_by_type(node_type)[0]
+
+        return self._port_nodes[key]
+
+
 class QxNodeGraph(NodeGraphQt.NodeGraph):
     """
     Signal triggered when a node inside the nodegraph type has been changed.
@@ -33,6 +219,9 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
     mx_file_loaded = QtCore.Signal(object)
     potentially_node_graph_changed = QtCore.Signal(object)
     node_graph_changed = QtCore.Signal(object)
+    # bool : valid
+    # str : validation messages
+    mx_doc_validated = QtCore.Signal(bool, str)
 
     def __init__(self, parent=None, node_factory=None, **kwargs):
         kwargs["viewer"] = kwargs.get("viewer") or QxNodeGraphViewer(self)
@@ -40,11 +229,19 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
         if self._undo_stack:
             self._viewer._undo_action = self._undo_stack.createUndoAction(self, '&Undo')
             self._viewer._redo_action = self._undo_stack.createRedoAction(self, '&Redo')
+            # (index, count) of the undo stack, to tell pushed commands from undoing and redoing
+            self._undo_stack_state = (self._undo_stack.index(), self._undo_stack.count())
+            self._undo_stack.indexChanged.connect(self.on_undo_stack_index_changed)
 
         self._block_save = False
+        # Command of the running bulk_build, only set in the root graph
+        self._bulk_build_cmd = None
         self.auto_update_ng = False
         self.auto_update_prop = True
+        # Used if the graph isn't part of the editor, which has an option for it
+        self.ng_abstraction = True
         self.copy_to_ng_cmds = {}
+        self.nodes_registered.connect(self.on_nodes_registered)
         self.node_created.connect(self.on_node_created)
         self.nodes_deleted.connect(self.on_nodes_deleted)
         self.property_changed.connect(self.on_property_changed)
@@ -56,23 +253,102 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
 
         # Initialize mx containers
         # The library document holds all the node definitions loaded and available for the nodegraph
-        self.mx_library_doc = mx.createDocument()
-        # The mx definitions available for the nodegraphself._realtime_update
-        self.mx_defs = None
+        self._mx_library_doc = mx.createDocument()
+        # Libraries registered from the on-disk cache, which are only parsed once the library document is needed
+        self._pending_mx_libraries = []
+        # Names of the mx definitions registered in the nodegraph
+        self._mx_def_names = set()
+        # Registered nodes by the types of their ports, to filter the tab search by a port
+        self.port_type_node_index = PortTypeNodeIndex()
+        # Node types of MaterialX nodes whose category is registered as several node types
+        self.mx_node_type_resolver = qx_node_module.MxNodeTypeResolver()
         # Keeping track what node graph we are currently in
         self.current_node_graph = self
+        # MaterialX document of the graph, which is patched as the graph changes
+        self.shadow_mx_doc = QxMxDocument(self)
+        # Nodes of the root graph and all expanded sub graphs, { node id : node }. Only used in the root graph
+        self.node_index = {}
+        # Names of the nodes in the graph, used to create unique names
+        self.node_name_registry = NodeNameRegistry(self)
+        # Incremented to rebuild the name registries of the root graph and all sub graphs
+        self.node_names_generation = 0
+        if self.is_root:
+            # Sub graphs index their nodes once their parent graph is set
+            self._model.nodes = IndexedNodeDict(self, self._model.nodes)
+        # Merges the updates of the viewport and validation triggered by graph changes
+        self.update_scheduler = UpdateScheduler(self)
+        # Validates the graph in the background
+        self.mx_doc_validator = mx_validation.MxDocValidator(self)
+        self.mx_doc_validator.validated.connect(self.mx_doc_validated)
 
     @property
     def subnodegraph_class(self):
         from QuiltiX.qx_subnodegraph import QxSubNodeGraph
         return QxSubNodeGraph
 
+    @property
+    def mx_library_doc(self):
+        if self._pending_mx_libraries:
+            pending_mx_libraries = self._pending_mx_libraries
+            self._pending_mx_libraries = []
+            with self.get_root_graph().mx_doc_validator.pause():
+                for search_path, library_folders in pending_mx_libraries:
+                    mx.loadLibraries(library_folders, mx.FileSearchPath(search_path), self._mx_library_doc)
+                    logger.debug(f"loaded deferred definitions from {search_path}")
+
+        return self._mx_library_doc
+
+    @mx_library_doc.setter
+    def mx_library_doc(self, doc):
+        self._pending_mx_libraries = []
+        self._mx_library_doc = doc
+
+    @property
+    def mx_defs(self):
+        # The mx definitions available for the nodegraph
+        if not self._mx_def_names:
+            return None
+
+        return self.mx_library_doc.getNodeDefs()
+
     @contextmanager
     def block_save(self):
         self._block_save = True
         yield
         self._block_save = False
 
+    @contextmanager
+    def bulk_build(self, label="build graph"):
+        """Create many nodes at once, e.g. when loading a document.
+
+        Nodes created in the graph or its sub graphs meanwhile aren't pushed to the undo stack and don't emit
+        node_created. They are drawn and their port tooltips are refreshed once the build is finished, which is then
+        pushed as a single undo command. Connections should be made without pushing them to the undo stack, see
+        is_bulk_building.
+
+        Args:
+            label (str, optional): Text of the undo command
+        """
+        root_graph = self.get_root_graph()
+        if root_graph._bulk_build_cmd is not None:
+            yield
+            return
+
+        bulk_build_cmd = BulkBuildCmd(self, label)
+        root_graph._bulk_build_cmd = bulk_build_cmd
+        try:
+            yield
+        finally:
+            root_graph._bulk_build_cmd = None
+            bulk_build_cmd.finish()
+            self.invalidate_mx_doc()
+            self._undo_stack.push(bulk_build_cmd)
+            if not root_graph._block_save:
+                self.potentially_node_graph_changed.emit(self)
+
+    def is_bulk_building(self):
+        return self.get_root_graph()._bulk_build_cmd is not None
+
     # custom start - added function
     def get_root_graph(self, node_graph=None):
         if not node_graph:
@@ -100,6 +376,7 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
         self.potentially_node_graph_changed.emit(self)
         super()._on_node_selected(node_id)
 
+    @profiled()
     def load_mx_libraries(self, search_paths=None, library_folders=None, library_path=None, add_to_lib_doc=True):
         if search_paths is None:
             search_paths = []
@@ -108,35 +385,43 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
             library_folders = []
 
         if add_to_lib_doc:
-            doc = self.mx_library_doc
+            new_records = []
+            for search_path in search_paths:
+                new_records += self._load_mx_library_records(search_path, library_folders)
+
+            if library_path:
+                doc = self.mx_library_doc
+                with self.get_root_graph().mx_doc_validator.pause():
+                    mx.loadLibrary(library_path, doc)
+                logger.debug(f"loaded definitions from {library_path}")
+                new_records += self._get_new_mx_def_records(doc)
         else:
             doc = mx.createDocument()
             doc.importLibrary(self.mx_library_doc)
+            for search_path in search_paths:
+                mx.loadLibraries(library_folders, mx.FileSearchPath(search_path), doc)
 
-        for search_path in search_paths:
-            mx_search_path = mx.FileSearchPath(search_path)
-            defs = mx.loadLibraries(library_folders, mx_search_path, doc)
-            logger.debug(f"loaded definitions from {search_path}: {len(defs)}")
-
-        if library_path:
-            mx.loadLibrary(library_path, doc)
-            logger.debug(f"loaded definitions from {library_path}")
+            if library_path:
+                mx.loadLibrary(library_path, doc)
+                logger.debug(f"loaded definitions from {library_path}")
 
-        if self.mx_defs:
-            mx_defs = [mx_def for mx_def in doc.getNodeDefs() if mx_def not in self.mx_defs]
-        else:
-            mx_defs = doc.getNodeDefs()
+            new_records = self._get_new_mx_def_records(doc)
 
         new_defs = []
-        if mx_defs:
-            new_defs = qx_node_module.qx_node_from_mx_node_group_dict_generator(mx_defs)
+        if new_records:
+            if add_to_lib_doc:
+                mx_def_getter = self._get_mx_library_node_def
+            else:
+                mx_def_getter = doc.getNodeDef
+
+            mx_node_group_dict = mx_library_cache.get_mx_node_group_dict_from_records(new_records, mx_def_getter)
+            new_defs = list(qx_node_module.qx_node_from_mx_node_group_dict_generator(None, mx_node_group_dict))
             self.register_nodes(new_defs)
 
             node_menu = self.context_nodes_menu()
-            for mx_def in mx_defs:
-                if self.has_nodegraph_implementation(mx_def):
-                    
-                    node_type = f"{mx_def.getNodeGroup().capitalize()}.{mx_def.getNodeString().capitalize()}"
+            for record in new_records:
+                if record["nodegraph"]:
+                    node_type = f"{record['group'].capitalize()}.{record['nodestring'].capitalize()}"
                     if not node_menu.qmenu.get_menu(node_type):
                         self.copy_to_ng_cmds[node_type] = node_menu.add_command(
                             "Copy to Nodegraph",
@@ -144,9 +429,53 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
                             node_type=node_type,
                         )
 
-        self.mx_defs = doc.getNodeDefs()
         return new_defs
 
+    def _load_mx_library_records(self, search_path, library_folders):
+        """Get the records of the definitions in the given search path, which are not registered yet.
+        If the libraries didn't change since they were last cached, parsing them is deferred until
+        the library document is first needed.
+        """
+        cache_key = None
+        if mx_library_cache.is_enabled():
+            cache_key = mx_library_cache.get_cache_key(search_path, library_folders)
+
+        records = cache_key and mx_library_cache.read_records(cache_key)
+        if records is not None:
+            self._pending_mx_libraries.append((search_path, list(library_folders)))
+            logger.debug(f"loaded cached definitions from {search_path}: {len(records)}")
+            new_records = [record for record in records if record["name"] not in self._mx_def_names]
+            self._mx_def_names.update(record["name"] for record in new_records)
+            return new_records
+
+        # Load the libraries in isolation, so that every definition found ends up in the cache
+        library_doc = mx.createDocument()
+        mx.loadLibraries(library_folders, mx.FileSearchPath(search_path), library_doc)
+        records = [
+            mx_library_cache.get_record_from_mx_def(mx_def, self.has_nodegraph_implementation(mx_def))
+            for mx_def in library_doc.getNodeDefs()
+        ]
+        if cache_key:
+            mx_library_cache.write_records(cache_key, records)
+
+        doc = self.mx_library_doc
+        with self.get_root_graph().mx_doc_validator.pause():
+            doc.importLibrary(library_doc)
+        logger.debug(f"loaded definitions from {search_path}: {len(records)}")
+        return self._get_new_mx_def_records(doc)
+
+    def _get_new_mx_def_records(self, doc):
+        new_records = [
+            mx_library_cache.get_record_from_mx_def(mx_def, self.has_nodegraph_implementation(mx_def))
+            for mx_def in doc.getNodeDefs()
+            if mx_def.getName() not in self._mx_def_names
+        ]
+        self._mx_def_names.update(record["name"] for record in new_records)
+        return new_records
+
+    def _get_mx_library_node_def(self, def_name):
+        return self.mx_library_doc.getNodeDef(def_name)
+
     def has_nodegraph_implementation(self, mx_def):
         imp = mx_def.getImplementation()
         if not imp:
@@ -171,31 +500,34 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
                 ng = self.mx_library_doc.getNodeGraph(ng_name)
 
             pos = [node.x_pos(), node.y_pos() + node.view.height + 10]
-            ng_node = self.create_nodegraph_from_mx_nodegraph(ng, pos=pos, create_ports=False)
-            for output in node.current_mx_def.getActiveOutputs():
-                color = qx_node_module.QxNodeBase._random_color_from_string(str(output.getType()))
-                ng_node.add_output(output.getName(), color=color)
-
-            for minput in node.current_mx_def.getActiveInputs():
-                qx_node_module.QxNode.create_property_from_mx_input(minput, ng_node)
-                color = qx_node_module.QxNodeBase._random_color_from_string(str(minput.getType()))
-                in_port = ng_node.add_input(minput.getName(), color=color)
-                in_port.view.setToolTip(minput.getType())
-
-            qx_node_to_mx_node = {}
-            had_pos = False
-            for cur_mx_node in ng.getNodes():
-                if cur_mx_node.hasAttribute("xpos") and cur_mx_node.hasAttribute("ypos"):
-                    had_pos = True
+            with self.bulk_build("copy to nodegraph"):
+                ng_node = self.create_nodegraph_from_mx_nodegraph(ng, pos=pos, create_ports=False)
+                for output in node.current_mx_def.getActiveOutputs():
+                    color = qx_node_module.QxNodeBase._random_color_from_string(str(output.getType()))
+                    ng_node.add_output(output.getName(), color=color)
+
+                for minput in node.current_mx_def.getActiveInputs():
+                    qx_node_module.QxNode.create_property_from_mx_input(minput, ng_node)
+                    color = qx_node_module.QxNodeBase._random_color_from_string(str(minput.getType()))
+                    in_port = ng_node.add_input(minput.getName(), color=color)
+                    in_port.view.setToolTip(minput.getType())
+
+                qx_node_to_mx_node = {}
+                node_lookup = NodeLookup()
+                had_pos = False
+                for cur_mx_node in ng.getNodes():
+                    if cur_mx_node.hasAttribute("xpos") and cur_mx_node.hasAttribute("ypos"):
+                        had_pos = True
 
-                cur_qx_node = self.create_node_from_mx_node(cur_mx_node, graph=ng_node.get_sub_graph())
-                # Change value type of node
-                qx_node_to_mx_node[cur_qx_node] = cur_mx_node
+                    cur_qx_node = self.create_node_from_mx_node(cur_mx_node, graph=ng_node.get_sub_graph())
+                    # Change value type of node
+                    qx_node_to_mx_node[cur_qx_node] = cur_mx_node
+                    node_lookup.add(cur_qx_node)
 
-            for cur_qx_node, cur_mx_node in qx_node_to_mx_node.items():
-                cur_qx_node.graph.connect_qx_inputs_from_mx_node(cur_qx_node, cur_mx_node)
+                for cur_qx_node, cur_mx_node in qx_node_to_mx_node.items():
+                    cur_qx_node.graph.connect_qx_inputs_from_mx_node(cur_qx_node, cur_mx_node, node_lookup)
 
-            self.connect_qx_ng_ports_from_mx_ng(ng_node, ng, node.current_mx_def)
+                self.connect_qx_ng_ports_from_mx_ng(ng_node, ng, node.current_mx_def, node_lookup)
             # graphs = [self.get_root_graph()]
             # graphs += list(self.sub_graphs.values())
             # for graph in graphs:
@@ -204,10 +536,17 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
 
             self.collapse_group_node(ng_node)
 
+    def on_nodes_registered(self, nodes):
+        for node in nodes:
+            self.port_type_node_index.add_node_type(node)
+            self.mx_node_type_resolver.add_node_type(node)
+
     def unregister_nodes(self):
         self._node_factory.clear_registered_nodes()
+        self.port_type_node_index.clear()
+        self.mx_node_type_resolver.clear()
         self.mx_library_doc = mx.createDocument()
-        self.mx_defs = None
+        self._mx_def_names = set()
         self._viewer.rebuild_tab_search()
 
     def on_port_connected(self, input_port, output_port):
@@ -230,8 +569,9 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
             self.get_root_graph().on_port_connected(input_port, output_port)
             return
 
+        self.shadow_mx_doc.on_port_changed(input_port, output_port)
         if self.get_root_graph().auto_update_ng:
-            self.update_mx_xml_data_from_graph()
+            self.schedule_mx_xml_data_update()
             return
         # if self.viewer()._start_port.node == input_port.node():
         #     # start_port = input_port
@@ -286,6 +626,8 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
     def on_node_created(self, qx_node):
         # Only if a mx node with possible types (eg not a group node)
         logger.debug("created_node " + str(qx_node))
+        self.node_name_registry.register(qx_node)
+        self.get_root_graph().shadow_mx_doc.on_node_created(qx_node)
         if not self.get_root_graph()._block_save:
             self.potentially_node_graph_changed.emit(self)
 
@@ -344,13 +686,36 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
 
     def on_nodes_deleted(self, node_ids):
         self.has_deleted_nodes = True
+        self.get_root_graph().shadow_mx_doc.on_nodes_deleted(node_ids)
+
+    def on_undo_stack_index_changed(self, index):
+        previous_index, previous_count = self._undo_stack_state
+        count = self._undo_stack.count()
+        self._undo_stack_state = (index, count)
+        # Undoing and redoing move the index over existing commands, without emitting any graph signals the
+        # mx document could be patched with. A push replacing undone commands looks the same and is rebuilt as well
+        if index < previous_index or count == previous_count:
+            self.invalidate_mx_doc()
+            self.invalidate_node_names()
+            return
+
+        self.get_root_graph().shadow_mx_doc.on_undo_stack_changed()
 
     def on_property_changed(self, qx_node, property_name, property_value):
         logger.debug(f"property changed {property_name} - {property_value}")
         disregarded_properties = ["pos", "color", "width", "height", "selected"]
         if property_name in disregarded_properties:
+            if property_name == "pos":
+                self.get_root_graph().shadow_mx_doc.on_nodes_moved([qx_node.id])
+            else:
+                self.get_root_graph().shadow_mx_doc.on_unwritten_change()
             return
 
+        self.get_root_graph().shadow_mx_doc.on_property_changed(qx_node, property_name, property_value)
+
+        if property_name == "name":
+            self.node_name_registry.register(qx_node)
+
         if property_name == "type":
             qx_node.change_type(property_value)
             if qx_node.selected():
@@ -402,21 +767,29 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
                 graph = self
             else:
                 graph = self.get_root_graph()
-            
-            graph.refresh_validation()
-            graph.mx_parameter_changed.emit(qx_node, property_name, property_value)
+
+            if graph.update_scheduler.has_pending("topology"):
+                # The pending update writes the whole graph including this value
+                return
+
+            graph.update_scheduler.request(("validation",), graph.refresh_validation)
+            graph.update_scheduler.request(
+                ("parameter", qx_node.id, property_name),
+                graph.mx_parameter_changed.emit, qx_node, property_name, property_value,
+            )
 
     def on_port_disconnected(self, input_port=None, output_port=None):
         if not self.is_root:
             self.get_root_graph().on_port_disconnected(input_port, output_port)
             return
 
+        self.shadow_mx_doc.on_port_changed(input_port, output_port)
         if self.get_root_graph().auto_update_ng:
-            self.update_mx_xml_data_from_graph()
+            self.schedule_mx_xml_data_update()
 
     def on_mx_file_loaded(self, path):
         if self.get_root_graph().auto_update_ng:
-            self.update_mx_xml_data_from_graph()
+            self.schedule_mx_xml_data_update()
 
     def _on_property_bin_changed(self, node_id, prop_name, prop_value):
         """
@@ -459,11 +832,21 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
 
         return node_def
 
+    def is_ng_abstraction_enabled(self):
+        root_graph = self.get_root_graph()
+        editor = root_graph.widget.parent()
+        if hasattr(editor, "act_ng_abstraction"):
+            return editor.act_ng_abstraction.isChecked()
+
+        # Not part of the editor, e.g. when converting files without a display
+        return root_graph.ng_abstraction
+
+    @profiled()
     def get_mx_doc_from_serialized_data(self, serialized_data, mx_parent=None, parent_id=None, parent_graph_data=None, qx_node_ids_to_mx_nodes=None):
         if not mx_parent:
             mx_parent = mx.createDocument()
 
-        ng_abstraction = self.get_root_graph().widget.parent().act_ng_abstraction.isChecked()
+        ng_abstraction = self.is_ng_abstraction_enabled()
         if parent_graph_data:
             ng_abstraction = False
 
@@ -477,12 +860,14 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
             main_mx_node_graph = mx_parent.addNodeGraph("NG_main")
 
         qx_node_ids_to_mx_nodes = {} if qx_node_ids_to_mx_nodes is None else qx_node_ids_to_mx_nodes
+        connections_by_input, connections_by_output = get_serialized_connection_index(serialized_data)
         for node_id in serialized_data.get("nodes", []):
             node_data = serialized_data["nodes"][node_id]
             mx_def = self.get_mx_node_def(node_data["type_"], node_data.get("custom", {}).get("type"))
             if node_data["type_"] == "Other.QxGroupNode":
                 mx_node = mx_parent.addNodeGraph(node_data["name"])
                 self.get_mx_doc_from_serialized_data(node_data["subgraph_session"], mx_parent=mx_node, parent_id=node_id, parent_graph_data=serialized_data, qx_node_ids_to_mx_nodes=qx_node_ids_to_mx_nodes)
+                sub_connections_by_input, sub_connections_by_output = get_serialized_connection_index(node_data["subgraph_session"])
                 output_node = None
                 for subnode_id in node_data["subgraph_session"].get("nodes", []):
                     if node_data["subgraph_session"]["nodes"][subnode_id]["type_"] in ["Inputs.QxPortInputNode"]:
@@ -495,16 +880,15 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
 
                 if output_node:
                     for port_data in output_node["input_ports"]:
-                        for connection in node_data["subgraph_session"].get("connections", []):
-                            if connection["in"][0] == output_node["id"] and connection["in"][1] == port_data["name"]:
-                                connected_data = connection["out"]
-                                connected_node_data = node_data["subgraph_session"]["nodes"][connected_data[0]]
-                                connected_mx_def = self.get_mx_node_def(connected_node_data["type_"], connected_node_data.get("custom", {}).get("type"))
-                                port_type = connected_mx_def.getActiveOutput(connected_data[1]).getType()
-                                break
-                        else:
+                        connection = sub_connections_by_input.get((output_node["id"], port_data["name"]))
+                        if not connection:
                             continue
 
+                        connected_data = connection["out"]
+                        connected_node_data = node_data["subgraph_session"]["nodes"][connected_data[0]]
+                        connected_mx_def = self.get_mx_node_def(connected_node_data["type_"], connected_node_data.get("custom", {}).get("type"))
+                        port_type = connected_mx_def.getActiveOutput(connected_data[1]).getType()
+
                         output = mx_node.addOutput(
                             port_data["name"], port_type
                         )
@@ -542,41 +926,27 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
             for input_data in node_data.get("input_ports", {}):
                 val = node_data.get("custom", {}).get(input_data["name"], node_data.get("custom", {}).get(input_data["name"] + "0"))
                 hasGeomProp = mx_def and bool(mx_def.getActiveInput(input_data["name"]).getDefaultGeomProp())  # the inputnodes and outputnodes of nodegraphs don't have a mx definition
-                isConnected = None
-                if hasGeomProp:
-                    for connection in serialized_data.get("connections", []):
-                        if connection["in"][0] == node_id and connection["in"][1] == input_data["name"]:
-                            isConnected = True
-                            break
-                    else:
-                        isConnected = False
+                isConnected = (node_id, input_data["name"]) in connections_by_input
 
                 if node_data["type_"] == "Other.QxGroupNode":
-                    for connection in node_data["subgraph_session"].get("connections", []):
-                        if connection["out"][0] == input_node["id"] and connection["out"][1] == input_data["name"]:
-                            connected_data = connection["in"]
-                            connected_node_data = node_data["subgraph_session"]["nodes"][connected_data[0]]
-                            connected_mx_def = self.get_mx_node_def(connected_node_data["type_"], connected_node_data.get("custom", {}).get("type"))
-                            mx_input_type = connected_mx_def.getActiveInput(connected_data[1]).getType()
-                            break
-                    else:
+                    sub_connections = sub_connections_by_output.get((input_node["id"], input_data["name"]))
+                    if not sub_connections:
                         continue
+
+                    connected_data = sub_connections[0]["in"]
+                    connected_node_data = node_data["subgraph_session"]["nodes"][connected_data[0]]
+                    connected_mx_def = self.get_mx_node_def(connected_node_data["type_"], connected_node_data.get("custom", {}).get("type"))
+                    mx_input_type = connected_mx_def.getActiveInput(connected_data[1]).getType()
                 else:
                     mx_input_type = mx_def.getActiveInput(input_data["name"]).getType()
 
                 # temporary fix to avoid displacement validation warning
                 if node_data["type_"] == "Material.Surfacematerial" and input_data["name"] == "displacementshader":
-                    for connection in serialized_data.get("connections", []):
-                        if connection["in"][0] == node_id and connection["in"][1] == "displacementshader":
-                            break
-                    else:
+                    if not isConnected:
                         continue
 
                 if node_data["type_"] == "Material.Surfacematerial" and input_data["name"] == "backsurfaceshader":
-                    for connection in serialized_data.get("connections", []):
-                        if connection["in"][0] == node_id and connection["in"][1] == "backsurfaceshader":
-                            break
-                    else:
+                    if not isConnected:
                         continue
 
                 if not hasGeomProp or isConnected:
@@ -601,15 +971,18 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
                     continue
 
                 mx_def = self.get_mx_node_def(node_data["type_"], node_data.get("custom", {}).get("type"))
+                node_connections = [
+                    connection
+                    for output_data in node_data.get("output_ports", {})
+                    for connection in connections_by_output.get((node_id, output_data["name"]), [])
+                ]
                 for output_data in node_data.get("output_ports", {}):
                     mx_output_type = mx_def.getActiveOutput(output_data["name"]).getType()
                     if mx_output_type in ("material", "surfaceshader"):
                         continue
 
-                    for connection in serialized_data.get("connections", []):
-                        if connection["out"][0] != node_id:
-                            continue
-
+                    # Any connection of the node, not just the ones of this output
+                    for connection in node_connections:
                         connected_node_data = serialized_data["nodes"][connection["in"][0]]
                         if connected_node_data["type_"] in ["Inputs.QxPortInputNode", "Outputs.QxPortOutputNode"]:
                             continue
@@ -704,24 +1077,79 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
         return serialized_data
 
     def get_current_mx_graph_doc(self):
+        """Get the MaterialX document of the graph.
+
+        Returns:
+            mx.Document: MaterialX document of the graph, which may be modified
+        """
+        if self.is_root:
+            return self.shadow_mx_doc.get_doc().copy()
+
+        return self._get_mx_graph_doc()
+
+    def _get_mx_graph_doc(self):
+        """Like get_current_mx_graph_doc, but for the root graph it returns the shadow document itself, which is
+        kept in sync with the graph. Only for reading, modifying it puts it out of sync.
+        """
+        if self.is_root:
+            return self.shadow_mx_doc.get_doc()
+
         serialized_data = self.get_current_graph_data()
         doc = self.get_mx_doc_from_serialized_data(serialized_data)
         return doc
 
+    def get_mx_material_names(self):
+        """Get the names of the material nodes of the graph, in the order they are exported.
+
+        Returns:
+            list[str]: Names of the material nodes
+        """
+        return [
+            node.name()
+            for node in self.all_nodes()
+            if getattr(node, "current_mx_def", None) and node.current_mx_def.getNodeGroup() == "material"
+        ]
+
+    def invalidate_mx_doc(self):
+        """Rebuild the MaterialX document of the graph from scratch the next time it is needed.
+        Required after changing the graph without emitting its signals, e.g. when undoing.
+        """
+        self.get_root_graph().shadow_mx_doc.invalidate()
+
+    def invalidate_node_names(self):
+        """Rebuild the node name registries of all graphs from their nodes the next time they are needed.
+        Required after renaming, adding or deleting nodes without emitting the graph signals, e.g. when undoing.
+        """
+        self.get_root_graph().node_names_generation += 1
+
+    def check_mx_doc_consistency(self):
+        """Compare the patched MaterialX document of the graph with a full rebuild.
+
+        Returns:
+            bool: True if the patched document is up to date
+        """
+        return self.get_root_graph().shadow_mx_doc.check()
+
     def save_graph_as_mx_file(self, mx_file_path):
-        mx_graph_doc = self.get_current_mx_graph_doc()
+        mx_graph_doc = self._get_mx_graph_doc()
         mx.writeToXmlFile(mx_graph_doc, mx_file_path)
         logger.info(f"Wrote .mtlx file to {mx_file_path}")
 
     def get_mx_xml_data_from_graph(self):
-        mx_graph_doc = self.get_current_mx_graph_doc()
-        self.get_root_graph().widget.parent().validate(mx_graph_doc, popup=False)
+        mx_graph_doc = self._get_mx_graph_doc()
+        self.refresh_validation(mx_graph_doc)
         xml_data = mx.writeToXmlString(mx_graph_doc)
         return xml_data
-    
-    def refresh_validation(self):
-        mx_graph_doc = self.get_current_mx_graph_doc()
-        self.get_root_graph().widget.parent().validate(mx_graph_doc, popup=False)
+
+    @profiled()
+    def refresh_validation(self, mx_graph_doc=None):
+        """Validate the graph in the background. The result is emitted with mx_doc_validated.
+
+        Args:
+            mx_graph_doc (mx.Document, optional): Document of the graph. Defaults to the current one.
+        """
+        mx_graph_doc = mx_graph_doc or self._get_mx_graph_doc()
+        self.get_root_graph().mx_doc_validator.validate(mx_graph_doc, self.mx_library_doc)
 
     def update_mx_xml_data_from_graph(self):
         if self.get_root_graph()._block_save:
@@ -738,11 +1166,22 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
         logger.debug("updated mx xml data")
         self.mx_data_updated.emit(xml_data, True)
 
+    def schedule_mx_xml_data_update(self):
+        """Update the mx xml data from the graph with the next flush of the update scheduler,
+        merging it with all other updates up to then.
+        """
+        root_graph = self.get_root_graph()
+        if root_graph._block_save:
+            return
+
+        # Parameter updates and validation are included in the full update
+        root_graph.update_scheduler.discard("parameter")
+        root_graph.update_scheduler.discard("validation")
+        root_graph.update_scheduler.request(("topology",), root_graph.update_mx_xml_data_from_graph)
+
     def validate_mtlx_doc(self, doc=None):
-        doc = doc or self.get_current_mx_graph_doc()
-        doc = doc.copy()
-        doc.importLibrary(self.mx_library_doc)
-        result = doc.validate()
+        doc = doc or self._get_mx_graph_doc()
+        result = mx_validation.validate_mx_doc(doc, self.mx_library_doc)
         return result
 
     def patch_relative_file_path_inputs(self, mx_node, base_dir):
@@ -789,38 +1228,44 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
         self.load_graph_from_mx_doc(doc)
         self.mx_file_loaded.emit("")
 
+    @profiled()
     def load_graph_from_mx_doc(self, doc):
         with self.get_root_graph().block_save():
             self.clear_session()
 
             had_pos = False
             qx_node_to_mx_node = {}
+            node_lookup = NodeLookup()
 
             mx_nodes = doc.getNodes()
             mx_graphs = doc.getNodeGraphs()
             doc.importLibrary(self.mx_library_doc)
 
-            # Create Nodes
-            for cur_mx_node in mx_nodes:
-                if cur_mx_node.hasAttribute("xpos") and cur_mx_node.hasAttribute("ypos"):
-                    had_pos = True
-
-                cur_qx_node = self.create_node_from_mx_node(cur_mx_node)
-
-                qx_node_to_mx_node[cur_qx_node] = cur_mx_node
-
-            for mx_graph in mx_graphs:
-                ng_node = self.create_nodegraph_from_mx_nodegraph(mx_graph)
-                for cur_mx_node in mx_graph.getNodes():
+            with self.bulk_build("load document"):
+                # Create Nodes
+                for cur_mx_node in mx_nodes:
                     if cur_mx_node.hasAttribute("xpos") and cur_mx_node.hasAttribute("ypos"):
                         had_pos = True
 
-                    cur_qx_node = self.create_node_from_mx_node(cur_mx_node, graph=ng_node.get_sub_graph())
-                    # Change value type of node
+                    cur_qx_node = self.create_node_from_mx_node(cur_mx_node)
+
                     qx_node_to_mx_node[cur_qx_node] = cur_mx_node
+                    node_lookup.add(cur_qx_node)
+
+                for mx_graph in mx_graphs:
+                    ng_node = self.create_nodegraph_from_mx_nodegraph(mx_graph)
+                    node_lookup.add(ng_node)
+                    for cur_mx_node in mx_graph.getNodes():
+                        if cur_mx_node.hasAttribute("xpos") and cur_mx_node.hasAttribute("ypos"):
+                            had_pos = True
+
+                        cur_qx_node = self.create_node_from_mx_node(cur_mx_node, graph=ng_node.get_sub_graph())
+                        # Change value type of node
+                        qx_node_to_mx_node[cur_qx_node] = cur_mx_node
+                        node_lookup.add(cur_qx_node)
 
-            for cur_qx_node, cur_mx_node in qx_node_to_mx_node.items():
-                cur_qx_node.graph.connect_qx_inputs_from_mx_node(cur_qx_node, cur_mx_node)
+                for cur_qx_node, cur_mx_node in qx_node_to_mx_node.items():
+                    cur_qx_node.graph.connect_qx_inputs_from_mx_node(cur_qx_node, cur_mx_node, node_lookup)
 
             graphs = [self.get_root_graph()]
             graphs += list(self.sub_graphs.values())
@@ -846,7 +1291,15 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
         return qx_node
 
     # TODO: move to qx_node
-    def connect_qx_inputs_from_mx_node(self, qx_node, mx_node):
+    def connect_qx_inputs_from_mx_node(self, qx_node, mx_node, node_lookup=None):
+        """
+        Args:
+            qx_node (QxNode): Node of this graph to connect
+            mx_node (mx.Node): MaterialX node with the connections of the node
+            node_lookup (NodeLookup, optional): Nodes to connect to. Defaults to searching the graphs.
+        """
+        node_lookup = node_lookup or NodeLookup()
+        push_undo = not self.is_bulk_building()
         for mx_input in mx_node.getActiveInputs():
             mx_connected_port = mx_input.getConnectedOutput()
             # Not every input has a connections
@@ -854,17 +1307,18 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
                 ng_name = mx_connected_port.getParent().getName()
                 mx_input_name = mx_input.getName()
                 qx_input_port = qx_node.get_input(mx_input_name)
-                qx_input_node = self.get_node_by_name(ng_name)
+                qx_input_node = node_lookup.get_node_by_name(self, ng_name)
                 qx_output_port = qx_input_node.get_output(mx_connected_port.getName())
-                qx_input_port.connect_to(qx_output_port)
+                qx_input_port.connect_to(qx_output_port, push_undo=push_undo)
 
             mx_connected_node = mx_input.getConnectedNode()
             if mx_connected_node:
                 if mx_connected_port and mx_connected_port.getParent().CATEGORY == "nodegraph":
-                    port_node = qx_input_node.get_sub_graph().get_output_port_nodes()[0]
+                    sub_graph = qx_input_node.get_sub_graph()
+                    port_node = node_lookup.get_output_port_node(sub_graph)
                     qx_input_port = port_node.get_input(mx_connected_port.getName())
                     mx_input_node_name = mx_connected_node.getName()
-                    qx_input_node = qx_input_node.get_sub_graph().get_node_by_name(mx_input_node_name)
+                    qx_input_node = node_lookup.get_node_by_name(sub_graph, mx_input_node_name)
                     mx_output_name = "out"
                     qx_output_port = qx_input_node.get_output(mx_output_name)
                 else:
@@ -873,24 +1327,27 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
 
                     mx_input_node_name = mx_connected_node.getName()
 
-                    qx_input_node = self.get_node_by_name(mx_input_node_name)
+                    qx_input_node = node_lookup.get_node_by_name(self, mx_input_node_name)
                     qx_input_port = qx_node.get_input(mx_input_name)
                     qx_output_port = qx_input_node.get_output(mx_output_name)
 
                 if qx_input_port:
-                    qx_input_port.connect_to(qx_output_port)
+                    qx_input_port.connect_to(qx_output_port, push_undo=push_undo)
                 else:
                     logger.warning("invalid in port: {mx_input_name}")
 
             if mx_input.hasInterfaceName():
                 intf_name = mx_input.getInterfaceName()
-                port_node = qx_node.graph.get_input_port_nodes()[0]
+                port_node = node_lookup.get_input_port_node(qx_node.graph)
                 out_port = port_node.get_output(intf_name)
                 qx_input_port = qx_node.get_input(mx_input.getName())
-                out_port.connect_to(qx_input_port)
+                out_port.connect_to(qx_input_port, push_undo=push_undo)
 
-    def connect_qx_ng_ports_from_mx_ng(self, ng_node, mx_ng, mx_def):
-        out_port_node = ng_node.get_sub_graph().get_output_port_nodes()[0]
+    def connect_qx_ng_ports_from_mx_ng(self, ng_node, mx_ng, mx_def, node_lookup=None):
+        node_lookup = node_lookup or NodeLookup()
+        push_undo = not self.is_bulk_building()
+        sub_graph = ng_node.get_sub_graph()
+        out_port_node = node_lookup.get_output_port_node(sub_graph)
         for in_port in out_port_node.input_ports():
             mx_ng_output = mx_ng.getActiveOutput(in_port.name())
             if not mx_ng_output:
@@ -898,19 +1355,19 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
 
             mx_connected_node = mx_ng_output.getConnectedNode()
             mx_input_node_name = mx_connected_node.getName()
-            qx_input_node = ng_node.get_sub_graph().get_node_by_name(mx_input_node_name)
+            qx_input_node = node_lookup.get_node_by_name(sub_graph, mx_input_node_name)
             qx_output_port = qx_input_node.get_output("out")
-            in_port.connect_to(qx_output_port)
+            in_port.connect_to(qx_output_port, push_undo=push_undo)
 
-        in_port_node = ng_node.get_sub_graph().get_input_port_nodes()[0]
+        in_port_node = node_lookup.get_input_port_node(sub_graph)
         for mx_node in mx_ng.getNodes():
             for mx_input in mx_node.getActiveInputs():
                 if mx_input.hasInterfaceName():
                     intf_name = mx_input.getInterfaceName()
                     out_port = in_port_node.get_output(intf_name)
-                    qx_output_node = ng_node.get_sub_graph().get_node_by_name(mx_node.getName())
+                    qx_output_node = node_lookup.get_node_by_name(sub_graph, mx_node.getName())
                     qx_input_port = qx_output_node.get_input(mx_input.getName())
-                    out_port.connect_to(qx_input_port)
+                    out_port.connect_to(qx_input_port, push_undo=push_undo)
 
     def create_node_from_mx_node(
         self,
@@ -939,9 +1396,9 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
             color=color,
             text_color=text_color,
             pos=pos,
-            push_undo=push_undo
+            push_undo=push_undo,
+            mx_node=mx_node,
         )
-        qx_node.update_from_mx_node(mx_node)
         return qx_node
 
     def create_nodegraph_from_mx_nodegraph(
@@ -987,7 +1444,6 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
         return qx_node
 
     def get_qx_node_type_from_mx_node(self, mx_node):
-        mx_node_type = mx_node.getType()
         # There are some nodes duplicate in multiple categories with different behaviour
         # Example: pbr.multiply & math.multiply
         possible_qx_nodes = self.node_factory.names[
@@ -995,47 +1451,157 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
         ]
 
         # If the node appears under multiple categories, choose the category that contains the
-        # node definition with the corresponding type of mx_node_type
+        # node definition with the ports of mx_node
         if len(possible_qx_nodes) > 1:
-            qx_node_type_to_create = None
-            for possible_qx_node_type in possible_qx_nodes:
-                current_possible_mx_defs = self.node_factory.nodes[
-                    possible_qx_node_type
-                ].possible_mx_defs
-                for mx_def_type in current_possible_mx_defs:
-                    current_possible_mx_def = current_possible_mx_defs[mx_def_type]
-                    is_match = True
-                    for mx_input in mx_node.getActiveInputs():
-                        cur_mx_input = current_possible_mx_def.getActiveInput(mx_input.getName())
-                        if mx_input.getType() != cur_mx_input.getType():
-                            is_match = False
-
-                    for mx_output in mx_node.getActiveOutputs():
-                        cur_mx_output = current_possible_mx_def.getActiveOutput(mx_output.getName())
-                        if mx_output.getType() != cur_mx_output.getType():
-                            is_match = False
-
-                    if mx_node_type != current_possible_mx_def.getActiveOutputs()[0].getType():
-                        is_match = False
-
-                    if is_match:
-                        qx_node_type_to_create = possible_qx_node_type
-
-                # if mx_node_type in current_possible_mx_defs:
-                #     qx_node_type_to_create = possible_qx_node_type
-                #     break
+            return self.get_root_graph().mx_node_type_resolver.resolve(mx_node)
+
+        return possible_qx_nodes[0]
+
+    def create_node(self, node_type, name=None, selected=True, color=None,
+                    text_color=None, pos=None, push_undo=True, mx_node=None):
+        """
+        Create a new node in the node graph.
 
+        See Also:
+            To list all node types :meth:`NodeGraph.registered_nodes`
+
+        Args:
+            node_type (str): node instance type.
+            name (str): set name of the node.
+            selected (bool): set created node to be selected.
+            color (tuple or str): node color ``(255, 255, 255)`` or ``"#FFFFFF"``.
+            text_color (tuple or str): text color ``(255, 255, 255)`` or ``"#FFFFFF"``.
+            pos (list[int, int]): initial x, y position for the node (default: ``(0, 0)``).
+            push_undo (bool): register the command to the undo stack. (default: True)
+            mx_node (MaterialX.Node, optional): create the node with the definition, values and outputs of this node
+
+        Returns:
+            BaseNode: the created instance of the node.
+        """
+        # custom start - create the node directly with the definition of the mx node
+        # node = self._node_factory.create_node_instance(node_type)
+        if mx_node is None:
+            node = self._node_factory.create_node_instance(node_type)
         else:
-            qx_node_type_to_create = possible_qx_nodes[0]
-        return qx_node_type_to_create
+            node_type = self._node_factory.aliases.get(node_type, node_type)
+            node_class = self._node_factory.nodes.get(node_type)
+            node = node_class.from_mx_node(mx_node) if node_class else None
+        # custom end
+        if node:
+            node._graph = self
+            node.model._graph_model = self.model
+            # custom start - nodes of a bulk build are drawn once it is finished
+            bulk_build_cmd = self.get_root_graph()._bulk_build_cmd
+            if bulk_build_cmd is not None:
+                bulk_build_cmd.add_node(self, node)
+                push_undo = False
+            # custom end
+
+            wid_types = node.model.__dict__.pop('_TEMP_property_widget_types')
+            prop_attrs = node.model.__dict__.pop('_TEMP_property_attrs')
+
+            if self.model.get_node_common_properties(node.type_) is None:
+                node_attrs = {node.type_: {
+                    n: {'widget_type': wt} for n, wt in wid_types.items()
+                }}
+                for pname, pattrs in prop_attrs.items():
+                    node_attrs[node.type_][pname].update(pattrs)
+                self.model.set_node_common_properties(node_attrs)
+
+            node.NODE_NAME = self.get_unique_name(name or node.NODE_NAME)
+            node.model.name = node.NODE_NAME
+            node.model.selected = selected
+
+            def format_color(clr):
+                if isinstance(clr, str):
+                    clr = clr.strip('#')
+                    return tuple(int(clr[i:i + 2], 16) for i in (0, 2, 4))
+                return clr
+
+            if color:
+                node.model.color = format_color(color)
+            if text_color:
+                node.model.text_color = format_color(text_color)
+            if pos:
+                node.model.pos = [float(pos[0]), float(pos[1])]
+
+            # initial node direction layout.
+            node.model.layout_direction = self.layout_direction()
+
+            node.update()
+
+            undo_cmd = NodeAddedCmd(self, node, node.model.pos)
+            if push_undo:
+                undo_label = 'create node: "{}"'.format(node.NODE_NAME)
+                self._undo_stack.beginMacro(undo_label)
+                for n in self.selected_nodes():
+                    n.set_property('selected', False, push_undo=True)
+                self._undo_stack.push(undo_cmd)
+                self._undo_stack.endMacro()
+            else:
+                for n in self.selected_nodes():
+                    n.set_property('selected', False, push_undo=False)
+                NodeAddedCmd(self, node, node.model.pos).redo()
+
+            # custom start - nodes of a bulk build are only registered, instead of handling node_created
+            if bulk_build_cmd is not None:
+                node.view.basenode = node
+                self.node_name_registry.register(node)
+                bulk_build_cmd.on_node_created(node)
+                return node
+            # custom end
+            self.node_created.emit(node)
+            return node
+        raise NodeCreationError('Can\'t find node: "{}"'.format(node_type))
+
+    def add_node(self, node, pos=None, selected=True, push_undo=True):
+        # Unlike create_node this doesn't emit node_created
+        self.invalidate_mx_doc()
+        super(QxNodeGraph, self).add_node(node, pos=pos, selected=selected, push_undo=push_undo)
+        self.node_name_registry.register(node)
+
+    def cut_nodes(self, nodes=None):
+        # Cutting doesn't emit nodes_deleted
+        self.invalidate_mx_doc()
+        self.invalidate_node_names()
+        super(QxNodeGraph, self).cut_nodes(nodes)
+
+    def clear_session(self):
+        self.invalidate_mx_doc()
+        super(QxNodeGraph, self).clear_session()
+        self.node_name_registry.invalidate()
+
+    def _deserialize(self, data, relative_pos=False, pos=None):
+        self.invalidate_mx_doc()
+        return super(QxNodeGraph, self)._deserialize(data, relative_pos=relative_pos, pos=pos)
+
+    def _on_nodes_moved(self, node_data):
+        self.get_root_graph().shadow_mx_doc.on_nodes_moved([node_view.id for node_view in node_data])
+        super(QxNodeGraph, self)._on_nodes_moved(node_data)
+
+    @property
+    def undo_view(self):
+        undo_view = super(QxNodeGraph, self).undo_view
+        if not getattr(undo_view, "invalidates_mx_doc", False):
+            # Jumping around in the undo history doesn't emit any graph signals
+            undo_view.selectionModel().currentChanged.connect(self.invalidate_mx_doc)
+            undo_view.selectionModel().currentChanged.connect(self.invalidate_node_names)
+            undo_view.invalidates_mx_doc = True
+
+        return undo_view
 
     def delete_nodes(self, nodes, push_undo=True):
         self.has_deleted_nodes = False
-        with self.get_root_graph().block_save():
-            super(QxNodeGraph, self).delete_nodes(nodes, push_undo)
+        node_names = [node.name() for node in nodes]
+        with self.get_root_graph().shadow_mx_doc.patch_deletion(nodes):
+            with self.get_root_graph().block_save():
+                super(QxNodeGraph, self).delete_nodes(nodes, push_undo)
+
+        for node_name in node_names:
+            self.node_name_registry.release(node_name)
 
         if self.has_deleted_nodes and self.get_root_graph().auto_update_ng:
-            self.update_mx_xml_data_from_graph()
+            self.schedule_mx_xml_data_update()
 
     def get_unique_name(self, name):
         """
@@ -1047,25 +1613,7 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
         Returns:
             str: unique node name.
         """
-        name = "_".join(name.split())
-        node_names = [n.name() for n in self.all_nodes()]
-        if name not in node_names:
-            return name
-
-        regex = re.compile(r"[\w ]+(?: )*(\d+)")
-        search = regex.search(name)
-        if not search:
-            for x in range(1, len(node_names) + 2):
-                new_name = "{}_{}".format(name, x)
-                if new_name not in node_names:
-                    return new_name
-
-        version = search.group(1)
-        name = name[: len(version) * -1].strip()
-        for x in range(1, len(node_names) + 2):
-            new_name = "{}_{}".format(name, x)
-            if new_name not in node_names:
-                return new_name
+        return self.node_name_registry.get_unique_name(name)
 
     def expand_group_node(self, node):
         """
@@ -1130,18 +1678,10 @@ class QxNodeGraph(NodeGraphQt.NodeGraph):
         Returns:
             NodeGraphQt.NodeObject: node object.
         """
-        # custom start - lookup by self.current_node_graph instead of just self
+        # custom start - lookup in the root graph and all sub graphs
         # return self._model.nodes.get(node_id, None)
-        node = self._model.nodes.get(node_id, None)
-        if node:
-            return node
-
-        graphs = [self.get_root_graph()]
-        graphs += list(self.sub_graphs.values())
-        for graph in graphs:
-            node = graph._model.nodes.get(node_id, None)
-            if node:
-                return node
+        return self.get_root_graph().node_index.get(node_id, None)
+        # custom end
 
     def _on_connection_sliced(self, ports):
         with self.get_root_graph().block_save():
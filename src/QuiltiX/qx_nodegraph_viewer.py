@@ -1,3 +1,4 @@
+from QuiltiX import qx_port
 from QuiltiX.qx_nodegraph_tabsearch import QxTabSearchWidget
 
 
@@ -21,6 +22,8 @@ class QxNodeGraphViewer(NodeGraphQt.widgets.viewer.NodeViewer):
 
         # Added self.graph so it is always available for function calls
         self.graph = node_graph
+        # { port item : whether it can be connected to the start port of the live connection }, filled while painting
+        self._port_compatibility = {}
 
     def on_data_dropped(self, data, pos):
         img_count = 0
@@ -227,6 +230,43 @@ class QxNodeGraphViewer(NodeGraphQt.widgets.viewer.NodeViewer):
         self._previous_pos = event.pos()
         super(NodeGraphQt.widgets.viewer.NodeViewer, self).mouseMoveEvent(event)
 
+    def start_live_connection(self, selected_port):
+        self._port_compatibility = {}
+        super(QxNodeGraphViewer, self).start_live_connection(selected_port)
+
+    def end_live_connection(self):
+        self._port_compatibility = {}
+        super(QxNodeGraphViewer, self).end_live_connection()
+
+    def is_port_compatible(self, port_item):
+        """Whether the port item can be connected to the start port of the live connection.
+        The result is kept until the live connection ends, since the ports are painted on every mouse move.
+
+        Args:
+            port_item (QxPortItem): Port item to check
+
+        Returns:
+            bool: Whether the ports are compatible
+        """
+        compatible = self._port_compatibility.get(port_item)
+        if compatible is None:
+            compatible = self._port_compatibility[port_item] = self._check_port_compatibility(port_item)
+
+        return compatible
+
+    def _check_port_compatibility(self, port_item):
+        ports = []
+        for item in (port_item, self._start_port):
+            node = self.graph.get_node_by_id(item.node.id)
+            node_ports = node.outputs() if item.port_type == "out" else node.inputs()
+            ports.append(node_ports[item.name])
+
+        # Port check only needed if both ports are available
+        if not all(ports):
+            return True
+
+        return qx_port.are_ports_compatible(*ports)
+
     def apply_live_connection(self, event):
         """
         triggered mouse press/release event for the scene.
@@ -352,46 +392,14 @@ class QxNodeGraphViewer(NodeGraphQt.widgets.viewer.NodeViewer):
         if not hasattr(port, "get_port_types") or not hasattr(port.node, "basenode"):
             return nodes
 
-        filtered_nodes = {}
-        white_listed = ["Nodegraph"]
-        for node in nodes:
-            if node in white_listed or port.node.type_ == "nodes.group.GenericQxGroupNode":
-                filtered_nodes[node] = nodes[node]
-                continue
-
-            nodeDef = self.graph.node_factory.nodes[nodes[node][0]]
-            if not hasattr(nodeDef, "output_ports"):
-                continue
-
-            if port.port_type == "in":
-                output_types = []
-                for mxdef in nodeDef.possible_mx_defs.values():
-                    outputs = mxdef.getActiveOutputs()
-                    if not outputs:
-                        continue
-
-                    output_types += [output.getType() for output in outputs]
-
-                input_types = port.get_port_types()
-            else:
-                input_types = []
-                for mxdef in nodeDef.possible_mx_defs.values():
-                    mx_inputs = mxdef.getActiveInputs()
-                    if not mx_inputs:
-                        continue
-
-                    input_types += [mx_input.getType() for mx_input in mx_inputs]
-
-                output_types = port.get_port_types()
-
-            compatible = False
-            for input_type in input_types:
-                if input_type in output_types:
-                    compatible = True
-
-            if compatible:
-                filtered_nodes[node] = nodes[node]
+        if port.node.type_ == "nodes.group.GenericQxGroupNode":
+            return dict(nodes)
 
+        white_listed = ["Nodegraph"]
+        port_type_node_index = self.graph.get_root_graph().port_type_node_index
+        node_names = port_type_node_index.get_node_names(port.get_port_types(), port.port_type)
+        filtered_nodes = {node: nodes[node] for node in white_listed if node in nodes}
+        filtered_nodes.update((node, nodes[node]) for node in node_names if node in nodes)
         return filtered_nodes
 
     def tab_search_toggle(self):
@@ -9,6 +9,9 @@ HOVER_PORT_COLOR = "#e0e0e0"
 INVALID_COLOR = "#c93d30"
 CONNECTED_COLOR = "#ffffff"
 
+CONNECTED_QCOLOR = QtGui.QColor(CONNECTED_COLOR)
+HOVER_OVERLAY_QCOLOR = QtGui.QColor(255, 255, 255, 70)
+
 ADDITIONAL_COMPATIBLE_PORT_TYPES = {
     "vector3": ["color3", ],
     "color3": ["vector3", ],
@@ -19,16 +22,15 @@ ADDITIONAL_COMPATIBLE_PORT_TYPES = {
 
 
 class QxPortItem(NodeGraphQt.qgraphics.node_base.PortItem):
+    # (port color, fill color, border pen)
+    _paint_colors = None
+
     def get_mx_port_type(self):
         if not hasattr(self.node, "basenode"):
             return
 
-        if self.port_type == "in":
-            mx_port_type = self.node.basenode.current_mx_def.getActiveInput(self.name).getType()
-        else:
-            mx_port_type = self.node.basenode.current_mx_def.getActiveOutput(self.name).getType()
-
-        return mx_port_type
+        basenode = self.node.basenode
+        return basenode.mx_signature.get_port_type(basenode.current_mx_def_type, self.name, self.port_type)
 
     def get_port_types(self, current=False):
         has_connections = False
@@ -43,32 +45,16 @@ class QxPortItem(NodeGraphQt.qgraphics.node_base.PortItem):
                 break
 
         if has_connections or current:
-            if hasattr(self.node.basenode, "current_mx_def"):
-                if self.port_type == "in":
-                    mxport = self.node.basenode.current_mx_def.getActiveInput(self.name)
-                else:
-                    mxport = self.node.basenode.current_mx_def.getActiveOutput(self.name)
-            else:
+            if not hasattr(self.node.basenode, "current_mx_def"):
                 return "color3"
 
+            port_type = self.get_mx_port_type()
             if current:
-                return mxport.getType()
+                return port_type
 
-            port_types = [mxport.getType()]
+            port_types = [port_type]
         else:
-            port_types = []
-            for mxdef in self.node.basenode.possible_mx_defs.values():
-                if self.port_type == "in":
-                    mxport = mxdef.getActiveInput(self.name)
-                else:
-                    mxport = mxdef.getActiveOutput(self.name)
-
-                if not mxport:
-                    continue
-
-                port_type = mxport.getType()
-                if port_type not in port_types:
-                    port_types.append(port_type)
+            port_types = self.node.basenode.mx_signature.get_port_types(self.name, self.port_type)
 
         return port_types
 
@@ -104,59 +90,20 @@ class QxPortItem(NodeGraphQt.qgraphics.node_base.PortItem):
 
         # TODO: Find a better way to get the view. This only allows one.
         view = self.scene().views()[0]
-        graph = self.node.viewer().graph
         valid_connection = True
         if view._LIVE_PIPE.isVisible() and view._start_port:
-            # core = self.node.scene().views()[0].parent().window().core
-            if self.port_type == "out":
-                ptypes = "outputs"
-            elif self.port_type == "in":
-                ptypes = "inputs"
-
-            current_port = getattr(
-                graph.get_node_by_id(self.node.id), ptypes
-            )()[self.name]
-            if view._start_port.port_type == "out":
-                ptypes = "outputs"
-            elif view._start_port.port_type == "in":
-                ptypes = "inputs"
-
-            start_port = getattr(
-                graph.get_node_by_id(view._start_port.node.id), ptypes
-            )()[view._start_port.name]
-
-            # Port check only needed if both ports are available
-            if all((current_port, start_port)):
-                valid_connection = are_ports_compatible(
-                    current_port, start_port
-                )
+            valid_connection = view.is_port_compatible(self)
 
         # TODO do another way
-        self._locked = False
-        if self._hovered:
-            color = QtGui.QColor(HOVER_PORT_COLOR)
-            border_color = QtGui.QColor(HOVER_PORT_COLOR)
-            if not valid_connection:
-                border_color = QtGui.QColor(INVALID_COLOR)
-                color = QtGui.QColor(INVALID_COLOR)
-                # TODO do another way
-                self._locked = True
+        self._locked = self._hovered and not valid_connection
 
-        if self.connected_pipes:
-            color = QtGui.QColor(*self.color)
-            border_color = QtGui.QColor(*self.color)
-        else:
-            color = QtGui.QColor(*self.color)
-            border_color = QtGui.QColor(*self.color)
-
-        pen = QtGui.QPen(border_color, 0)
+        color, pen = self.get_paint_colors()
         painter.setPen(pen)
         painter.setBrush(color)
         painter.drawEllipse(port_rect)
 
         if self.connected_pipes:
-            border_color = QtGui.QColor(CONNECTED_COLOR)
-            painter.setBrush(border_color)
+            painter.setBrush(CONNECTED_QCOLOR)
             w = port_rect.width() / 2.5
             h = port_rect.height() / 2.5
             rect = QtCore.QRectF(
@@ -165,24 +112,37 @@ class QxPortItem(NodeGraphQt.qgraphics.node_base.PortItem):
                 w,
                 h,
             )
-            # pen = QtGui.QPen(border_color, 1.6)
-            # painter.setPen(pen)
-            painter.setBrush(border_color)
             painter.drawEllipse(rect)
 
         if self._hovered:
-            color = QtGui.QColor(255, 255, 255, 70)
-            # pen = QtGui.QPen(color, 1.8)
-            # painter.setPen(pen)
-            painter.setBrush(color)
+            painter.setBrush(HOVER_OVERLAY_QCOLOR)
             painter.drawEllipse(port_rect)
         painter.restore()
 
+    def get_paint_colors(self):
+        """
+        Returns:
+            tuple(QtGui.QColor, QtGui.QPen): Fill color and border pen of the port, cached per port color
+        """
+        if self._paint_colors is None or self._paint_colors[0] != tuple(self.color):
+            color = QtGui.QColor(*self.color)
+            self._paint_colors = (tuple(self.color), color, QtGui.QPen(color, 0))
+
+        return self._paint_colors[1:]
+
 
 class QxGroupNodePortItem(QxPortItem):
     pass
 
 
+def get_compatible_port_types(port_type):
+    """
+    Returns:
+        list(str): The port type and the types it is compatible with
+    """
+    return [port_type] + ADDITIONAL_COMPATIBLE_PORT_TYPES.get(port_type, [])
+
+
 def are_ports_compatible(port1, port2):
     # If both ports are inputs or outputs, we can exit straight away
     if port1.view.port_type == port2.view.port_type:
@@ -194,14 +154,67 @@ def are_ports_compatible(port1, port2):
     port1_type = port1.view.get_mx_port_type()
     port2_type = port2.view.get_mx_port_type()
 
-    compatible_port1_types = [port1_type]
-    if port1_type in ADDITIONAL_COMPATIBLE_PORT_TYPES:
-        compatible_port1_types.extend(ADDITIONAL_COMPATIBLE_PORT_TYPES[port1_type])
+    compatible = not set(get_compatible_port_types(port1_type)).isdisjoint(get_compatible_port_types(port2_type))
 
-    compatible_port2_types = [port2_type]
-    if port2_type in ADDITIONAL_COMPATIBLE_PORT_TYPES:
-        compatible_port2_types.extend(ADDITIONAL_COMPATIBLE_PORT_TYPES[port2_type])
+    return compatible
 
-    compatible = not set(compatible_port1_types).isdisjoint(compatible_port2_types)
 
-    return compatible
+class PortTypeNodeIndex(object):
+    """Registered node names by the data types their inputs accept and their outputs produce, to find the nodes
+    that can be connected to a port without going through all of them. Types compatible through
+    ADDITIONAL_COMPATIBLE_PORT_TYPES are included.
+
+    Like the node factory, a node name stands for all node types registered with it, and the ports of the first
+    one are indexed.
+    """
+
+    def __init__(self):
+        # { port type : {node name} }
+        self._node_names_by_input_type = {}
+        self._node_names_by_output_type = {}
+        # { node name : registration index }
+        self._node_name_order = {}
+
+    def clear(self):
+        self._node_names_by_input_type = {}
+        self._node_names_by_output_type = {}
+        self._node_name_order = {}
+
+    def add_node_type(self, node):
+        """
+        Args:
+            node (type): Registered node class or placeholder, nodes without a mx_signature are skipped
+        """
+        if node.NODE_NAME in self._node_name_order:
+            return
+
+        self._node_name_order[node.NODE_NAME] = len(self._node_name_order)
+        mx_signature = getattr(node, "mx_signature", None)
+        if mx_signature is None:
+            return
+
+        for port_types, node_names_by_type in (
+            (mx_signature.input_types, self._node_names_by_input_type),
+            (mx_signature.output_types, self._node_names_by_output_type),
+        ):
+            for port_type in port_types:
+                for compatible_port_type in get_compatible_port_types(port_type):
+                    node_names_by_type.setdefault(compatible_port_type, set()).add(node.NODE_NAME)
+
+    def get_node_names(self, port_types, port_type="in"):
+        """Get the nodes that can be connected to a port.
+
+        Args:
+            port_types (list(str)): Possible data types of the port
+            port_type (str): "in" to get the nodes with a matching output, "out" for a matching input
+
+        Returns:
+            list(str): Node names in the order they were registered
+        """
+        node_names_by_type = self._node_names_by_output_type if port_type == "in" else self._node_names_by_input_type
+        node_names = set()
+        for data_type in port_types:
+            for compatible_port_type in get_compatible_port_types(data_type):
+                node_names.update(node_names_by_type.get(compatible_port_type, ()))
+
+        return sorted(node_names, key=self._node_name_order.__getitem__)
@@ -0,0 +1,260 @@
+"""Opt-in timing of the hot paths of QuiltiX.
+
+Methods decorated with profiled() record a span for every call while profiling is enabled, either with
+QUILTIX_PROFILE=1 or the "Profile hot paths" option. The spans are aggregated per name and can be exported as a
+Chrome trace, which can be opened in chrome://tracing or https://ui.perfetto.dev.
+"""
+import collections
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from qtpy import QtCore, QtWidgets  # type: ignore
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets in milliseconds, the last bucket holds everything slower
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+# Spans kept for the trace export, older ones are dropped
+MAX_TRACE_EVENTS = 200000
+
+_enabled = os.getenv("QUILTIX_PROFILE", "0") != "0"
+_lock = threading.Lock()
+# { name : SpanStats }
+_stats = {}
+# (name, start in µs, duration in µs, thread id)
+_events = collections.deque(maxlen=MAX_TRACE_EVENTS)
+_start_time = time.perf_counter()
+
+
+class SpanStats(object):
+    """Aggregated durations of all spans with the same name."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.min = min(self.min, duration)
+        self.max = max(self.max, duration)
+        duration_ms = duration * 1000
+        for index, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if duration_ms <= bound:
+                break
+        else:
+            index = len(HISTOGRAM_BOUNDS_MS)
+
+        self.histogram[index] += 1
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+    logger.info(f"Profiling {'enabled' if _enabled else 'disabled'}")
+
+
+def clear():
+    with _lock:
+        _stats.clear()
+        _events.clear()
+
+
+def get_stats():
+    """
+    Returns:
+        list[SpanStats]: Copies of the stats of all span names, the slowest in total first
+    """
+    with _lock:
+        stats = [_copy_stats(span_stats) for span_stats in _stats.values()]
+
+    return sorted(stats, key=lambda span_stats: span_stats.total, reverse=True)
+
+
+def _copy_stats(span_stats):
+    copied_stats = SpanStats(span_stats.name)
+    copied_stats.__dict__.update(span_stats.__dict__)
+    copied_stats.histogram = list(span_stats.histogram)
+    return copied_stats
+
+
+def _record(name, start_time, end_time):
+    with _lock:
+        span_stats = _stats.get(name)
+        if span_stats is None:
+            span_stats = _stats[name] = SpanStats(name)
+
+        span_stats.add(end_time - start_time)
+        _events.append(
+            (name, (start_time - _start_time) * 1e6, (end_time - start_time) * 1e6, threading.get_ident())
+        )
+
+
+@contextmanager
+def span(name):
+    """Record the duration of the context as a span with the given name, if profiling is enabled."""
+    if not _enabled:
+        yield
+        return
+
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, start_time, time.perf_counter())
+
+
+def profiled(name=None):
+    """Decorator recording every call of the function as a span, if profiling is enabled.
+
+    Args:
+        name (str, optional): Name of the spans. Defaults to the qualified name of the function.
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(span_name, start_time, time.perf_counter())
+
+        return wrapper
+
+    return decorator
+
+
+def export_chrome_trace(path):
+    """Write the recorded spans in the Chrome trace event format.
+
+    Args:
+        path (str): File to write to
+    """
+    with _lock:
+        events = list(_events)
+
+    thread_ids = {}
+    trace_events = []
+    for name, start, duration, thread_id in events:
+        trace_events.append(
+            {
+                "name": name,
+                "cat": "QuiltiX",
+                "ph": "X",
+                "ts": round(start, 3),
+                "dur": round(duration, 3),
+                "pid": os.getpid(),
+                "tid": thread_ids.setdefault(thread_id, len(thread_ids)),
+            }
+        )
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+    logger.info(f"Exported {len(trace_events)} spans to {path}")
+
+
+class ProfilerWidget(QtWidgets.QWidget):
+    """Table of the aggregated spans, refreshed periodically while visible."""
+
+    COLUMNS = ["Name", "Calls", "Total (ms)", "Mean (ms)", "Min (ms)", "Max (ms)", "Histogram"]
+
+    def __init__(self, parent=None, refresh_interval=1000):
+        super(ProfilerWidget, self).__init__(parent)
+        self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        bucket_names = [f"<={bound}ms" for bound in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}ms"]
+        self.table.horizontalHeaderItem(len(self.COLUMNS) - 1).setToolTip("Calls per bucket: " + ", ".join(bucket_names))
+
+        self.chk_enabled = QtWidgets.QCheckBox("Enabled")
+        self.chk_enabled.setChecked(is_enabled())
+        self.chk_enabled.toggled.connect(set_enabled)
+        self.b_clear = QtWidgets.QPushButton("Clear")
+        self.b_clear.clicked.connect(self.on_clear_clicked)
+        self.b_export = QtWidgets.QPushButton("Export Chrome Trace...")
+        self.b_export.clicked.connect(self.on_export_clicked)
+
+        self.lo_buttons = QtWidgets.QHBoxLayout()
+        self.lo_buttons.addWidget(self.chk_enabled)
+        self.lo_buttons.addStretch()
+        self.lo_buttons.addWidget(self.b_clear)
+        self.lo_buttons.addWidget(self.b_export)
+
+        self.lo_main = QtWidgets.QVBoxLayout(self)
+        self.lo_main.setContentsMargins(0, 0, 0, 0)
+        self.lo_main.addLayout(self.lo_buttons)
+        self.lo_main.addWidget(self.table)
+
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.setInterval(refresh_interval)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.chk_enabled.setChecked(is_enabled())
+        self.refresh()
+        self.refresh_timer.start()
+        super(ProfilerWidget, self).showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super(ProfilerWidget, self).hideEvent(event)
+
+    def refresh(self):
+        stats = get_stats()
+        self.table.setRowCount(len(stats))
+        for row, span_stats in enumerate(stats):
+            values = [
+                span_stats.name,
+                str(span_stats.count),
+                f"{span_stats.total * 1000:.2f}",
+                f"{span_stats.mean * 1000:.2f}",
+                f"{span_stats.min * 1000:.2f}",
+                f"{span_stats.max * 1000:.2f}",
+                " ".join(str(count) for count in span_stats.histogram),
+            ]
+            for column, value in enumerate(values):
+                item = self.table.item(row, column)
+                if item is None:
+                    item = QtWidgets.QTableWidgetItem()
+                    self.table.setItem(row, column, item)
+
+                item.setText(value)
+
+    def on_clear_clicked(self):
+        clear()
+        self.refresh()
+
+    def on_export_clicked(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export Chrome Trace", "quiltix_trace.json", "Chrome Trace (*.json)"
+        )
+        if path:
+            export_chrome_trace(path)
@@ -1,5 +1,5 @@
 import QuiltiX.qx_node as qx_node_module
-from QuiltiX.qx_nodegraph import QxNodeGraph
+from QuiltiX.qx_nodegraph import IndexedNodeDict, QxNodeGraph
 
 from NodeGraphQt.base.commands import PortConnectedCmd
 from NodeGraphQt.base.menu import NodeGraphMenu
@@ -54,6 +54,10 @@ class QxSubNodeGraph(QxNodeGraph):
             del self._widget
             del self._sub_graphs
 
+        # custom start - index the nodes of the sub graph in the root graph
+        self._model.nodes = IndexedNodeDict(self, self._model.nodes)
+        # custom end
+
         # clone context menu from the parent node graph.
         self._clone_context_menu_from_parent()
 
@@ -0,0 +1,121 @@
+import os
+import logging
+
+from qtpy import QtCore  # type: ignore
+
+
+logger = logging.getLogger(__name__)
+
+# About one frame at 60 fps
+DEFAULT_LATENCY = 16
+
+
+def get_latency_from_env():
+    try:
+        return int(os.getenv("QUILTIX_UPDATE_LATENCY", DEFAULT_LATENCY))
+    except ValueError:
+        logger.warning(f"Invalid QUILTIX_UPDATE_LATENCY {os.getenv('QUILTIX_UPDATE_LATENCY')}, using {DEFAULT_LATENCY}")
+        return DEFAULT_LATENCY
+
+
+class UpdateScheduler(QtCore.QObject):
+    """Collects update requests, e.g. while dragging a slider, and runs them together once the latency has passed.
+    Requests with the same key are merged and only the latest one is run.
+    """
+
+    def __init__(self, parent=None, latency=None):
+        """
+        Args:
+            parent (QtCore.QObject, optional): Parent object
+            latency (int, optional): Milliseconds to wait for more requests before running them.
+                Requests are run immediately if lower than 0. Defaults to QUILTIX_UPDATE_LATENCY.
+        """
+        super(UpdateScheduler, self).__init__(parent)
+        # { key : (callback, args) }, in the order the keys were first requested
+        self._pending = {}
+        self._flushing = False
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        self.requested_counts = {}
+        self.merged_counts = {}
+        self.flush_count = 0
+        self.set_latency(get_latency_from_env() if latency is None else latency)
+
+    @property
+    def latency(self):
+        return self._latency
+
+    def set_latency(self, latency):
+        self._latency = latency
+        self._timer.setInterval(max(latency, 0))
+
+    def request(self, key, callback, *args):
+        """Run the callback with the given arguments with the next flush.
+
+        Args:
+            key (tuple): Identifies the update. Its first item is the kind of update, e.g. "parameter".
+                A pending request with the same key is replaced.
+            callback (callable): Function running the update
+        """
+        kind = key[0]
+        self.requested_counts[kind] = self.requested_counts.get(kind, 0) + 1
+        if key in self._pending:
+            self.merged_counts[kind] = self.merged_counts.get(kind, 0) + 1
+
+        self._pending[key] = (callback, args)
+        if self._flushing:
+            # Run as part of the current flush
+            return
+
+        if self._latency < 0:
+            self.flush()
+        elif not self._timer.isActive():
+            # Not restarted by later requests, so continuous changes are still shown
+            self._timer.start()
+
+    def discard(self, kind):
+        """Drop all pending requests of the given kind, e.g. because a pending update of another kind includes them."""
+        keys = [key for key in self._pending if key[0] == kind]
+        for key in keys:
+            del self._pending[key]
+
+        if keys:
+            self.merged_counts[kind] = self.merged_counts.get(kind, 0) + len(keys)
+
+    def has_pending(self, kind=None):
+        return any(kind is None or key[0] == kind for key in self._pending)
+
+    def flush(self):
+        """Run all pending requests, including the ones requested while flushing."""
+        self._timer.stop()
+        if self._flushing:
+            return
+
+        run_count = 0
+        self._flushing = True
+        try:
+            while self._pending:
+                key = next(iter(self._pending))
+                callback, args = self._pending.pop(key)
+                run_count += 1
+                try:
+                    callback(*args)
+                except Exception:
+                    logger.exception(f"Update {key} failed")
+        finally:
+            self._flushing = False
+
+        if run_count:
+            self.flush_count += 1
+            logger.debug(f"flushed {run_count} updates, merged so far: {self.merged_counts}")
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: { kind : {"requested": int, "merged": int} }
+        """
+        return {
+            kind: {"requested": count, "merged": self.merged_counts.get(kind, 0)}
+            for kind, count in self.requested_counts.items()
+        }
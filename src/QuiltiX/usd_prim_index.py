@@ -0,0 +1,130 @@
+import bisect
+import logging
+
+from pxr import Usd, UsdGeom, Sdf, Tf  # type: ignore
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_traversed(prim):
+    """Whether Usd.Stage.Traverse visits the prim, i.e. it and all its ancestors match the default predicate."""
+    while prim and not prim.IsPseudoRoot():
+        if not Usd.PrimDefaultPredicate(prim):
+            return False
+
+        prim = prim.GetParent()
+
+    return bool(prim)
+
+
+class GprimIndex(object):
+    """Index of the geometry prims of a stage. It is built when first queried and afterwards only the parts of the
+    stage resynced by Usd.Notice.ObjectsChanged notices are traversed again.
+    """
+
+    def __init__(self, stage=None):
+        self.stage = None
+        self._stage_listener = None
+        # { path string : Usd.Prim }, None until built
+        self._prims = None
+        # Sorted path strings of the prims, the descendants of a path follow it directly
+        self._sorted_paths = []
+        # Prim paths resynced since the last query
+        self._resynced_paths = set()
+        self.set_stage(stage)
+
+    def set_stage(self, stage):
+        if self._stage_listener:
+            self._stage_listener.Revoke()
+            self._stage_listener = None
+
+        self.stage = stage
+        self.invalidate()
+        if stage:
+            self._stage_listener = Tf.Notice.Register(Usd.Notice.ObjectsChanged, self._on_objects_changed, stage)
+
+    def invalidate(self):
+        """Traverse the whole stage again with the next query."""
+        self._prims = None
+        self._sorted_paths = []
+        self._resynced_paths = set()
+
+    def get_prims(self, schema_type=None, purposes=None):
+        """Get the geometry prims of the stage, ordered by path.
+
+        Args:
+            schema_type (type, optional): Only get prims of this schema or derived ones, e.g. UsdGeom.Mesh
+            purposes (list[str], optional): Only get prims with one of these computed purposes,
+                e.g. [UsdGeom.Tokens.default_, UsdGeom.Tokens.render]
+
+        Returns:
+            list[Usd.Prim]: Geometry prims
+        """
+        self._update()
+        prims = [self._prims[path] for path in self._sorted_paths]
+        if schema_type is not None:
+            prims = [prim for prim in prims if prim.IsA(schema_type)]
+
+        if purposes is not None:
+            prims = [prim for prim in prims if UsdGeom.Imageable(prim).ComputePurpose() in purposes]
+
+        return prims
+
+    def _on_objects_changed(self, notice, stage):
+        if self._prims is None:
+            return
+
+        for path in notice.GetResyncedPaths():
+            # Added or removed properties don't change the prim types
+            if path.IsPrimPath() or path == Sdf.Path.absoluteRootPath:
+                self._resynced_paths.add(path)
+
+    def _update(self):
+        if self._prims is not None and Sdf.Path.absoluteRootPath in self._resynced_paths:
+            self._prims = None
+
+        if self._prims is None:
+            self._prims = {}
+            self._sorted_paths = []
+            self._resynced_paths = set()
+            if self.stage:
+                self._add_prims(self.stage.GetPseudoRoot())
+
+            logger.debug(f"indexed {len(self._prims)} gprims")
+            return
+
+        if not self._resynced_paths:
+            return
+
+        resynced_paths = Sdf.Path.RemoveDescendentPaths(list(self._resynced_paths))
+        self._resynced_paths = set()
+        for path in resynced_paths:
+            self._remove_prims(path.pathString)
+
+        for path in resynced_paths:
+            prim = self.stage.GetPrimAtPath(path)
+            if is_traversed(prim):
+                self._add_prims(prim)
+
+    def _add_prims(self, root_prim):
+        added_paths = []
+        for prim in Usd.PrimRange(root_prim, Usd.PrimDefaultPredicate):
+            if prim.IsA(UsdGeom.Gprim):
+                path = prim.GetPath().pathString
+                self._prims[path] = prim
+                added_paths.append(path)
+
+        if added_paths:
+            self._sorted_paths.extend(sorted(added_paths))
+            self._sorted_paths.sort()
+
+    def _remove_prims(self, root_path):
+        # All characters allowed in prim names sort after "/", so the prim and its descendants are all paths from
+        # root_path up to root_path + "0"
+        start = bisect.bisect_left(self._sorted_paths, root_path)
+        end = bisect.bisect_left(self._sorted_paths, root_path + "0", start)
+        for path in self._sorted_paths[start:end]:
+            del self._prims[path]
+
+        del self._sorted_paths[start:end]
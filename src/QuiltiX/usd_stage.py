@@ -1,21 +1,27 @@
 import os
+import re
 import pathlib
 import logging
 
 from qtpy import QtCore # type: ignore
 
-from pxr import Usd, UsdLux, Sdf, Tf, UsdGeom,  UsdShade, Gf  # noqa: E402 # type: ignore
-from pxr.Usdviewq._usdviewq import Utils # type: ignore
-
-import MaterialX as mx
+from pxr import Usd, UsdLux, Sdf, UsdShade, Gf  # noqa: E402 # type: ignore
 
 from QuiltiX import mx_node
+from QuiltiX.qx_profiler import profiled
+from QuiltiX.usd_prim_index import GprimIndex
 # TODO: decouple from QxNode
 from QuiltiX.qx_node import QxNode
 
 
 logger = logging.getLogger(__name__)
 
+MX_ROOT_PATH = Sdf.Path("/MaterialX")
+MATERIALS_PATH = MX_ROOT_PATH.AppendChild("Materials")
+# Collections of the prims a material is bound to with apply_material_to_prims(use_collection=True)
+MATERIAL_COLLECTION_PREFIX = "quiltix_"
+MATERIAL_COLLECTION_INCLUDES_RE = re.compile(rf"collection:({MATERIAL_COLLECTION_PREFIX}[^:]+):includes$")
+
 
 def set_pxr_mtlx_stdlib_search_paths():
     """Usd searches in PXR_MTLX_STDLIB_SEARCH_PATHS for the MaterialX standard library of nodes.
@@ -55,6 +61,42 @@ def create_stage_with_hdri(hdri_file_path, hdri_parent_path="/lights"):
     return stage
 
 
+def _prepend_api_schema(prim_spec, schema_name):
+    api_schemas = prim_spec.GetInfo("apiSchemas")
+    if schema_name in api_schemas.GetAddedOrExplicitItems():
+        return
+
+    if api_schemas.isExplicit:
+        api_schemas.explicitItems = list(api_schemas.explicitItems) + [schema_name]
+    else:
+        api_schemas.prependedItems = list(api_schemas.prependedItems) + [schema_name]
+
+    prim_spec.SetInfo("apiSchemas", api_schemas)
+
+
+def _get_relationship_targets(prim_spec, name):
+    rel_spec = prim_spec.layer.GetRelationshipAtPath(prim_spec.path.AppendProperty(name))
+    if not rel_spec:
+        return []
+
+    return list(rel_spec.targetPathList.GetAddedOrExplicitItems())
+
+
+def _set_relationship_targets(prim_spec, name, targets):
+    """Author the targets as an explicit list, an empty list blocks the relationship.
+
+    Returns:
+        Sdf.RelationshipSpec: Spec of the relationship
+    """
+    rel_spec = prim_spec.layer.GetRelationshipAtPath(prim_spec.path.AppendProperty(name))
+    if not rel_spec:
+        rel_spec = Sdf.RelationshipSpec(prim_spec, name, custom=False)
+
+    rel_spec.targetPathList.ClearEditsAndMakeExplicit()
+    rel_spec.targetPathList.explicitItems = targets
+    return rel_spec
+
+
 def add_layer_to_stage_root(stage, layer_path):
     root = stage.GetRootLayer()
     root.subLayerPaths.insert(0, layer_path)
@@ -74,11 +116,24 @@ class MxStageController(QtCore.QObject):
         self.added_layers = []
         self.editor = editor
         self.applied_material = None
+        self.gprim_index = GprimIndex()
+        # Layer the graph is imported into and the document it was last updated with
+        self._mx_layer = None
+        self._mx_layer_path = None
+        self._applied_mx_data = None
+        # { (node id, property name) : Usd.Attribute }
+        self._parameter_attributes = {}
 
     def set_stage(self, stage):
         self.stage = stage
         self.stage_root = self.stage.GetRootLayer()
         self.stage.SetEditTarget(Usd.EditTarget(self.stage.GetSessionLayer()))
+        self.gprim_index.set_stage(stage)
+        # The graph layer is added to the new stage with the next refresh_mx_file
+        self.added_layers = []
+        self._mx_layer = None
+        self._applied_mx_data = None
+        self.invalidate_parameter_attributes()
 
         in_memory = os.getenv("QUILTIX_WRITE_TMP_TO_DISK", "0") == "0"
         if in_memory:
@@ -93,25 +148,89 @@ class MxStageController(QtCore.QObject):
         self.signal_stage_changed.emit(self.stage)
 
     def get_all_geo_prims(self):
-        return Utils._GetAllPrimsOfType(self.stage, Tf.Type.Find(UsdGeom.Gprim))
+        return self.gprim_index.get_prims()
 
-    def apply_first_material_to_all_prims(self):
-        mx_data = self.editor.qx_node_graph.get_mx_xml_data_from_graph()
-        if not mx_data:
-            return
+    def get_geo_prims(self, schema_type=None, purposes=None):
+        """Get the geometry prims of the stage from the index, which is kept up to date with the stage.
 
-        tmp_mx_doc = mx.createDocument()
-        mx.readFromXmlString(tmp_mx_doc, mx_data)
-        if mx_doc_materials := tmp_mx_doc.getMaterials():
-            first_mx_material_name = mx_doc_materials[0].getName()
-        else:
+        Args:
+            schema_type (type, optional): Only get prims of this schema or derived ones, e.g. UsdGeom.Mesh
+            purposes (list[str], optional): Only get prims with one of these computed purposes
+
+        Returns:
+            list[Usd.Prim]: Geometry prims
+        """
+        return self.gprim_index.get_prims(schema_type=schema_type, purposes=purposes)
+
+    def apply_first_material_to_all_prims(self):
+        material_names = self.editor.qx_node_graph.get_mx_material_names()
+        if not material_names:
             # TODO: error out
             return
 
         prims = self.get_all_geo_prims()
-        self.apply_material_to_prims(first_mx_material_name, prims)
+        self.apply_material_to_prims(material_names[0], prims, use_collection=True)
 
+    @profiled()
     def refresh_mx_file(self, mx_data, emit=True):
+        if self.added_layers and mx_data == self._applied_mx_data:
+            return
+
+        if not self._update_mx_layer(mx_data):
+            self._replace_mx_layer(mx_data)
+
+        self._applied_mx_data = mx_data
+        self.invalidate_parameter_attributes()
+        if emit:
+            # TODO: remove -- DEBUG purpose
+            # tmp_usd_stage_export_location = os.path.join(os.environ["TEMP"], "matxeditor_tmp.usda")
+            # self.stage_root.Export(tmp_usd_stage_export_location)
+            # logger.debug(f"Refreshed mtlx: {tmp_usd_stage_export_location}")
+            self.schedule_stage_update()
+
+    def _get_mx_layer_path(self):
+        cur_path = self.editor.current_filepath if self.editor else None
+        if cur_path and cur_path != "untitled":
+            # allows relative filepaths
+            return os.path.join(os.path.dirname(cur_path), "_tmp_quiltix_graph.mtlx")
+
+        return None
+
+    def _update_mx_layer(self, mx_data):
+        """Import the document into the current layer of the graph. Sdf only applies the differences to the previous
+        content of the layer, so only the changed prims are resynced instead of all materials.
+
+        Returns:
+            bool: False if the layer has to be replaced instead, e.g. because the graph was saved to another folder
+        """
+        if not self._mx_layer or os.getenv("QUILTIX_FULL_USD_REFRESH", "0") != "0":
+            return False
+
+        if self._mx_layer_path != self._get_mx_layer_path():
+            return False
+
+        with Sdf.ChangeBlock():
+            self._clear_session_mx_overrides()
+            imported = self._mx_layer.ImportFromString(mx_data)
+
+        if not imported:
+            logger.warning("Failed to update the MaterialX layer, replacing it")
+
+        return imported
+
+    def _clear_session_mx_overrides(self):
+        """Remove the values set by update_parameter, which are part of the imported document."""
+        session_layer = self.stage.GetSessionLayer()
+        if not session_layer.GetPrimAtPath(MX_ROOT_PATH):
+            return
+
+        property_paths = []
+        session_layer.Traverse(MX_ROOT_PATH, lambda path: path.IsPrimPropertyPath() and property_paths.append(path))
+        for path in property_paths:
+            prim_spec = session_layer.GetPrimAtPath(path.GetPrimPath())
+            prim_spec.RemoveProperty(prim_spec.properties[path.name])
+
+    def _replace_mx_layer(self, mx_data):
         for layer in self.added_layers:
             self.stage_root.subLayerPaths.remove(layer)
             self.added_layers.remove(layer)
@@ -122,48 +241,89 @@ class MxStageController(QtCore.QObject):
         if in_memory:
             idf = "_tmp_quiltix_graph.mtlx"
             layer = Sdf.Layer.CreateAnonymous(idf)
-            cur_path = self.editor.current_filepath
-            if cur_path and cur_path != "untitled":
-                # allows relative filepaths
-                idf = os.path.join(os.path.dirname(cur_path), "_tmp_quiltix_graph.mtlx")
-                layer.identifier = idf
+            layer_path = self._get_mx_layer_path()
+            if layer_path:
+                layer.identifier = layer_path
 
             idf = layer.identifier
             layer.ImportFromString(mx_data)
+            self._mx_layer = layer
+            self._mx_layer_path = layer_path
         else:
             tmp_mtlx_export_location = os.path.join(os.environ["TEMP"], "_tmp_quiltix_graph.mtlx")
             with open(tmp_mtlx_export_location, "w") as f:
                 f.write(mx_data)
 
             idf = tmp_mtlx_export_location
+            self._mx_layer = None
 
         self.stage_root.subLayerPaths.insert(0, idf)
         self.added_layers.append(idf)
 
-        if emit:
-            # TODO: remove -- DEBUG purpose
-            # tmp_usd_stage_export_location = os.path.join(os.environ["TEMP"], "matxeditor_tmp.usda")
-            # self.stage_root.Export(tmp_usd_stage_export_location)
-            # logger.debug(f"Refreshed mtlx: {tmp_usd_stage_export_location}")
-            self.signal_stage_updated.emit()
-
+    @profiled()
     def update_parameter(self, qx_node, property_name, property_value):
-        property_name = QxNode.get_mx_input_name_from_property_name(qx_node, property_name)
+        if property_name in ("name", "type"):
+            # The prim paths of the node and the nodes of its subgraph may have changed
+            self.invalidate_parameter_attributes()
 
         if not self.applied_material:
             return
-        
+
+        attr = self.get_parameter_attribute(qx_node, property_name)
+        if not attr:
+            return
+
+        if type(property_value) in [list, tuple]:
+            if len(property_value) == 4:
+                property_value = property_value[
+                    :3
+                ]  # temporary fix, the RGB color picker widgets emits a list of 4 values
+
+            if len(property_value) == 3:
+                property_value = Gf.Vec3f(property_value)
+            elif len(property_value) == 2:
+                property_value = Gf.Vec2f(property_value)                
+
+        attr.Set(property_value)
+        self.schedule_stage_update()
+
+    def get_parameter_attribute(self, qx_node, property_name):
+        """Get the attribute of the stage a node property is translated to. It is cached until the graph layer is
+        updated or a node is renamed.
+
+        Args:
+            qx_node (QxNode): Node of the property
+            property_name (str): Name of the property
+
+        Returns:
+            Usd.Attribute: The attribute or None if the property is not part of the stage
+        """
+        key = (qx_node.id, property_name)
+        attr = self._parameter_attributes.get(key)
+        if attr is None or not attr.IsValid():
+            attr = self._find_parameter_attribute(qx_node, property_name)
+            if attr:
+                self._parameter_attributes[key] = attr
+
+        return attr
+
+    def invalidate_parameter_attributes(self):
+        self._parameter_attributes = {}
+
+    def _find_parameter_attribute(self, qx_node, property_name):
+        property_name = QxNode.get_mx_input_name_from_property_name(qx_node, property_name)
+
         if qx_node.type_ == "Other.QxGroupNode":
             ng_name = qx_node.name()
             sub_graph = qx_node.get_sub_graph()
             if not sub_graph:
-                return
+                return None
 
             in_port_node = sub_graph.get_input_port_nodes()[0]
             out_port = in_port_node.get_output(property_name)
             cports = out_port.connected_ports()
             if not cports:
-                return
+                return None
 
             mx_stage_path = f"/MaterialX/NodeGraphs/{ng_name}/" + cports[0].node().name()
             property_name = cports[0].name()
@@ -183,46 +343,129 @@ class MxStageController(QtCore.QObject):
 
         if not prim.IsValid():
             logger.warning("invalid prim at path: " + mx_stage_path)
-            return
+            return None
 
-        usdinput = UsdShade.Shader(prim).GetInput(property_name)
-        attr = usdinput.GetAttr()
+        attr = UsdShade.Shader(prim).GetInput(property_name).GetAttr()
         if not attr.IsValid():
             logger.warning(f"Invalid attribute {property_name} on prim {mx_stage_path}")
+            return None
+
+        return attr
+
+    def apply_material_to_prims(self, material_name, prims, use_collection=False):
+        """Bind the material to the prims in the assignments layer, replacing their current bindings.
+
+        Args:
+            material_name (str): Name of the material in the MaterialX document
+            prims (list[Usd.Prim]): Prims to bind the material to
+            use_collection (bool, optional): Bind the material once per root prim to a collection of the prims,
+                instead of authoring a binding on every prim. Defaults to False.
+        """
+        material_path = MATERIALS_PATH.AppendChild(material_name)
+        if not self.stage.GetPrimAtPath(material_path).IsValid():
+            logger.warning("invalid material: " + material_path.pathString)
             return
 
-        if type(property_value) in [list, tuple]:
-            if len(property_value) == 4:
-                property_value = property_value[
-                    :3
-                ]  # temporary fix, the RGB color picker widgets emits a list of 4 values
-
-            if len(property_value) == 3:
-                property_value = Gf.Vec3f(property_value)
-            elif len(property_value) == 2:
-                property_value = Gf.Vec2f(property_value)                
-
-        usdinput.GetAttr().Set(property_value)
-        self.signal_stage_updated.emit()
-
-    def apply_material_to_prims(self, material_name, prims):
-        mx_material_stage_path = "/".join(("", "MaterialX", "Materials", material_name))
-        if not self.stage.GetPrimAtPath(mx_material_stage_path).IsValid():
-            logger.warning("invalid material: " + mx_material_stage_path)
+        if use_collection:
+            self._bind_material_to_collections(material_path, [prim.GetPath() for prim in prims])
+        else:
+            self._bind_material_to_prims(material_path, prims)
+
+        if prims:
+            self.applied_material = material_path.pathString
+            logger.info(f"applied material {material_path} to {len(prims)} prims")
+
+        self.schedule_stage_update()
+
+    def _bind_material_to_prims(self, material_path, prims):
+        # Like UnbindAllBindings, the other bindings of the prims are blocked. They have to be read from the
+        # composed stage before authoring, the stage is only recomposed once the change block ends.
+        binding_names = {
+            prim.GetPath(): [
+                prop.GetName()
+                for prop in prim.GetPropertiesInNamespace(UsdShade.Tokens.materialBinding)
+                if isinstance(prop, Usd.Relationship)
+            ]
+            for prim in prims
+        }
+
+        with Sdf.ChangeBlock():
+            self._remove_from_material_collections(binding_names)
+            for prim_path, names in binding_names.items():
+                prim_spec = Sdf.CreatePrimInLayer(self._assignments_layer, prim_path)
+                _prepend_api_schema(prim_spec, "MaterialBindingAPI")
+                for name in names:
+                    _set_relationship_targets(prim_spec, name, [])
+
+                _set_relationship_targets(prim_spec, UsdShade.Tokens.materialBinding, [material_path])
+
+    def _bind_material_to_collections(self, material_path, prim_paths):
+        collection_name = MATERIAL_COLLECTION_PREFIX + material_path.name
+        prim_paths_by_root = {}
+        for prim_path in prim_paths:
+            prim_paths_by_root.setdefault(prim_path.GetPrefixes()[0], []).append(prim_path)
+
+        with Sdf.ChangeBlock():
+            self._remove_from_material_collections(prim_paths, keep_collection_name=collection_name)
+            for root_path, root_prim_paths in prim_paths_by_root.items():
+                root_spec = Sdf.CreatePrimInLayer(self._assignments_layer, root_path)
+                _prepend_api_schema(root_spec, "MaterialBindingAPI")
+                _prepend_api_schema(root_spec, f"CollectionAPI:{collection_name}")
+
+                includes_name = f"collection:{collection_name}:includes"
+                includes = _get_relationship_targets(root_spec, includes_name)
+                included = set(includes)
+                includes += [prim_path for prim_path in root_prim_paths if prim_path not in included]
+                _set_relationship_targets(root_spec, includes_name, includes)
+
+                expansion_rule_name = f"collection:{collection_name}:expansionRule"
+                expansion_rule_spec = root_spec.attributes.get(expansion_rule_name)
+                if not expansion_rule_spec:
+                    expansion_rule_spec = Sdf.AttributeSpec(
+                        root_spec, expansion_rule_name, Sdf.ValueTypeNames.Token, Sdf.VariabilityUniform
+                    )
+                expansion_rule_spec.default = Usd.Tokens.explicitOnly
+
+                binding_spec = _set_relationship_targets(
+                    root_spec,
+                    f"{UsdShade.Tokens.materialBinding}:collection:{collection_name}",
+                    [root_path.AppendProperty(f"collection:{collection_name}"), material_path],
+                )
+                # Bindings authored on the prims themselves would win otherwise
+                binding_spec.SetInfo(UsdShade.Tokens.bindMaterialAs, UsdShade.Tokens.strongerThanDescendants)
+
+    def _remove_from_material_collections(self, prim_paths, keep_collection_name=None):
+        """Remove the prims and their descendants from the material collections authored by apply_material_to_prims.
+
+        Args:
+            prim_paths (iterable[Sdf.Path]): Paths of the prims to remove
+            keep_collection_name (str, optional): Name of a collection to leave unchanged
+        """
+        prim_paths = set(prim_paths)
+        for root_path in {prim_path.GetPrefixes()[0] for prim_path in prim_paths}:
+            root_spec = self._assignments_layer.GetPrimAtPath(root_path)
+            if not root_spec:
+                continue
+
+            for rel_spec in root_spec.relationships:
+                match = MATERIAL_COLLECTION_INCLUDES_RE.match(rel_spec.name)
+                if not match or match.group(1) == keep_collection_name:
+                    continue
+
+                includes = _get_relationship_targets(root_spec, rel_spec.name)
+                kept_includes = [
+                    path for path in includes if not any(prefix in prim_paths for prefix in path.GetPrefixes())
+                ]
+                if len(kept_includes) != len(includes):
+                    _set_relationship_targets(root_spec, rel_spec.name, kept_includes)
+
+    def schedule_stage_update(self):
+        """Emit signal_stage_updated once for all stage changes up to the next flush of the update scheduler."""
+        if not self.editor:
+            self.signal_stage_updated.emit()
             return
 
-        material = UsdShade.Material.Get(self.stage, mx_material_stage_path)
-        prev_target = self.stage.GetEditTarget()
-        self.stage.SetEditTarget(Usd.EditTarget(self._assignments_layer))
-        for prim in prims:
-            prim.ApplyAPI(UsdShade.MaterialBindingAPI)
-            UsdShade.MaterialBindingAPI(prim).UnbindAllBindings()
-            UsdShade.MaterialBindingAPI(prim).Bind(material)
-            self.applied_material = mx_material_stage_path
-            logger.info("applied material %s to %s" % (mx_material_stage_path, prim.GetPath()))
-
-        self.stage.SetEditTarget(prev_target)
-        self.signal_stage_updated.emit()
+        self.editor.qx_node_graph.update_scheduler.request(("stage",), self.signal_stage_updated.emit)
 
     def about_to_close(self):
         for layer in self.added_layers:
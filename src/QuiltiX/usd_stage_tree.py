@@ -3,67 +3,393 @@ import sys
 
 from qtpy import QtWidgets, QtCore, QtGui  # type: ignore
 
-from pxr import Usd, UsdGeom
+from pxr import Usd, UsdGeom, Sdf, Tf
 from QuiltiX import usd_stage
 from QuiltiX.constants import ROOT
+from QuiltiX.qx_profiler import profiled
 
 EYE_VISABLE = os.path.join(ROOT, "resources", "icons", "eye_visible.svg")
 EYE_INVISABLE = os.path.join(ROOT, "resources", "icons", "eye_invisible.svg")
 
+# Data role of the visibility column. None for prims without a visibility, otherwise bool
+VISIBILITY_ROLE = QtCore.Qt.UserRole + 1
+# Amount of children created at once when a prim is expanded
+FETCH_BATCH_SIZE = 1000
 
-class PrimVisButton(QtWidgets.QToolButton):
-    def __init__(self, parent=None):
-        super(PrimVisButton, self).__init__()
-        self.setStyleSheet("padding: 0px; margin: 0px; background-color: rgba(255, 255, 255, 0);")
 
-        # TODO: only have one QIcon for all buttons
-        self.vis_icon = QtGui.QIcon(EYE_VISABLE)
-        self.invis_icon = QtGui.QIcon(EYE_INVISABLE)
+class PrimNode(object):
+    """A prim in the stage tree model. Its children are only created once they are fetched."""
 
-        self.vis = True
-        self.setIcon(self.vis_icon)
-        self.setFixedSize(14, 14)
-        # self.clicked.connect(self.toggle_visibility)
+    __slots__ = ("path", "prim", "parent", "row", "children", "child_prims", "visible", "_has_visibility")
 
-    def toggle_visibility(self):
-        self.vis = not self.vis
-        self.update_vis_icon()
-        return self.vis
+    def __init__(self, prim, parent=None, row=0):
+        self.prim = prim
+        self.path = prim.GetPath() if prim else None
+        self.parent = parent
+        self.row = row
+        # Fetched child nodes, always the first ones of child_prims
+        self.children = []
+        # Child prims to show, None until first fetched
+        self.child_prims = None
+        self.visible = parent.visible if parent else True
+        self._has_visibility = None
+
+    @property
+    def name(self):
+        return self.path.name
+
+    @property
+    def has_visibility(self):
+        if self._has_visibility is None:
+            # FIXME: this will probably not work in all cases
+            self._has_visibility = bool(UsdGeom.Imageable(self.prim).GetVisibilityAttr())
+
+        return self._has_visibility
+
+    def set_prim(self, prim):
+        self.prim = prim
+        self._has_visibility = None
 
-    def update_vis_icon(self):
-        if self.vis:
-            self.setIcon(self.vis_icon)
-        else:
-            self.setIcon(self.invis_icon)
 
-    def set_visibility(self, visibility):
-        self.vis = visibility
-        self.update_vis_icon()
-        return self.vis
+class UsdStageTreeModel(QtCore.QAbstractItemModel):
+    """Lazy model of the prims of a stage. Child rows are created when a prim is expanded and updated from the
+    Usd.Notice.ObjectsChanged notices of the stage.
+    """
 
+    def __init__(self, stage=None, parent=None):
+        super(UsdStageTreeModel, self).__init__(parent)
+        self.stage = None
+        self._stage_listener = None
+        self._root_node = PrimNode(None)
+        self._path_to_node_map = {}
+        # Paths of the matching prims and their ancestors, None if not filtered
+        self._filter_paths = None
+        self._filter_text = ""
+        # Paths of the prims which changed since the model was last refreshed
+        self._resynced_paths = set()
+        self._refresh_timer = QtCore.QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.timeout.connect(self.refresh)
+        self.set_stage(stage)
 
-class PrimItemWidget(QtWidgets.QTreeWidgetItem):
-    def __init__(self, prim):
-        super(PrimItemWidget, self).__init__()
-        self.prim = prim
+    def set_stage(self, stage):
+        if self._stage_listener:
+            self._stage_listener.Revoke()
+            self._stage_listener = None
+
+        self.stage = stage
+        if stage:
+            self._stage_listener = Tf.Notice.Register(Usd.Notice.ObjectsChanged, self._on_objects_changed, stage)
+
+        self.reset()
+
+    def reset(self):
+        self.beginResetModel()
+        self._root_node = PrimNode(None)
+        self._path_to_node_map = {}
+        self._resynced_paths = set()
+        self._update_filter_paths()
+        if self.stage:
+            pseudo_root_node = self._create_node(self.stage.GetPseudoRoot(), self._root_node, 0)
+            self._root_node.children = [pseudo_root_node]
+            self._root_node.child_prims = [pseudo_root_node.prim]
+
+        self.endResetModel()
+
+    def set_filter(self, text):
+        """Only show the prims whose name or type contains the text and their ancestors.
+
+        Args:
+            text (str): Case insensitive text to look for, shows all prims if empty
+        """
+        self._filter_text = text.lower()
+        self.reset()
+
+    def _update_filter_paths(self):
+        if not self._filter_text or not self.stage:
+            self._filter_paths = None
+            return
+
+        # Only the paths are collected, rows are still created on demand
+        self._filter_paths = {Sdf.Path.absoluteRootPath}
+        for prim in Usd.PrimRange(self.stage.GetPseudoRoot(), Usd.PrimIsActive):
+            if self._filter_text in prim.GetName().lower() or self._filter_text in str(prim.GetTypeName()).lower():
+                self._filter_paths.update(prim.GetPath().GetAncestorsRange())
+
+    def get_node(self, index):
+        if index.isValid():
+            return index.internalPointer()
+
+        return self._root_node
+
+    def get_index(self, node, column=0):
+        if node is self._root_node:
+            return QtCore.QModelIndex()
+
+        return self.createIndex(node.row, column, node)
+
+    def get_node_from_path(self, path):
+        return self._path_to_node_map.get(path)
+
+    def _create_node(self, prim, parent_node, row):
+        node = PrimNode(prim, parent_node, row)
+        self._path_to_node_map[node.path] = node
+        return node
+
+    def _get_filtered_prim_children(self, prim):
+        prim_children = prim.GetFilteredChildren(Usd.PrimIsActive)
+        if self._filter_paths is not None:
+            prim_children = [prim_child for prim_child in prim_children if prim_child.GetPath() in self._filter_paths]
+
+        return prim_children
+
+    # region QAbstractItemModel
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        parent_node = self.get_node(parent)
+        if row < 0 or row >= len(parent_node.children):
+            return QtCore.QModelIndex()
+
+        return self.createIndex(row, column, parent_node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+
+        return self.get_index(index.internalPointer().parent)
 
-    def data(self, column, role):
-        if column == 0:
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+
+        return len(self.get_node(parent).children)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 2
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        node = self.get_node(parent)
+        if node.children:
+            return True
+
+        if node.child_prims is None and node.prim:
+            node.child_prims = self._get_filtered_prim_children(node.prim)
+
+        return bool(node.child_prims)
+
+    def canFetchMore(self, parent):
+        node = self.get_node(parent)
+        if node.child_prims is None:
+            return bool(node.prim)
+
+        return len(node.children) < len(node.child_prims)
+
+    def fetchMore(self, parent):
+        node = self.get_node(parent)
+        if node.child_prims is None:
+            node.child_prims = self._get_filtered_prim_children(node.prim)
+
+        first_row = len(node.children)
+        last_row = min(len(node.child_prims), first_row + FETCH_BATCH_SIZE) - 1
+        if last_row < first_row:
+            return
+
+        self.beginInsertRows(parent, first_row, last_row)
+        for row in range(first_row, last_row + 1):
+            node.children.append(self._create_node(node.child_prims[row], node, row))
+
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        node = index.internalPointer()
+        if index.column() == 0:
             if role == QtCore.Qt.DisplayRole:
-                return self.prim.GetName()
-                # return "foo"
-        return super().data(column, role)
+                return node.name
+            elif role == QtCore.Qt.ToolTipRole:
+                return f"{node.path} ({node.prim.GetTypeName()})" if node.prim else str(node.path)
+        elif index.column() == 1 and role == VISIBILITY_ROLE:
+            if node.prim and node.has_visibility:
+                return node.visible
+
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+    # endregion QAbstractItemModel
+
+    def toggle_hierarchy_visibility(self, index, set_visibility_to=None):
+        node = self.get_node(index)
+        if set_visibility_to is None:
+            set_visibility_to = not node.visible
+
+        # TODO: hide stage prims
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            node.visible = set_visibility_to
+            node_index = self.get_index(node, 1)
+            self.dataChanged.emit(node_index, node_index, [VISIBILITY_ROLE])
+            nodes.extend(node.children)
+
+    # region Stage changes
+    def _on_objects_changed(self, notice, stage):
+        for path in notice.GetResyncedPaths():
+            # Added or removed properties don't change the tree
+            if path.IsPrimPath() or path == Sdf.Path.absoluteRootPath:
+                self._resynced_paths.add(path)
+
+        if self._resynced_paths and not self._refresh_timer.isActive():
+            self._refresh_timer.start()
+
+    def refresh(self):
+        """Update the rows of the prims which changed since the last refresh, keeping the rows of the prims which
+        still exist.
+        """
+        self._refresh_timer.stop()
+        resynced_paths = self._resynced_paths
+        self._resynced_paths = set()
+        if not self.stage or not resynced_paths:
+            return
+
+        if self._filter_paths is not None:
+            self._update_filter_paths()
+
+        for path in sorted(resynced_paths):
+            # Changes of the ancestors include this one
+            if any(ancestor_path in resynced_paths for ancestor_path in path.GetAncestorsRange() if ancestor_path != path):
+                continue
+
+            node = self._path_to_node_map.get(path)
+            if node is None:
+                # New prims are added by the row of their parent. When filtered, their ancestors might be new as well
+                parent_path = path.GetParentPath()
+                while self._filter_paths is not None and parent_path not in self._path_to_node_map and parent_path != Sdf.Path.absoluteRootPath:
+                    parent_path = parent_path.GetParentPath()
+
+                parent_node = self._path_to_node_map.get(parent_path)
+                parent_prim = parent_node and self.stage.GetPrimAtPath(parent_node.path)
+                if parent_prim:
+                    self._sync_node(parent_node, parent_prim, recursive=False)
 
+                continue
 
-class UsdStageTreeWidget(QtWidgets.QTreeWidget):
+            prim = self.stage.GetPrimAtPath(path)
+            is_shown = prim and (prim.IsPseudoRoot() or prim.IsActive())
+            if is_shown and self._filter_paths is not None:
+                is_shown = path in self._filter_paths
+
+            if not is_shown:
+                self._remove_node(node)
+                continue
+
+            self._sync_node(node, prim)
+
+    def _sync_node(self, node, prim, recursive=True):
+        """Update the node and its fetched children to match the prim and its current children."""
+        node.set_prim(prim)
+        if node.child_prims is None:
+            # Never queried, nothing to update
+            return
+
+        was_fetched = len(node.children) == len(node.child_prims)
+        prim_children = self._get_filtered_prim_children(prim)
+        child_paths = {prim_child.GetPath() for prim_child in prim_children}
+        for child_node in list(reversed(node.children)):
+            if child_node.path not in child_paths:
+                self._remove_node(child_node)
+
+        for row, prim_child in enumerate(prim_children):
+            if row >= len(node.children) and not was_fetched:
+                # Left to be fetched
+                break
+
+            child_node = node.children[row] if row < len(node.children) else None
+            if child_node is not None and child_node.path == prim_child.GetPath():
+                if recursive:
+                    self._sync_node(child_node, prim_child)
+
+                continue
+
+            # The prim is new or was reordered
+            moved_node = self._path_to_node_map.get(prim_child.GetPath())
+            if moved_node is not None:
+                self._remove_node(moved_node)
+
+            self._insert_node(node, row, prim_child)
+
+        node.child_prims = prim_children
+
+    def _insert_node(self, parent_node, row, prim):
+        self.beginInsertRows(self.get_index(parent_node), row, row)
+        parent_node.children.insert(row, self._create_node(prim, parent_node, row))
+        parent_node.child_prims.insert(row, prim)
+        self._update_rows(parent_node, row + 1)
+        self.endInsertRows()
+
+    def _remove_node(self, node):
+        parent_node = node.parent
+        row = node.row
+        self.beginRemoveRows(self.get_index(parent_node), row, row)
+        del parent_node.children[row]
+        del parent_node.child_prims[row]
+        self._update_rows(parent_node, row)
+        nodes = [node]
+        while nodes:
+            removed_node = nodes.pop()
+            if self._path_to_node_map.get(removed_node.path) is removed_node:
+                del self._path_to_node_map[removed_node.path]
+
+            nodes.extend(removed_node.children)
+
+        self.endRemoveRows()
+
+    def _update_rows(self, parent_node, first_row):
+        for row in range(first_row, len(parent_node.children)):
+            parent_node.children[row].row = row
+    # endregion Stage changes
+
+
+class PrimVisibilityDelegate(QtWidgets.QStyledItemDelegate):
+    """Draws the visibility of a prim as an eye icon, which toggles the visibility of its hierarchy when clicked."""
+
+    def __init__(self, parent=None):
+        super(PrimVisibilityDelegate, self).__init__(parent)
+        self.vis_icon = QtGui.QIcon(EYE_VISABLE)
+        self.invis_icon = QtGui.QIcon(EYE_INVISABLE)
+
+    def paint(self, painter, option, index):
+        visible = index.data(VISIBILITY_ROLE)
+        if visible is None:
+            return
+
+        icon = self.vis_icon if visible else self.invis_icon
+        icon.paint(painter, option.rect, QtCore.Qt.AlignCenter)
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(14, 14)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QtCore.QEvent.MouseButtonRelease and index.data(VISIBILITY_ROLE) is not None:
+            model.toggle_hierarchy_visibility(index)
+            return True
+
+        return super(PrimVisibilityDelegate, self).editorEvent(event, model, option, index)
+
+
+class UsdStageTreeWidget(QtWidgets.QTreeView):
     def __init__(self, stage=None, parent=None):
         super(UsdStageTreeWidget, self).__init__(parent=parent)
+        self.stage_model = UsdStageTreeModel(parent=self)
+        self.setModel(self.stage_model)
+        self.vis_delegate = PrimVisibilityDelegate(self)
+        self.setItemDelegateForColumn(1, self.vis_delegate)
+
         # TODO: cleanup settings
-        __qtreewidgetitem = QtWidgets.QTreeWidgetItem()
-        __qtreewidgetitem.setText(0, "StagePath")
-        __qtreewidgetitem.setTextAlignment(2, QtCore.Qt.AlignLeading | QtCore.Qt.AlignVCenter)
-        self.setHeaderItem(__qtreewidgetitem)
-        self.setColumnCount(2)
         self.header().setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.header().setStretchLastSection(False)
         self.header().setVisible(False)
@@ -78,68 +404,34 @@ class UsdStageTreeWidget(QtWidgets.QTreeWidget):
         self.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
         self.setUniformRowHeights(True)
         self.setColumnWidth(1, 10)
-        self._prim_to_item_map = {}
         self.set_stage(stage)
 
-    def set_stage(self, stage):
-        self.stage = stage
-        self.refresh_tree()
-
-    def refresh_tree(self):
-        # mods = QtWidgets.QApplication.keyboardModifiers()
-        # if mods != QtCore.Qt.ControlModifier:
-        #     return
+    @property
+    def stage(self):
+        return self.stage_model.stage
 
-        self.clear()
-        if not self.stage:
-            return
-
-        stage_root = self.stage.GetPseudoRoot()
-        invisible_root_item = self.invisibleRootItem()
-        self.populate_item_tree(stage_root, invisible_root_item)
+    def set_stage(self, stage):
+        self.stage_model.set_stage(stage)
         self.expandToDepth(0)
 
-    def create_item_from_prim(self, prim):
-        item = PrimItemWidget(prim)
-        item.emitDataChanged()
-        self._prim_to_item_map[prim] = item
-        return item
-
-    def populate_item_tree(self, prim, parent_item):
-        created_item = self.create_item_from_prim(prim)
-        parent_item.addChild(created_item)
-
-        # FIXME: this will probably not work in all cases
-        if bool(UsdGeom.Imageable(prim).GetVisibilityAttr()):
-            vis_button = PrimVisButton(prim)
-            vis_button.clicked.connect(lambda: self.toggle_hierarchy_visibility(created_item))
-            self.setItemWidget(created_item, 1, vis_button)
-
-        prim_children = self._get_filtered_prim_children(prim)
-        for prim_child in prim_children:
-            self.populate_item_tree(prim_child, created_item)
-
-        return created_item
-
-    def _get_filtered_prim_children(self, prim):
-        return prim.GetFilteredChildren(Usd.PrimIsActive)
+    def rebuild_tree(self):
+        self.stage_model.reset()
+        self.expandToDepth(0)
 
-    def toggle_hierarchy_visibility(self, item, set_visibility_to=None):
-        item_vis_button = self.itemWidget(item, 1)
-        if set_visibility_to is None:
-            set_visibility_to = item_vis_button.toggle_visibility()
-        else:
-            item_vis_button.set_visibility(set_visibility_to)
+    @profiled()
+    def refresh_tree(self):
+        self.stage_model.refresh()
 
-        # TODO: hide stage prims
+    def set_filter(self, text):
+        self.stage_model.set_filter(text)
+        self.expandToDepth(0)
 
-        for i in range(item.childCount()):
-            child_item = item.child(i)
-            self.toggle_hierarchy_visibility(child_item, set_visibility_to)
+    def toggle_hierarchy_visibility(self, index, set_visibility_to=None):
+        self.stage_model.toggle_hierarchy_visibility(index, set_visibility_to)
 
     def get_selected_prims(self):
-        items = self.selectedItems()
-        prims = [item.prim for item in items]
+        indexes = self.selectionModel().selectedRows(0)
+        prims = [self.stage_model.get_node(index).prim for index in indexes]
         return prims
 
 
@@ -1,6 +1,7 @@
 import pytest
 import helpers
 from pathlib import Path
+from QuiltiX import qx_batch
 from QuiltiX.constants import ROOT
 
 
@@ -18,6 +19,12 @@ def quiltix_instance(qtbot):
         yield editor
 
 
+@pytest.fixture
+def qx_node_graph(qtbot):
+    """Node graph with the MaterialX libraries loaded, without the editor window."""
+    return qx_batch.create_headless_node_graph()
+
+
 @pytest.fixture
 def materialxjson_plugin():
     import os
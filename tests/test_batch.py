@@ -0,0 +1,15 @@
+import os
+
+from QuiltiX import qx_batch
+from QuiltiX.constants import ROOT
+
+
+def test_batch_resaves_materials(qtbot, tmp_path):
+    mx_file_paths = qx_batch.get_mx_file_paths([os.path.join(ROOT, "resources", "materials")])
+    results = list(qx_batch.run_batch(mx_file_paths, output_dir=str(tmp_path), layout=True, jobs=1))
+
+    assert len(results) == len(mx_file_paths)
+    for result in results:
+        assert not result["error"], result["path"]
+        assert result["valid"], result["message"]
+        assert os.path.isfile(result["output"])
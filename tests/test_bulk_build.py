@@ -0,0 +1,18 @@
+def test_bulk_build(qx_node_graph):
+    undo_stack = qx_node_graph.undo_stack()
+    undo_stack.clear()
+
+    with qx_node_graph.bulk_build("add nodes"):
+        nodes = [qx_node_graph.create_node("Math.Add", name="add") for _ in range(3)]
+        for input_node, output_node in zip(nodes[1:], nodes):
+            input_node.inputs()["in1"].connect_to(output_node.outputs()["out"], push_undo=False)
+
+    assert [node.name() for node in nodes] == ["add", "add_1", "add_2"]
+    assert undo_stack.count() == 1
+
+    undo_stack.undo()
+    assert not qx_node_graph.all_nodes()
+
+    undo_stack.redo()
+    assert len(qx_node_graph.all_nodes()) == 3
+    assert nodes[2].inputs()["in1"].connected_ports() == [nodes[1].outputs()["out"]]
@@ -0,0 +1,21 @@
+from QuiltiX.qx_nodegraph import get_serialized_connection_index
+
+
+def test_serialized_connection_index():
+    connections = [
+        {"in": ["multiply", "in1"], "out": ["image", "out"]},
+        {"in": ["add", "in1"], "out": ["image", "out"]},
+        {"in": ["surface", "base_color"], "out": ["multiply", "out"]},
+    ]
+    connections_by_input, connections_by_output = get_serialized_connection_index({"connections": connections})
+
+    assert connections_by_input == {
+        ("multiply", "in1"): connections[0],
+        ("add", "in1"): connections[1],
+        ("surface", "base_color"): connections[2],
+    }
+    assert connections_by_output == {
+        ("image", "out"): connections[:2],
+        ("multiply", "out"): connections[2:],
+    }
+    assert get_serialized_connection_index({}) == ({}, {})
@@ -0,0 +1,66 @@
+import MaterialX as mx  # type: ignore
+
+
+def test_patched_mx_doc(qx_node_graph):
+    shadow_mx_doc = qx_node_graph.shadow_mx_doc
+    qx_node_graph.get_current_mx_graph_doc()
+    counts = {}
+
+    def record_counts():
+        counts.update(rebuild=shadow_mx_doc.rebuild_count, patch=shadow_mx_doc.patch_count)
+
+    def check(step, patched=True):
+        qx_node_graph.get_current_mx_graph_doc()
+        if patched:
+            assert shadow_mx_doc.patch_count > counts["patch"], step
+            assert shadow_mx_doc.rebuild_count == counts["rebuild"], step
+        else:
+            assert shadow_mx_doc.rebuild_count > counts["rebuild"], step
+
+        rebuild_count = shadow_mx_doc.rebuild_count
+        assert qx_node_graph.check_mx_doc_consistency(), step
+        assert shadow_mx_doc.rebuild_count == rebuild_count, step
+        record_counts()
+
+    record_counts()
+    add_node = qx_node_graph.create_node("Math.Add", name="add")
+    constant_node = qx_node_graph.create_node("Procedural.Constant", name="constant")
+    surface_node = qx_node_graph.create_node("Pbr.Standard_surface", name="surface")
+    check("create")
+
+    add_node.inputs()["in1"].connect_to(constant_node.outputs()["out"])
+    surface_node.inputs()["base"].connect_to(add_node.outputs()["out"])
+    check("connect")
+
+    add_node.set_property("in2", 0.5)
+    check("set property")
+
+    constant_node.set_name("renamed")
+    check("rename")
+
+    # Renames the NG_main output of the node and the input of the shader connected to it
+    add_node.set_name("renamed_add")
+    check("rename connected to a shader")
+
+    qx_node_graph.delete_nodes([constant_node])
+    check("delete")
+
+    qx_node_graph.undo_stack().undo()
+    check("undo", patched=False)
+    assert qx_node_graph.get_node_by_name("renamed")
+
+    qx_node_graph.undo_stack().redo()
+    check("redo", patched=False)
+    assert not qx_node_graph.get_node_by_name("renamed")
+
+
+def test_current_mx_doc_is_a_copy(qx_node_graph):
+    qx_node_graph.create_node("Math.Add", name="add", push_undo=False)
+
+    mx_doc = qx_node_graph.get_current_mx_graph_doc()
+    xml_data = mx.writeToXmlString(mx_doc)
+    for mx_element in mx_doc.getChildren():
+        mx_doc.removeChild(mx_element.getName())
+
+    assert mx.writeToXmlString(qx_node_graph.get_current_mx_graph_doc()) == xml_data
+    assert qx_node_graph.check_mx_doc_consistency()
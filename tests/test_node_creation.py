@@ -1,3 +1,5 @@
+import MaterialX as mx  # type: ignore
+
 from examples.create_all_available_nodes import create_all_available_nodes
 from examples.create_standard_surface import create_standard_surface
 
@@ -8,3 +10,23 @@ def test_create_all_available_nodes(qtbot):
 
 def test_create_standard_surface(qtbot):
     create_standard_surface()
+
+
+def test_create_node_from_mx_node(qx_node_graph):
+    mx_doc = mx.createDocument()
+    mx_doc.setDataLibrary(qx_node_graph.mx_library_doc)
+    mx_node = mx_doc.addNode("separate3", "separate", "multioutput")
+    mx_node.setInputValue("in", mx.Vector3(0.25, 0.5, 0.75))
+    for output_name in ["outx", "outy", "outz"]:
+        mx_node.addOutput(output_name, "float")
+
+    undo_stack = qx_node_graph.undo_stack()
+    undo_stack.clear()
+    qx_node = qx_node_graph.create_node_from_mx_node(mx_node)
+
+    # Created with the vector3 definition instead of the default color3 one
+    assert qx_node.type_ == "Channel.Separate3"
+    assert qx_node.get_property("type") == "vector3"
+    assert tuple(qx_node.get_property("in")) == (0.25, 0.5, 0.75)
+    assert list(qx_node.outputs()) == ["outx", "outy", "outz"]
+    assert [undo_stack.text(index) for index in range(undo_stack.count())] == ['create node: "separate"']
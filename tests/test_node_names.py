@@ -0,0 +1,26 @@
+def test_unique_node_names(qx_node_graph):
+    node_type = "Math.Add"
+
+    nodes = [qx_node_graph.create_node(node_type, name="add", push_undo=False) for _ in range(3)]
+    assert [node.name() for node in nodes] == ["add", "add_1", "add_2"]
+
+    # Freed numbers are used again
+    qx_node_graph.delete_nodes([nodes[1]], push_undo=False)
+    assert qx_node_graph.create_node(node_type, name="add", push_undo=False).name() == "add_1"
+
+    nodes[2].set_name("renamed")
+    assert qx_node_graph.create_node(node_type, name="renamed", push_undo=False).name() == "renamed_1"
+    assert qx_node_graph.create_node(node_type, name="add", push_undo=False).name() == "add_2"
+
+    node_names = [node.name() for node in qx_node_graph.all_nodes()]
+    assert len(node_names) == len(set(node_names))
+
+
+def test_renamed_node_names(qx_node_graph):
+    node_type = "Math.Add"
+
+    nodes = [qx_node_graph.create_node(node_type, name="add", push_undo=False) for _ in range(3)]
+    # The number of the previous name is freed when renaming
+    nodes[1].set_name("foo")
+    assert qx_node_graph.create_node(node_type, name="add", push_undo=False).name() == "add_1"
+    assert qx_node_graph.create_node(node_type, name="add", push_undo=False).name() == "add_3"
@@ -0,0 +1,43 @@
+import MaterialX as mx  # type: ignore
+
+
+def test_change_node_type(qx_node_graph):
+    add_node = qx_node_graph.create_node("Math.Add", push_undo=False)
+    color_node = qx_node_graph.create_node("Procedural.Constant", push_undo=False)
+    float_node = qx_node_graph.create_node("Procedural.Constant", push_undo=False)
+    color_node.change_type("color3")
+    add_node.change_type("color3")
+    add_node.set_property("in1", [0.5, 0.5, 0.5], push_undo=False)
+    add_node.inputs()["in1"].connect_to(color_node.outputs()["out"], push_undo=False)
+    add_node.inputs()["in2"].connect_to(float_node.outputs()["out"], push_undo=False)
+
+    # Ports keeping their type are kept with their connections and values
+    in1_port = add_node.inputs()["in1"]
+    add_node.change_type("color3FA")
+    assert add_node.inputs()["in1"] is in1_port
+    assert add_node.inputs()["in1"].connected_ports() == [color_node.outputs()["out"]]
+    assert add_node.get_property("in1") == [0.5, 0.5, 0.5]
+    assert add_node.inputs()["in2"].view.get_mx_port_type() == "float"
+    assert add_node.inputs()["in2"].connected_ports() == [float_node.outputs()["out"]]
+
+    # Connections which don't match the changed port types are dropped
+    add_node.change_type("float")
+    assert list(add_node.inputs()) == ["in1", "in2"]
+    assert add_node.get_property("type") == "float"
+    assert add_node.get_property("in1") == 0.0
+    assert not add_node.inputs()["in1"].connected_ports()
+    assert add_node.inputs()["in2"].connected_ports() == [float_node.outputs()["out"]]
+
+
+def test_resolve_mx_node_type(qx_node_graph):
+    mx_doc = mx.createDocument()
+    math_node = mx_doc.addNode("multiply", "math_multiply", "color3")
+    math_node.setInputValue("in2", 0.5)
+    pbr_node = mx_doc.addNode("multiply", "pbr_multiply", "BSDF")
+    pbr_node.setInputValue("in2", 0.5)
+
+    assert qx_node_graph.get_qx_node_type_from_mx_node(math_node) == "Math.Multiply"
+    assert qx_node_graph.get_qx_node_type_from_mx_node(pbr_node) == "Pbr.Multiply"
+    # The signature of the node is resolved again with a port no definition has
+    math_node.setInputValue("in3", 0.5)
+    assert qx_node_graph.get_qx_node_type_from_mx_node(math_node) is None
@@ -0,0 +1,34 @@
+from QuiltiX import mx_node, qx_node, qx_port
+
+
+def create_node_placeholder(node_name, inputs, outputs):
+    port_record = {
+        "inputs": inputs,
+        "outputs": outputs,
+        "first_input_type": inputs[0][1] if inputs else None,
+        "first_output_type": outputs[0][1] if outputs else None,
+    }
+    mx_signature = mx_node.MxNodeSignature({"default": port_record})
+    return qx_node.QxNodePlaceholder(node_name, "Test", f"Test.{node_name}", {}, mx_signature)
+
+
+def test_port_type_node_index():
+    port_type_node_index = qx_port.PortTypeNodeIndex()
+    for node in [
+        create_node_placeholder("Vector_source", [], [["out", "vector3"]]),
+        create_node_placeholder("Float_sink", [["in", "float"]], [["out", "float"]]),
+        create_node_placeholder("Color_source", [], [["out", "color3"]]),
+        create_node_placeholder("Vector_sink", [["in", "vector3"]], [["out", "float"]]),
+        create_node_placeholder("Color_sink", [["in", "color3"]], [["out", "color3"]]),
+    ]:
+        port_type_node_index.add_node_type(node)
+
+    # Nodes with an output a color3 input can be connected to, vector3 outputs are compatible
+    assert port_type_node_index.get_node_names(["color3"], "in") == ["Vector_source", "Color_source", "Color_sink"]
+    # Nodes with an input a color3 output can be connected to
+    assert port_type_node_index.get_node_names(["color3"], "out") == ["Vector_sink", "Color_sink"]
+    assert port_type_node_index.get_node_names(["vector2"], "out") == ["Float_sink"]
+    assert port_type_node_index.get_node_names(["float", "vector3"], "in") == [
+        "Vector_source", "Float_sink", "Color_source", "Vector_sink", "Color_sink"
+    ]
+    assert port_type_node_index.get_node_names(["string"], "in") == []
@@ -0,0 +1,31 @@
+import json
+
+from QuiltiX import qx_profiler
+
+
+def test_profiled_spans_are_exported(tmp_path, monkeypatch):
+    monkeypatch.setattr(qx_profiler, "_enabled", False)
+    qx_profiler.clear()
+
+    @qx_profiler.profiled("test_span")
+    def add(a, b):
+        return a + b
+
+    assert add(1, 2) == 3
+    assert qx_profiler.get_stats() == []
+
+    qx_profiler.set_enabled(True)
+    add(1, 2)
+    with qx_profiler.span("test_span"):
+        pass
+
+    stats = qx_profiler.get_stats()
+    assert [(span_stats.name, span_stats.count, sum(span_stats.histogram)) for span_stats in stats] == [
+        ("test_span", 2, 2)
+    ]
+
+    trace_path = tmp_path / "trace.json"
+    qx_profiler.export_chrome_trace(str(trace_path))
+    trace_events = json.loads(trace_path.read_text())["traceEvents"]
+    assert [(event["name"], event["ph"]) for event in trace_events] == [("test_span", "X"), ("test_span", "X")]
+    qx_profiler.clear()
@@ -0,0 +1,20 @@
+import MaterialX as mx  # type: ignore
+
+from QuiltiX import mx_validation
+
+
+def test_validate_in_process(qtbot, qx_node_graph):
+    mx_doc = mx.createDocument()
+    mx_doc.addNode("add", "add", "float").setInputValue("in1", 0.5)
+    invalid_mx_doc = mx_doc.copy()
+    invalid_mx_doc.getNode("add").setInputValue("in1", "text")
+
+    validator = mx_validation.MxDocValidator()
+    for doc in [mx_doc, invalid_mx_doc]:
+        with qtbot.waitSignal(validator.validated, timeout=30000) as blocker:
+            validator.validate(doc, qx_node_graph.mx_library_doc)
+
+        assert tuple(blocker.args) == mx_validation.validate_mx_doc(doc, qx_node_graph.mx_library_doc)
+
+    assert blocker.args[0] is False
+    assert validator._use_process